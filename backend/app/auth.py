@@ -1,21 +1,24 @@
 # backend/app/auth.py
-from fastapi import HTTPException, Security, status
+from fastapi import HTTPException, Security, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError, ExpiredSignatureError
 from app.config import settings 
 import logging
+import time
 
 # Initialize logger to see errors in 'docker-compose logs'
 logger = logging.getLogger("uvicorn.error")
 security = HTTPBearer()
 
-def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
+# Browsers' EventSource cannot send an Authorization header, so event streams authenticate
+# with a short-lived token in the query string, scoped so it is never accepted as a session
+STREAM_SCOPE = "events"
+
+def _verify(token: str) -> dict:
     """
     Verified JWT using HS256 Shared Secret.
     This works because your current Supabase key is 'Legacy HS256'.
     """
-    token = credentials.credentials
-    
     if not settings.SUPABASE_JWT_SECRET:
         logger.error("AUTH ERROR: SUPABASE_JWT_SECRET is not set in environment!")
         raise HTTPException(
@@ -33,15 +36,14 @@ def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(sec
             options={"verify_aud": False}
         )
         
-        user_id = payload.get("sub")
-        if not user_id:
+        if not payload.get("sub"):
             logger.error("AUTH ERROR: 'sub' (User UUID) missing from token.")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, 
                 detail="Invalid token structure."
             )
             
-        return user_id
+        return payload
 
     except ExpiredSignatureError:
         logger.warning("AUTH WARNING: Token has expired.")
@@ -57,3 +59,28 @@ def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(sec
             status_code=status.HTTP_401_UNAUTHORIZED, 
             detail=f"Authentication failed: {str(e)}"
         )
+
+def get_current_user_id(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
+    payload = _verify(credentials.credentials)
+    if payload.get("scope") == STREAM_SCOPE:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, 
+            detail="Stream tokens cannot be used as a session."
+        )
+    return payload["sub"]
+
+def issue_stream_token(user_id: str) -> str:
+    """Signs a token for opening the user's event stream, valid for STREAM_TOKEN_TTL seconds."""
+    now = int(time.time())
+    claims = {"sub": user_id, "scope": STREAM_SCOPE, "iat": now, "exp": now + settings.STREAM_TOKEN_TTL}
+    return jwt.encode(claims, settings.SUPABASE_JWT_SECRET, algorithm="HS256")
+
+def get_stream_user_id(token: str = Query(...)) -> str:
+    """Auth for EventSource endpoints: ?token= from issue_stream_token."""
+    payload = _verify(token)
+    if payload.get("scope") != STREAM_SCOPE:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, 
+            detail="A stream token is required."
+        )
+    return payload["sub"]
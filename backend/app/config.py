@@ -37,6 +37,125 @@ class Settings(BaseSettings):
     AWS_ACCESS_KEY_ID: str
     AWS_SECRET_ACCESS_KEY: str
 
+    # --- S3 Transfers ---
+    S3_MULTIPART_THRESHOLD: int = 16 * 1024 ** 2
+    S3_MULTIPART_CHUNKSIZE: int = 16 * 1024 ** 2
+    S3_UPLOAD_CONCURRENCY: int = 4
+    S3_MAX_POOL_CONNECTIONS: int = 50
+    # Cached presigned GET URLs are re-minted once they are this close to expiry (seconds)
+    SIGNED_URL_REFRESH_MARGIN: int = 600
+
+    # --- Rendering ---
+    # Per-process budget for cached text layouts (text_raster, stored cropped to their ink)
+    TEXT_RASTER_CACHE_BYTES: int = 64 * 1024 ** 2
+    # 'auto' tries stream copy, the ffmpeg filtergraph, then the frame compositor, then MoviePy.
+    # 'copy' / 'ffmpeg' / 'compositor' pin one fast engine; 'moviepy' forces the legacy path.
+    RENDER_ENGINE: str = "auto"
+    # Timelines longer than RENDER_SEGMENT_MIN_DURATION are cut into GOP-aligned chunks of
+    # ~RENDER_SEGMENT_SECONDS rendered in parallel, then stream-copied together (0 workers = cpu count)
+    RENDER_SEGMENT_SECONDS: float = 10.0
+    RENDER_SEGMENT_MIN_DURATION: float = 20.0
+    RENDER_SEGMENT_WORKERS: int = 0
+    # NLE exports render through a chunk cache (in ASSET_CACHE_DIR) keyed by each span's
+    # layer stack, so re-exports only re-encode the spans that changed
+    RENDER_CHUNK_CACHE_ENABLED: bool = True
+    # Decoded frames kept per shared source reader (MoviePy paths); absorbs seeks between
+    # clips. ~6 MB per frame at 1080p, so keep it small
+    SOURCE_FRAME_CACHE: int = 8
+
+    # --- Transcription (Whisper) ---
+    WHISPER_MODEL_SIZE: str = "medium"
+    # 'whisper' (free-form decoding) or 'align' (forced alignment of the known script)
+    TRANSCRIPTION_MODE: str = "whisper"
+    WHISPER_DEVICE: str = "cpu"
+    # Upper bound for resident Whisper checkpoints per process; LRU models are evicted past this
+    WHISPER_MEMORY_BUDGET_MB: int = 6000
+    # Run Step 3 as its own pipeline task on the long-lived transcription worker pool instead of
+    # loading Whisper in the generation task (disables PIPELINE_STREAMING)
+    TRANSCRIPTION_POOL_ENABLED: bool = False
+    TRANSCRIPTION_QUEUE: str = "transcription"
+    # Streaming transcription decodes the narration in ~N second chunks cut at pauses
+    TRANSCRIPTION_STREAM_CHUNK: float = 30.0
+
+    # --- Video Batch Generation ---
+    VIDEO_BATCH_CONCURRENCY: int = 3
+    VIDEO_BATCH_UPLOAD_WORKERS: int = 2
+    VIDEO_BATCH_RETRIES: int = 2
+    VIDEO_BATCH_BACKOFF: float = 2.0
+
+    # --- Generation Result Cache ---
+    RESULT_CACHE_ENABLED: bool = True
+    # Defaults to CELERY_BROKER_URL when unset
+    RESULT_CACHE_REDIS_URL: Optional[str] = None
+    RESULT_CACHE_TTL: int = 7 * 24 * 3600
+    RESULT_CACHE_MAX_BYTES: int = 20 * 1024 ** 3
+
+    # --- Renderer Asset Cache (worker-local disk) ---
+    ASSET_CACHE_DIR: str = "/tmp/loom_runtime/asset_cache"
+    ASSET_CACHE_MAX_BYTES: int = 10 * 1024 ** 3
+    # Entries used more recently than this are never evicted (covers an in-flight render)
+    ASSET_CACHE_PIN_SECONDS: int = 2 * 3600
+    # Parallel downloads during the NLE prefetch stage
+    ASSET_PREFETCH_CONCURRENCY: int = 8
+    # Size cap for any single URL download (assets.download_file)
+    DOWNLOAD_MAX_BYTES: int = 2 * 1024 ** 3
+
+    # --- Preview Exports ---
+    # Previews render at a fraction of the task resolution / capped fps from low-res proxies
+    # (short side PROXY_SHORT_SIDE px), generated once and stored next to the original S3 key
+    PREVIEW_SCALE: float = 1 / 3
+    PREVIEW_MAX_FPS: int = 12
+    PROXY_SHORT_SIDE: int = 480
+
+    # --- AI Pipeline ---
+    # Failed pipeline tasks are retried and resume from their last completed stage
+    PIPELINE_MAX_RETRIES: int = 2
+    PIPELINE_RETRY_DELAY: int = 15
+    # Start video generation from each transcribed chunk instead of waiting for the full transcript
+    PIPELINE_STREAMING: bool = True
+
+    # --- Worker Lifecycle ---
+    # Jobs run inside a workspace with guaranteed teardown, so children are recycled only
+    # as a safety net. 0 disables recycling (the transcription pool never recycles so models stay warm)
+    WORKER_MAX_TASKS_PER_CHILD: int = 50
+
+    # --- Worker Queues ---
+    # One queue per workload class, each consumed by its own pool (worker/celery_app.py WORKER_POOLS)
+    RENDER_QUEUE: str = "render"          # NLE exports and previews (CPU-bound)
+    GENERATION_QUEUE: str = "generation"  # AI pipeline stages (remote LLM / TTS / Space I/O)
+    FINALIZE_QUEUE: str = "finalize"      # Final AI render + upload (CPU-bound)
+    RENDER_CONCURRENCY: int = 2
+    # Processes; each may hold a Whisper model while transcribing in-task
+    GENERATION_CONCURRENCY: int = 4
+    FINALIZE_CONCURRENCY: int = 1
+    # Unacked messages are redelivered after this long; one value for every queue, above the longest job
+    BROKER_VISIBILITY_TIMEOUT: int = 4 * 3600
+    # Exports up to this long are queued ahead of longer ones on the render queue
+    SHORT_EXPORT_SECONDS: float = 60.0
+
+    # --- Progress Reporting ---
+    # Hot progress lives in Redis (defaults to CELERY_BROKER_URL); the tasks table is only
+    # written on status transitions. Ticks closer than both thresholds are dropped
+    PROGRESS_REDIS_URL: Optional[str] = None
+    PROGRESS_MIN_INTERVAL: float = 1.0
+    PROGRESS_MIN_DELTA: float = 2.0
+    PROGRESS_TTL: int = 24 * 3600
+    # Keep-alive comment interval on the /api/tasks/events stream
+    PROGRESS_SSE_HEARTBEAT: float = 15.0
+    # Lifetime of the ?token= an EventSource connects with. Only checked when connecting;
+    # clients fetch a new token for every reconnect
+    STREAM_TOKEN_TTL: int = 60
+
+    # --- Job Workspaces ---
+    # Scoped scratch directory per task, deleted on success or failure
+    WORKSPACE_ROOT: str = "/tmp/loom_runtime/jobs"
+    WORKSPACE_QUOTA_BYTES: int = 20 * 1024 ** 3
+    # Running jobs touch a heartbeat file in their workspace this often. Workspaces whose
+    # heartbeat is older than WORKSPACE_STALE_SECONDS (any container), or whose owner PID is
+    # gone (this container), are swept on the next task
+    WORKSPACE_HEARTBEAT_SECONDS: int = 60
+    WORKSPACE_STALE_SECONDS: int = 30 * 60
+
     @property
     def SQLALCHEMY_DATABASE_URL(self) -> str:
         """Constructs the connection string with SSL for Port 6543."""
@@ -0,0 +1,228 @@
+# myg/backend/app/engine/asset_cache.py
+import os
+import time
+import fcntl
+import asyncio
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.config import settings
+from app.engine import s3_utils
+from app.engine.assets import download_file as fetch_url_file, download_file_sync, get_http_client, get_sync_http_client, DOWNLOAD_HEADERS
+
+logger = logging.getLogger(__name__)
+
+# Worker-local LRU cache of renderer inputs (S3 objects and remote URLs).
+# Entries are keyed by source + validator (S3 ETag, HTTP ETag/Last-Modified), filled
+# atomically under a per-entry flock so concurrent Celery children share downloads,
+# and evicted least-recently-used first once the directory exceeds its byte budget.
+
+LOCK_SUFFIX = ".lock"
+PART_MARKER = ".part."
+
+# --- 1. Keys & Validators ---
+
+def _s3_validator(s3_key: str) -> str:
+    return s3_utils.get_s3_etag(s3_key) or ""
+
+def _validator_from_headers(resp) -> str:
+    if resp.status_code >= 400:
+        return ""
+    h = resp.headers
+    return "|".join([h.get("etag", ""), h.get("last-modified", ""), h.get("content-length", "")])
+
+def _url_validator(url: str) -> str:
+    """ETag / Last-Modified / Content-Length from a HEAD request; empty if the server refuses HEAD."""
+    try:
+        return _validator_from_headers(get_sync_http_client().head(url, headers=DOWNLOAD_HEADERS, timeout=10))
+    except Exception as e:
+        logger.warning(f"HEAD failed for {url}: {e}")
+        return ""
+
+async def _url_validator_async(url: str) -> str:
+    try:
+        return _validator_from_headers(await get_http_client().head(url, headers=DOWNLOAD_HEADERS, timeout=10))
+    except Exception as e:
+        logger.warning(f"HEAD failed for {url}: {e}")
+        return ""
+
+def _entry_path(src: str, validator: str) -> str:
+    digest = hashlib.sha256(f"{src}\n{validator}".encode("utf-8")).hexdigest()
+    ext = os.path.splitext(src.split('?')[0])[1][:8] or ".tmp"
+    return os.path.join(settings.ASSET_CACHE_DIR, f"{digest}{ext}")
+
+# --- 2. Fill ---
+
+def _tmp_path(path: str) -> str:
+    return f"{path}{PART_MARKER}{os.getpid()}.{threading.get_ident()}"
+
+def _publish(tmp_path: str, path: str):
+    """Atomically moves a finished download into place (or discards a failed one)."""
+    try:
+        if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+            raise RuntimeError("download produced no data")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _hit(path: str, src: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    os.utime(path)  # Refresh LRU position
+    logger.info(f"⚡ Asset cache hit: {src}")
+    return True
+
+def resolve(src: str) -> str:
+    """
+    Returns a local path for an S3 key or http(s) URL, downloading it only on a cache miss.
+    The returned file is owned by the cache and must not be deleted by callers.
+    Fills run once across processes under a per-entry flock and are published atomically.
+    """
+    os.makedirs(settings.ASSET_CACHE_DIR, exist_ok=True)
+
+    if src.startswith("http"):
+        path = _entry_path(src, _url_validator(src))
+        fetch = lambda tmp: download_file_sync(src, tmp)
+    else:
+        path = _entry_path(src, _s3_validator(src))
+        fetch = lambda tmp: s3_utils.download_file_from_s3(src, tmp)
+
+    if _hit(path, src):
+        return path
+
+    with open(path + LOCK_SUFFIX, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(path):
+                logger.info(f"📥 Asset cache miss, downloading: {src}")
+                tmp_path = _tmp_path(path)
+                try:
+                    fetch(tmp_path)
+                finally:
+                    _publish(tmp_path, path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    evict()
+    return path
+
+_s3_pool = None
+_s3_pool_lock = threading.Lock()
+
+def _get_s3_pool():
+    global _s3_pool
+    with _s3_pool_lock:
+        if _s3_pool is None:
+            _s3_pool = ThreadPoolExecutor(max_workers=settings.ASSET_PREFETCH_CONCURRENCY, thread_name_prefix="asset-s3")
+        return _s3_pool
+
+async def resolve_async(src: str) -> str:
+    """
+    resolve() for async renderers.
+    HTTP sources download on the event loop; boto3 downloads run on a dedicated thread pool.
+    """
+    loop = asyncio.get_running_loop()
+    if not src.startswith("http"):
+        return await loop.run_in_executor(_get_s3_pool(), resolve, src)
+
+    os.makedirs(settings.ASSET_CACHE_DIR, exist_ok=True)
+    path = _entry_path(src, await _url_validator_async(src))
+    if _hit(path, src):
+        return path
+
+    with open(path + LOCK_SUFFIX, "a") as lock_file:
+        await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(path):
+                logger.info(f"📥 Asset cache miss, downloading: {src}")
+                tmp_path = _tmp_path(path)
+                try:
+                    await fetch_url_file(src, tmp_path)
+                finally:
+                    _publish(tmp_path, path)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    evict()
+    return path
+
+async def prefetch(sources, concurrency: int = None, on_progress=None) -> dict:
+    """
+    Resolves many sources concurrently (deduplicated) before composition starts.
+    on_progress(done, total) is called after each asset finishes.
+    Returns {src: local_path}; sources that failed to download are omitted.
+    """
+    unique = list(dict.fromkeys(sources))
+    total = len(unique)
+    semaphore = asyncio.Semaphore(concurrency or settings.ASSET_PREFETCH_CONCURRENCY)
+    resolved = {}
+    done = 0
+
+    async def fetch_one(src):
+        nonlocal done
+        async with semaphore:
+            try:
+                resolved[src] = await resolve_async(src)
+            except Exception as e:
+                logger.error(f"Prefetch failed for {src}: {e}")
+            finally:
+                done += 1
+                if on_progress:
+                    on_progress(done, total)
+
+    logger.info(f"📦 Prefetching {total} assets...")
+    await asyncio.gather(*(fetch_one(src) for src in unique))
+    return resolved
+
+# --- 3. Eviction ---
+
+def evict():
+    """
+    Deletes least recently used entries until the cache fits in ASSET_CACHE_MAX_BYTES.
+    Entries used within ASSET_CACHE_PIN_SECONDS are kept, since a running render may
+    still reopen them (MoviePy restarts ffmpeg readers on backward seeks).
+    """
+    cache_dir = settings.ASSET_CACHE_DIR
+    try:
+        entries = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(LOCK_SUFFIX) or PART_MARKER in name:
+                continue
+            path = os.path.join(cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+    except FileNotFoundError:
+        return
+
+    total = sum(size for _, size, _ in entries)
+    if total <= settings.ASSET_CACHE_MAX_BYTES:
+        return
+
+    pinned_after = time.time() - settings.ASSET_CACHE_PIN_SECONDS
+    for mtime, size, path in sorted(entries):
+        if total <= settings.ASSET_CACHE_MAX_BYTES:
+            break
+        if mtime > pinned_after:
+            break
+        with open(path + LOCK_SUFFIX, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # Being filled or replaced by another process
+            try:
+                os.remove(path)
+                total -= size
+                logger.info(f"♻️ Evicted cached asset {os.path.basename(path)}")
+            except FileNotFoundError:
+                pass
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        try:
+            os.remove(path + LOCK_SUFFIX)
+        except FileNotFoundError:
+            pass
@@ -1,8 +1,13 @@
 import os
+import time
 import httpx 
 import random
+import asyncio
+import weakref
+import threading
 import google.generativeai as genai
 import ast
+from app.config import settings
 
 PIXABAY_API_KEY = os.getenv("PIXABAY_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -24,22 +29,21 @@ async def search_pixabay(query: str, page: int = 1, per_page: int = 20):
         "per_page": per_page
     }
 
-    async with httpx.AsyncClient() as client:
-        try:
-            res = await client.get(url, params=params)
-            if res.status_code == 200:
-                data = res.json()
-                return [
-                    {
-                        "id": str(hit["id"]),
-                        "type": "image",
-                        "src": hit["largeImageURL"],
-                        "thumb": hit["webformatURL"]
-                    }
-                    for hit in data.get("hits", [])
-                ]
-        except Exception as e:
-            print(f"Pixabay Search Error: {e}")
+    try:
+        res = await get_http_client().get(url, params=params)
+        if res.status_code == 200:
+            data = res.json()
+            return [
+                {
+                    "id": str(hit["id"]),
+                    "type": "image",
+                    "src": hit["largeImageURL"],
+                    "thumb": hit["webformatURL"]
+                }
+                for hit in data.get("hits", [])
+            ]
+    except Exception as e:
+        print(f"Pixabay Search Error: {e}")
     return []
 
 async def generate_image_keywords(script_segments: dict):
@@ -83,7 +87,7 @@ async def fetch_pixabay_image(query: str):
         print("Pixabay API Key missing")
         return None
     
-    url = "[https://pixabay.com/api/](https://pixabay.com/api/)"
+    url = "https://pixabay.com/api/"
     
     params = {
         "key": PIXABAY_API_KEY,
@@ -93,34 +97,181 @@ async def fetch_pixabay_image(query: str):
         "per_page": 3
     }
     
-    async with httpx.AsyncClient() as client:
-        try:
-            res = await client.get(url, params=params)
-            
-            if res.status_code != 200:
-                print(f"Pixabay returned status {res.status_code} for {query}")
-                return None
+    try:
+        res = await get_http_client().get(url, params=params)
+        
+        if res.status_code != 200:
+            print(f"Pixabay returned status {res.status_code} for {query}")
+            return None
 
-            data = res.json()
-            hits = data.get("hits", [])
-            if hits:
-                return hits[0].get("largeImageURL")
-            else:
-                print(f"No hits found on Pixabay for '{query}'")
-                
-        except Exception as e:
-            print(f"Pixabay Error for {query}: {e}")
+        data = res.json()
+        hits = data.get("hits", [])
+        if hits:
+            return hits[0].get("largeImageURL")
+        else:
+            print(f"No hits found on Pixabay for '{query}'")
+            
+    except Exception as e:
+        print(f"Pixabay Error for {query}: {e}")
     return None
  
-async def download_file(url: str, dest_path: str):
+# --- SHARED HTTP CLIENT ---
+# One pooled AsyncClient per event loop (httpx clients cannot be shared across loops),
+# and one thread-safe sync Client for blocking callers such as the renderer's asset cache.
+# Workers drive short-lived loops through run_with_http_client(), which closes the loop's
+# client (and its connections) when the run ends.
+_clients = weakref.WeakKeyDictionary()
+_sync_client = None
+_sync_client_lock = threading.Lock()
+
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+
+def get_http_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(follow_redirects=True, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+        _clients[loop] = client
+    return client
+
+async def close_http_client():
+    """Closes the running loop's pooled client, if it has one."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+def run_with_http_client(coro):
+    """asyncio.run() for worker tasks: the loop's pooled client is shared by the whole run, then closed."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await close_http_client()
+    return asyncio.run(main())
+
+def get_sync_http_client() -> httpx.Client:
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is None or _sync_client.is_closed:
+            _sync_client = httpx.Client(follow_redirects=True, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+        return _sync_client
+
+# --- STREAMING DOWNLOADER ---
+# download_file (async) and download_file_sync share the range/size bookkeeping below;
+# only the transport differs.
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = 3
+# Byte counts, Content-Length and Range offsets must all refer to the bytes on the wire;
+# httpx would otherwise negotiate gzip and decode it while streaming
+DOWNLOAD_HEADERS = {"Accept-Encoding": "identity"}
+
+def _start_body(resp, url: str, written: int, expected, max_bytes: int):
+    """
+    Checks a (possibly ranged) response before its body is read.
+    Returns (file mode, bytes already written, expected total), or None when nothing is left.
+    """
+    if resp.status_code == 416 and expected is not None and written == expected:
+        return None  # Nothing left to fetch
+    if resp.status_code >= 400:
+        raise RuntimeError(f"Download failed for {url}: HTTP {resp.status_code}")
+
+    if resp.status_code == 206:
+        # Content-Range: bytes start-end/total
+        total = resp.headers.get("content-range", "").rsplit("/", 1)[-1]
+        expected = int(total) if total.isdigit() else expected
+        mode = "ab"
+    else:
+        # Server ignored the range; start over
+        written = 0
+        length = resp.headers.get("content-length")
+        expected = int(length) if length and length.isdigit() else None
+        mode = "wb"
+
+    if expected is not None and expected > max_bytes:
+        raise RuntimeError(f"Download too large for {url}: {expected} bytes (cap {max_bytes})")
+    return mode, written, expected
+
+def _check_chunk(url: str, written: int, max_bytes: int):
+    if written > max_bytes:
+        raise RuntimeError(f"Download exceeded {max_bytes} bytes for {url}")
+
+def _check_complete(url: str, written: int, expected):
+    if expected is not None and written != expected:
+        raise RuntimeError(f"Truncated download for {url}: {written}/{expected} bytes")
+
+async def download_file(url: str, dest_path: str, max_bytes: int = None, resume: bool = False):
+    """
+    Streams `url` to `dest_path` in chunks without buffering the body in memory.
+    Interrupted transfers are resumed with Range requests; with resume=True an existing
+    partial file at dest_path is continued as well.
+    Raises RuntimeError on bad status, size-cap violations or a truncated body.
+    """
     if not url.startswith("http"):
-        print(f"Invalid download URL: {url}")
-        return
+        raise RuntimeError(f"Invalid download URL: {url}")
 
-    async with httpx.AsyncClient() as client:
+    max_bytes = max_bytes or settings.DOWNLOAD_MAX_BYTES
+    client = get_http_client()
+    written = os.path.getsize(dest_path) if resume and os.path.exists(dest_path) else 0
+    expected = None
+
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        headers = {**DOWNLOAD_HEADERS, "Range": f"bytes={written}-"} if written else dict(DOWNLOAD_HEADERS)
         try:
-            resp = await client.get(url, follow_redirects=True)
-            with open(dest_path, "wb") as f:
-                f.write(resp.content)
-        except Exception as e:
-            print(f"Download failed for {url}: {e}")
+            async with client.stream("GET", url, headers=headers) as resp:
+                started = _start_body(resp, url, written, expected, max_bytes)
+                if started is None:
+                    break
+                mode, written, expected = started
+
+                with open(dest_path, mode) as f:
+                    async for chunk in resp.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        written += len(chunk)
+                        _check_chunk(url, written, max_bytes)
+                        f.write(chunk)
+            break
+
+        except httpx.TransportError as e:
+            if attempt == DOWNLOAD_RETRIES:
+                raise RuntimeError(f"Download failed for {url}: {e}")
+            print(f"Download interrupted for {url} at {written} bytes ({e}), resuming...")
+            await asyncio.sleep(attempt)
+
+    _check_complete(url, written, expected)
+    return dest_path
+
+def download_file_sync(url: str, dest_path: str, max_bytes: int = None, resume: bool = False):
+    """Blocking download_file on the shared sync client, for callers outside an event loop."""
+    if not url.startswith("http"):
+        raise RuntimeError(f"Invalid download URL: {url}")
+
+    max_bytes = max_bytes or settings.DOWNLOAD_MAX_BYTES
+    client = get_sync_http_client()
+    written = os.path.getsize(dest_path) if resume and os.path.exists(dest_path) else 0
+    expected = None
+
+    for attempt in range(1, DOWNLOAD_RETRIES + 1):
+        headers = {**DOWNLOAD_HEADERS, "Range": f"bytes={written}-"} if written else dict(DOWNLOAD_HEADERS)
+        try:
+            with client.stream("GET", url, headers=headers) as resp:
+                started = _start_body(resp, url, written, expected, max_bytes)
+                if started is None:
+                    break
+                mode, written, expected = started
+
+                with open(dest_path, mode) as f:
+                    for chunk in resp.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        written += len(chunk)
+                        _check_chunk(url, written, max_bytes)
+                        f.write(chunk)
+            break
+
+        except httpx.TransportError as e:
+            if attempt == DOWNLOAD_RETRIES:
+                raise RuntimeError(f"Download failed for {url}: {e}")
+            print(f"Download interrupted for {url} at {written} bytes ({e}), resuming...")
+            time.sleep(attempt)
+
+    _check_complete(url, written, expected)
+    return dest_path
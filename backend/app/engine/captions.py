@@ -0,0 +1,131 @@
+# myg/backend/app/engine/captions.py
+import bisect
+import logging
+import numpy as np
+from app.engine import text_raster
+
+logger = logging.getLogger(__name__)
+
+# Word-level caption tracks.
+# A caption track is one timeline track ({"type": "captions", "cues": [...], "style": {...}})
+# instead of one text clip per word. For rendering, every distinct cue is rasterized
+# once into a single sprite sheet; each frame blits at most one sprite per track.
+
+TRACK_TYPE = "captions"
+DEFAULT_STYLE = {"font": text_raster.DEFAULT_FONT, "size": 80, "color": "yellow", "y_pos": 1300, "x_pos": "center", "words_per_screen": 1}
+SHEET_WIDTH = 4096
+HOLD_GAP = 0.6  # seconds; shorter pauses keep the previous cue on screen instead of flashing empty
+
+# --- 1. Track Generation ---
+
+def group_words(words: list, words_per_screen: int = 1) -> list:
+    """Groups word timestamps [{word, start, end}] into cues [{text, start, end}]."""
+    n = max(int(words_per_screen or 1), 1)
+    cues = []
+    for i in range(0, len(words), n):
+        group = words[i:i + n]
+        text = " ".join(w["word"].strip() for w in group if w["word"].strip())
+        if text:
+            cues.append({"text": text, "start": float(group[0]["start"]), "end": float(group[-1]["end"])})
+
+    # Bridge short pauses so captions do not blink between words
+    for cue, nxt in zip(cues, cues[1:]):
+        if 0 < nxt["start"] - cue["end"] < HOLD_GAP:
+            cue["end"] = nxt["start"]
+    return cues
+
+def caption_track(words: list, caption_settings: dict = None, track_id: int = 103) -> dict:
+    """Timeline track carrying word-timed cues and the task's CaptionSettings."""
+    style = {**DEFAULT_STYLE, **{k: v for k, v in (caption_settings or {}).items() if v is not None}}
+    return {
+        "id": track_id, "type": TRACK_TYPE, "label": "Captions",
+        "cues": group_words(words, style["words_per_screen"]),
+        "style": style,
+    }
+
+def tracks(timeline: list) -> list:
+    return [t for t in timeline if t.get('type') == TRACK_TYPE and not t.get('isHidden')]
+
+# --- 2. Sprite Sheet ---
+
+def _trim(rgba):
+    """Crops transparent columns so sprites pack tightly."""
+    cols = np.flatnonzero(rgba[:, :, 3].any(axis=0))
+    return rgba[:, cols[0]:cols[-1] + 1] if cols.size else rgba[:, :1]
+
+def _anchor(style: dict, w: int, h: int, width: int, height: int):
+    """Top-left of a w x h sprite: x_pos 'center'/'left'/'right' or a pixel center, y_pos a pixel center."""
+    x_pos = style.get("x_pos", "center")
+    margin = int(width * 0.05)
+    if x_pos == "left":
+        x = margin
+    elif x_pos == "right":
+        x = width - margin - w
+    elif x_pos in (None, "center"):
+        x = (width - w) // 2
+    else:
+        x = int(float(x_pos)) - w // 2
+    y = int(float(style.get("y_pos", height * 0.8))) - h // 2
+    # Settings are often authored for another aspect ratio; keep the caption inside the frame
+    x = min(max(x, 0), max(width - w, 0))
+    y = min(max(y, 0), max(height - h - int(height * 0.03), 0))
+    return x, y
+
+def prepare(track: dict, width: int, height: int) -> dict:
+    """
+    Rasterizes every distinct cue once and packs them into one sprite sheet (shelf packing).
+    Returns {rgb, alpha, starts, sprites}: sprites[i] = (start, end, sx, sy, w, h, x, y) sorted by start.
+    """
+    style = {**DEFAULT_STYLE, **track.get("style", {})}
+    wrap_width = int(width * 0.8)
+    cues = sorted(track.get("cues", []), key=lambda c: c["start"])
+
+    images, placed = {}, {}
+    for cue in cues:
+        if cue["text"] not in images:
+            images[cue["text"]] = _trim(text_raster.rasterize(
+                cue["text"], font=style["font"], size=style["size"], color=style["color"],
+                wrap_width=wrap_width, stroke_width=max(1, int(style["size"]) // 20)
+            ))
+
+    sheet_w = max([SHEET_WIDTH] + [img.shape[1] for img in images.values()])
+    cx = cy = shelf_h = 0
+    for text, img in images.items():
+        h, w = img.shape[:2]
+        if cx + w > sheet_w:
+            cx, cy, shelf_h = 0, cy + shelf_h, 0
+        placed[text] = (cx, cy)
+        cx += w
+        shelf_h = max(shelf_h, h)
+
+    sheet = np.zeros((max(cy + shelf_h, 1), sheet_w, 4), dtype=np.uint8)
+    for text, img in images.items():
+        sx, sy = placed[text]
+        sheet[sy:sy + img.shape[0], sx:sx + img.shape[1]] = img
+
+    sprites = []
+    for cue in cues:
+        img = images[cue["text"]]
+        h, w = img.shape[:2]
+        sx, sy = placed[cue["text"]]
+        x, y = _anchor(style, w, h, width, height)
+        sprites.append((cue["start"], cue["end"], sx, sy, w, h, x, y))
+
+    logger.info(f"💬 Caption sheet: {len(cues)} cues, {len(images)} sprites, {sheet.shape[1]}x{sheet.shape[0]}")
+    return {
+        "rgb": np.ascontiguousarray(sheet[:, :, :3]),
+        "alpha": sheet[:, :, 3:4].astype(np.uint16),
+        "starts": [s[0] for s in sprites],
+        "sprites": sprites,
+    }
+
+def active(prepared: dict, t: float):
+    """The sprite on screen at time t, or None."""
+    i = bisect.bisect_right(prepared["starts"], t) - 1
+    if i < 0:
+        return None
+    sprite = prepared["sprites"][i]
+    return sprite if t < sprite[1] else None
+
+def cues_between(track: dict, t0: float, t1: float) -> list:
+    return [c for c in track.get("cues", []) if c["start"] < t1 and c["end"] > t0]
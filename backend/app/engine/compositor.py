@@ -0,0 +1,301 @@
+# myg/backend/app/engine/compositor.py
+import os
+import sys
+import time
+import logging
+import subprocess
+import numpy as np
+from PIL import Image as PILImage
+from app.engine import overlays, text_raster, captions
+from app.engine.timeline import FFMPEG_BINARY, audio_mix_args, place
+
+logger = logging.getLogger(__name__)
+
+# Frame-level compositor: the plan is precompiled into spans of frames with a constant
+# layer stack, each video source is decoded and scaled once by ffmpeg at the output fps,
+# layers are blended with vectorized NumPy and raw frames are piped into the encoder.
+
+# --- 1. Support Check ---
+
+def unsupported_reasons(plan: dict) -> list:
+    reasons = list(plan["unsupported"])
+    for layer in plan["layers"]:
+        if layer["type"] == 'video' and layer["rotation"]:
+            reasons.append(f"rotated video clip {layer['id']}")
+    return reasons
+
+def supports(plan: dict) -> bool:
+    """True when every layer of the plan can be rendered without MoviePy."""
+    return not unsupported_reasons(plan)
+
+# --- 2. Layer Sources ---
+
+class VideoLayerReader:
+    """Decodes one video layer pre-scaled to its target size at the output frame rate."""
+
+    def __init__(self, layer: dict, fps: int, offset: float):
+        w, h = layer["size"]
+        self.frame_bytes = w * h * 3
+        self.shape = (h, w, 3)
+        self.last = None
+
+        cmd = [FFMPEG_BINARY, "-loglevel", "error"]
+        if layer.get("loop"):
+            cmd += ["-stream_loop", "-1"]
+            offset = offset % max(layer["source_duration"], 1e-3)
+        if offset > 0:
+            cmd += ["-ss", f"{offset:.3f}"]
+        cmd += [
+            "-i", layer["path"], "-an",
+            "-vf", f"scale={w}:{h}:flags=bilinear,fps={fps}",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-"
+        ]
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=self.frame_bytes * 2)
+
+    def next_frame(self):
+        data = self.proc.stdout.read(self.frame_bytes)
+        if len(data) == self.frame_bytes:
+            self.last = np.frombuffer(data, dtype=np.uint8).reshape(self.shape)
+        elif self.last is None:
+            self.last = np.zeros(self.shape, dtype=np.uint8)
+        # Past the end of a non-looping source: hold the last frame (MoviePy behaviour)
+        return self.last
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.stdout.close()
+        self.proc.wait()
+
+def _rasterize_text(layer: dict):
+    """Renders a text layer to an RGBA array (cached across layers with the same text/style)."""
+    props = layer["props"]
+    return text_raster.rasterize(
+        layer["content"],
+        size=props.get('fontSize', 60),
+        color=props.get('color', 'white'),
+        wrap_width=layer["wrap_width"]
+    )
+
+def _static_rgba(layer: dict, width: int, height: int):
+    """Loads, scales and rotates an image/text layer once. Returns (rgb, alpha, x, y)."""
+    if layer["type"] == 'text':
+        rgba = _rasterize_text(layer)
+        img = PILImage.fromarray(rgba, "RGBA")
+        target_w = int(width * (float(layer["props"].get('width', 100)) / 100.0))
+        if target_w > 0 and target_w != img.width:
+            img = img.resize((target_w, max(1, int(img.height * target_w / img.width))), PILImage.BILINEAR)
+    else:
+        with PILImage.open(layer["path"]) as src:
+            img = src.convert("RGBA").resize(layer["size"], PILImage.BILINEAR)
+
+    if layer["rotation"]:
+        img = img.rotate(-layer["rotation"], resample=PILImage.BILINEAR, expand=True)
+
+    rgba = np.asarray(img)
+    alpha = rgba[:, :, 3:4].astype(np.uint16)
+    if layer["opacity"] < 1:
+        alpha = (alpha * layer["opacity"]).astype(np.uint16)
+    x, y = place(layer, img.width, img.height, width, height)
+    opaque = bool((alpha == 255).all())
+    return np.ascontiguousarray(rgba[:, :, :3]), (None if opaque else alpha), x, y
+
+# --- 3. Blending ---
+
+def blit(canvas, rgb, alpha, x: int, y: int):
+    """
+    Alpha-blends `rgb` onto `canvas` at (x, y), clipping to the canvas bounds.
+    alpha is None (opaque), a uint16 scalar, or a uint16 (h, w, 1) array in 0..255.
+    """
+    H, W = canvas.shape[:2]
+    h, w = rgb.shape[:2]
+    x0, y0, x1, y1 = max(x, 0), max(y, 0), min(x + w, W), min(y + h, H)
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    src = rgb[y0 - y:y1 - y, x0 - x:x1 - x]
+    dst = canvas[y0:y1, x0:x1]
+    if alpha is None:
+        dst[...] = src
+        return
+
+    a = alpha if np.isscalar(alpha) else alpha[y0 - y:y1 - y, x0 - x:x1 - x]
+    blended = (src.astype(np.uint16) * a + dst.astype(np.uint16) * (255 - a) + 127) // 255
+    dst[...] = blended.astype(np.uint8)
+
+def draw_captions(canvas, caption_sheets: list, t: float):
+    """Blits the active cue of each prepared caption track (see captions.prepare) at time t."""
+    for sheet in caption_sheets:
+        sprite = captions.active(sheet, t)
+        if sprite is None:
+            continue
+        _, _, sx, sy, w, h, x, y = sprite
+        blit(canvas, sheet["rgb"][sy:sy + h, sx:sx + w], sheet["alpha"][sy:sy + h, sx:sx + w], x, y)
+    return canvas
+
+# --- 4. Scheduling ---
+
+def frame_spans(plan: dict, first_frame: int, last_frame: int):
+    """
+    Precompiles the plan into [(f0, f1, [layer indices])]: consecutive frame ranges
+    over which the visible layer stack does not change.
+    """
+    fps = plan["fps"]
+    bounds = []
+    for i, layer in enumerate(plan["layers"]):
+        f0 = max(first_frame, int(np.ceil(layer["start"] * fps - 1e-6)))
+        f1 = min(last_frame, int(np.ceil(layer["end"] * fps - 1e-6)))
+        if f0 < f1:
+            bounds.append((f0, f1, i))
+
+    cuts = sorted({first_frame, last_frame, *[b[0] for b in bounds], *[b[1] for b in bounds]})
+    spans = []
+    for f0, f1 in zip(cuts, cuts[1:]):
+        active = [i for (s, e, i) in bounds if s <= f0 and e >= f1]
+        spans.append((f0, f1, active))
+    return spans
+
+# --- 5. Rendering ---
+
+def _encoder_cmd(plan: dict, output_path: str, t_start: float, t_end: float, with_audio: bool, preset: str, gop: int = None):
+    W, H, fps = plan["width"], plan["height"], plan["fps"]
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{W}x{H}", "-r", str(fps), "-i", "-"
+    ]
+    audio_label = None
+    if with_audio:
+        inputs, graph, audio_label = audio_mix_args(plan["audio"], plan["duration"])
+        if audio_label:
+            cmd += inputs + ["-filter_complex", graph]
+
+    cmd += ["-map", "0:v", "-c:v", "libx264", "-preset", preset, "-pix_fmt", "yuv420p"]
+    if gop:
+        cmd += ["-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0"]
+    if audio_label:
+        cmd += ["-map", audio_label, "-c:a", "aac"]
+    cmd += ["-t", f"{t_end - t_start:.3f}", output_path]
+    return cmd
+
+def render(plan: dict, output_path: str, progress_callback=None, t_start: float = 0.0, t_end: float = None,
+           with_audio: bool = True, preset: str = "ultrafast", gop: int = None) -> str:
+    """
+    Renders [t_start, t_end) of the plan to `output_path`.
+    progress_callback(fraction) receives 0..1 as frames are written.
+    """
+    W, H, fps = plan["width"], plan["height"], plan["fps"]
+    t_end = plan["duration"] if t_end is None else t_end
+    first_frame, last_frame = int(round(t_start * fps)), int(round(t_end * fps))
+    total = max(last_frame - first_frame, 1)
+
+    background = np.empty((H, W, 3), dtype=np.uint8)
+    background[...] = plan["background"]
+    canvas = np.empty_like(background)
+    # Static vignette: one fixed-point multiply per finished frame
+    vignette = overlays.vignette_gain(W, H, plan["vignette"]) if plan["vignette"] > 0 else None
+    scratch = np.empty((H, W, 3), dtype=np.uint16) if vignette is not None else None
+
+    statics = {}   # layer index -> (rgb, alpha, x, y), rasterized once
+    caption_sheets = [captions.prepare(track, W, H) for track in plan["captions"]]
+    readers = {}   # layer index -> VideoLayerReader, open only while the layer is visible
+
+    encoder = subprocess.Popen(_encoder_cmd(plan, output_path, t_start, t_end, with_audio, preset, gop), stdin=subprocess.PIPE)
+    try:
+        written = 0
+        for f0, f1, active in frame_spans(plan, first_frame, last_frame):
+            for i in list(readers):
+                if i not in active:
+                    readers.pop(i).close()
+
+            for i in active:
+                layer = plan["layers"][i]
+                if layer["type"] == 'video' and i not in readers:
+                    readers[i] = VideoLayerReader(layer, fps, f0 / fps - layer["start"])
+                elif layer["type"] != 'video' and i not in statics:
+                    statics[i] = _static_rgba(layer, W, H)
+
+            for n in range(f0, f1):
+                canvas[...] = background
+                for i in active:
+                    layer = plan["layers"][i]
+                    if layer["type"] == 'video':
+                        frame = readers[i].next_frame()
+                        alpha = np.uint16(int(layer["opacity"] * 255)) if layer["opacity"] < 1 else None
+                        x, y = place(layer, frame.shape[1], frame.shape[0], W, H)
+                        blit(canvas, frame, alpha, x, y)
+                    else:
+                        rgb, alpha, x, y = statics[i]
+                        blit(canvas, rgb, alpha, x, y)
+
+                if vignette is not None:
+                    overlays.apply_gain(canvas, vignette, scratch)
+                if caption_sheets:
+                    draw_captions(canvas, caption_sheets, n / fps)
+                encoder.stdin.write(canvas.tobytes())
+                written += 1
+                if progress_callback and written % max(fps, 1) == 0:
+                    progress_callback(written / total)
+
+        encoder.stdin.close()
+        if encoder.wait() != 0:
+            raise RuntimeError(f"ffmpeg encoder exited with code {encoder.returncode}")
+    finally:
+        for reader in readers.values():
+            reader.close()
+        if encoder.poll() is None:
+            encoder.kill()
+            encoder.wait()
+
+    if progress_callback:
+        progress_callback(1.0)
+    return output_path
+
+# --- 6. Benchmark ---
+
+def _synthetic_timeline(media_dir: str, tracks: int = 10, duration: float = 10.0) -> list:
+    """Builds a 10-track timeline of generated test clips: a full-frame base plus overlays."""
+    timeline = []
+    for t in range(tracks):
+        path = os.path.join(media_dir, f"src_{t}.mp4")
+        if not os.path.exists(path):
+            subprocess.run([
+                FFMPEG_BINARY, "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"testsrc2=size=1280x720:rate=24:duration={duration / 2}",
+                "-f", "lavfi", "-i", f"sine=frequency={220 + 40 * t}:duration={duration / 2}",
+                "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest", path
+            ], check=True)
+        props = {"width": 100, "height": 100, "x": 50, "y": 50, "opacity": 1, "volume": 0.2}
+        if t > 0:
+            props = {"width": 25, "height": 25, "x": 10 + (t * 9) % 80, "y": 15 + (t * 17) % 70, "opacity": 0.8, "volume": 0.1}
+        timeline.append({
+            "id": t, "type": "video", "isMuted": t > 2,
+            "clips": [{"id": f"c{t}", "type": "video", "src": path, "start": 0, "duration": duration, "properties": props}]
+        })
+    return timeline
+
+def benchmark(width: int = 1920, height: int = 1080, duration: float = 10.0, fps: int = 24):
+    """Compares render fps of the MoviePy path and this compositor on the synthetic timeline."""
+    import tempfile
+    from app.engine import video, timeline as timeline_plan
+
+    media_dir = tempfile.mkdtemp(prefix="compositor_bench_")
+    timeline = _synthetic_timeline(media_dir, duration=duration)
+    frames = int(duration * fps)
+
+    started = time.perf_counter()
+    video.render_timeline(timeline, os.path.join(media_dir, "moviepy.mp4"), width, height, duration, fps, engine="moviepy")
+    moviepy_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    plan = timeline_plan.compile_timeline(timeline, lambda p: p, width, height, duration, fps)
+    render(plan, os.path.join(media_dir, "compositor.mp4"))
+    compositor_s = time.perf_counter() - started
+
+    print(f"{'engine':<12}{'seconds':>10}{'fps':>10}")
+    print(f"{'moviepy':<12}{moviepy_s:>10.2f}{frames / moviepy_s:>10.1f}")
+    print(f"{'compositor':<12}{compositor_s:>10.2f}{frames / compositor_s:>10.1f}")
+    print(f"speedup: {moviepy_s / compositor_s:.1f}x  (outputs in {media_dir})")
+
+if __name__ == "__main__":
+    # Usage: python -m app.engine.compositor [width height duration]
+    benchmark(*[int(a) for a in sys.argv[1:4]])
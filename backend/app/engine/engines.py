@@ -0,0 +1,146 @@
+# myg/backend/app/engine/engines.py
+import os
+import shutil
+import logging
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from app.config import settings
+from app.engine import compositor, ffmpeg_graph, stream_copy, render_cache
+
+logger = logging.getLogger(__name__)
+
+# Render engine selection shared by both renderers.
+# 'auto' tries stream copy (simple clip sequences), then the pure-ffmpeg filtergraph, then
+# the frame compositor; when none supports the plan the caller renders with MoviePy.
+ENGINES = {
+    "copy": stream_copy,
+    "ffmpeg": ffmpeg_graph,
+    "compositor": compositor,
+}
+
+# --- 1. Engine Selection ---
+
+def select_engine(plan: dict, requested: str = None):
+    """Returns the engine name to use for `plan`, or None for the MoviePy fallback."""
+    requested = requested or settings.RENDER_ENGINE
+    if requested == "moviepy":
+        return None
+
+    candidates = ["copy", "ffmpeg", "compositor"] if requested == "auto" else [requested]
+    for name in candidates:
+        engine = ENGINES.get(name)
+        if engine is None:
+            raise ValueError(f"Unknown render engine '{name}'")
+        reasons = engine.unsupported_reasons(plan)
+        if not reasons:
+            logger.info(f"🎞️ Render engine: {name}")
+            return name
+        logger.info(f"Render engine '{name}' skipped: {'; '.join(reasons)}")
+    return None
+
+# --- 2. Segmented Rendering ---
+
+def segment_bounds(plan: dict, segment_seconds: float = None):
+    """
+    Splits the plan into [(t_start, t_end)] chunks whose lengths are whole GOPs,
+    so every chunk starts on a keyframe and they can be concatenated without re-encoding.
+    Returns (gop_frames, bounds).
+    """
+    fps = plan["fps"]
+    segment_seconds = segment_seconds or settings.RENDER_SEGMENT_SECONDS
+    gop = max(int(round(fps * segment_seconds)), 1)
+    total_frames = int(round(plan["duration"] * fps))
+
+    bounds = []
+    for f0 in range(0, total_frames, gop):
+        f1 = min(f0 + gop, total_frames)
+        bounds.append((f0 / fps, f1 / fps))
+    return gop, bounds
+
+def _render_segment(engine_name: str, plan: dict, output_path: str, t_start: float, t_end: float, gop: int) -> str:
+    # Module-level so it can be pickled into a process pool
+    return ENGINES[engine_name].render(plan, output_path, t_start=t_start, t_end=t_end, with_audio=False, gop=gop)
+
+def _segment_executor(workers: int):
+    """
+    Process pool for chunk rendering. Celery prefork children are daemonic and may not
+    fork; there the chunks run on threads, which still parallelize since the heavy
+    lifting happens in the ffmpeg child processes and in GIL-releasing NumPy blits.
+    """
+    if multiprocessing.current_process().daemon:
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render-seg")
+    return ProcessPoolExecutor(max_workers=workers)
+
+def render_segmented(engine_name: str, plan: dict, output_path: str, progress_callback=None,
+                     workers: int = None, incremental: bool = False) -> str:
+    """
+    Renders GOP-aligned chunks in parallel, then concatenates them without re-encoding.
+    With `incremental`, chunks whose layer stack is unchanged since a previous export are
+    reused from the chunk cache and only the rest are encoded.
+    """
+    gop, bounds = segment_bounds(plan)
+    work_dir = tempfile.mkdtemp(prefix="segments_", dir=os.path.dirname(os.path.abspath(output_path)))
+
+    try:
+        segments, jobs = [], []  # jobs: (index, render target, cache key)
+        for i, (t0, t1) in enumerate(bounds):
+            key = render_cache.chunk_key(plan, engine_name, t0, t1, gop) if incremental else None
+            cached = render_cache.lookup(key) if key else None
+            if cached:
+                segments.append(cached)
+            else:
+                segments.append(None)
+                target = render_cache.part_path(key) if key else os.path.join(work_dir, f"seg_{i:04d}.mp4")
+                jobs.append((i, target, key))
+
+        workers = workers or settings.RENDER_SEGMENT_WORKERS or os.cpu_count() or 1
+        workers = max(1, min(workers, len(jobs)))
+        logger.info(
+            f"🧩 Rendering {len(jobs)}/{len(bounds)} segments ({gop} frames each) on {workers} workers"
+            + (f", {len(bounds) - len(jobs)} reused" if incremental else "")
+        )
+
+        if jobs:
+            with _segment_executor(workers) as pool:
+                futures = {
+                    pool.submit(_render_segment, engine_name, plan, target, *bounds[i], gop): (i, target, key)
+                    for i, target, key in jobs
+                }
+                try:
+                    for done, future in enumerate(as_completed(futures), start=1):
+                        future.result()
+                        i, target, key = futures[future]
+                        segments[i] = render_cache.publish(target, key) if key else target
+                        if progress_callback:
+                            progress_callback(0.95 * done / len(futures))
+                finally:
+                    for i, target, key in jobs:
+                        if key and os.path.exists(target):
+                            os.remove(target)
+
+        stream_copy.concat_files(plan, segments, output_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if progress_callback:
+        progress_callback(1.0)
+    return output_path
+
+# --- 3. Entry Point ---
+
+def render_plan(plan: dict, output_path: str, progress_callback=None, engine: str = None, incremental: bool = False) -> bool:
+    """
+    Renders with the best supported engine. Returns False if the caller must use MoviePy.
+    `incremental` renders through the chunk cache so unchanged spans of a re-export are reused.
+    """
+    selected = select_engine(plan, engine)
+    if selected is None:
+        return False
+
+    # Stream copy is I/O bound already; chunking only pays off for engines that encode
+    if selected != "copy" and (incremental or plan["duration"] >= settings.RENDER_SEGMENT_MIN_DURATION):
+        render_segmented(selected, plan, output_path, progress_callback, incremental=incremental)
+    else:
+        ENGINES[selected].render(plan, output_path, progress_callback=progress_callback)
+    return True
@@ -0,0 +1,56 @@
+# myg/backend/app/engine/fake_gradio.py
+import os
+import time
+import random
+import tempfile
+import threading
+
+class FakeGradioClient:
+    """
+    Local stand-in for gradio_client.Client used to exercise the batch engine
+    without a Space. predict() sleeps for `latency` seconds, fails with probability
+    `failure_rate`, and returns the path of a small temp file like a real Space would.
+      fail_prompts: {prompt: number of calls that fail before it succeeds (None = always)}
+      max_in_flight: highest number of concurrent predict() calls seen
+    """
+
+    def __init__(self, latency: float = 0.5, failure_rate: float = 0.0, payload: bytes = b"\x00" * 1024,
+                 seed: int = None, fail_prompts: dict = None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.payload = payload
+        self.fail_prompts = dict(fail_prompts or {})
+        self.calls = 0
+        self.prompt_calls = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _should_fail(self, prompt) -> bool:
+        if prompt not in self.fail_prompts:
+            return self._random.random() < self.failure_rate
+        remaining = self.fail_prompts[prompt]
+        return remaining is None or self.prompt_calls[prompt] <= remaining
+
+    def predict(self, *args, api_name: str = None, **kwargs):
+        prompt = kwargs.get("prompt", args[0] if args else None)
+        with self._lock:
+            self.calls += 1
+            self.prompt_calls[prompt] = self.prompt_calls.get(prompt, 0) + 1
+            fail = self._should_fail(prompt)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if fail:
+            raise RuntimeError(f"Fake Space error on {api_name}")
+
+        fd, path = tempfile.mkstemp(suffix=".mp4", prefix="fake_gradio_")
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.payload)
+        return path
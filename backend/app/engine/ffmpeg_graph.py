@@ -0,0 +1,165 @@
+# myg/backend/app/engine/ffmpeg_graph.py
+import os
+import logging
+import subprocess
+import numpy as np
+from app.engine import overlays
+from app.engine.timeline import FFMPEG_BINARY, audio_mix_args, place, rotated_size
+
+logger = logging.getLogger(__name__)
+
+# Timeline -> single ffmpeg filter_complex compiler.
+# Cuts, cover/width scaling, positioned overlays, opacity, rotation and audio mixing are
+# expressed as one graph so no frame is ever decoded into Python. Plans using anything
+# else (text layers, very wide graphs) are reported unsupported and fall back.
+
+MAX_INPUTS = 48
+
+# --- 1. Support Check ---
+
+def unsupported_reasons(plan: dict) -> list:
+    reasons = list(plan["unsupported"])
+    if any(layer["type"] == 'text' for layer in plan["layers"]):
+        reasons.append("text layers")
+    if plan["captions"]:
+        reasons.append("caption tracks")
+    if len(plan["layers"]) + len(plan["audio"]) > MAX_INPUTS:
+        reasons.append(f"more than {MAX_INPUTS} inputs")
+    return reasons
+
+def supports(plan: dict) -> bool:
+    return not unsupported_reasons(plan)
+
+# --- 2. Graph Compilation ---
+
+def _hex(rgb) -> str:
+    return "0x{:02X}{:02X}{:02X}".format(*rgb)
+
+def compile_graph(plan: dict, t_start: float = 0.0, t_end: float = None, with_audio: bool = True):
+    """
+    Returns (input_args, filter_complex, video_label, audio_label) rendering [t_start, t_end).
+    Output timestamps start at 0 for t_start so chunks can be concatenated.
+    """
+    W, H, fps = plan["width"], plan["height"], plan["fps"]
+    t_end = plan["duration"] if t_end is None else t_end
+    span = t_end - t_start
+
+    inputs, chains = [], []
+    chains.append(f"color=c={_hex(plan['background'])}:s={W}x{H}:r={fps}:d={span:.3f},format=yuv420p[base]")
+    current = "[base]"
+
+    idx = 0
+    for n, layer in enumerate(plan["layers"]):
+        start, end = layer["start"] - t_start, layer["end"] - t_start
+        if end <= 0 or start >= span:
+            continue
+
+        # Seek into the source when the chunk starts mid-layer
+        offset = max(0.0, -start)
+        visible = min(end, span) - max(start, 0.0)
+        if layer["type"] == 'video':
+            if layer.get("loop"):
+                inputs += ["-stream_loop", "-1"]
+                offset = offset % max(layer["source_duration"], 1e-3)
+            if offset > 0:
+                inputs += ["-ss", f"{offset:.3f}"]
+            inputs += ["-i", layer["path"]]
+        else:
+            inputs += ["-loop", "1", "-framerate", str(fps), "-i", layer["path"]]
+
+        w, h = layer["size"]
+        chain = f"[{idx}:v]fps={fps},scale={w}:{h},trim=duration={visible:.3f},format=rgba"
+        if layer["opacity"] < 1:
+            chain += f",colorchannelmixer=aa={layer['opacity']:.3f}"
+        if layer["rotation"]:
+            # MoviePy rotate(-r) turns clockwise by r and expands the canvas
+            angle = f"{layer['rotation']:.3f}*PI/180"
+            w, h = rotated_size(w, h, layer["rotation"])
+            chain += f",rotate={angle}:ow={w}:oh={h}:c=none"
+        chain += f",setpts=PTS-STARTPTS+{max(start, 0.0):.3f}/TB[v{n}]"
+        chains.append(chain)
+
+        x, y = place(layer, w, h, W, H)
+        out = f"[o{n}]"
+        chains.append(
+            f"{current}[v{n}]overlay=x={x}:y={y}:eof_action=pass:"
+            f"enable='between(t,{max(start, 0.0):.3f},{min(end, span):.3f})'{out}"
+        )
+        current = out
+        idx += 1
+
+    if plan["vignette"] > 0:
+        # Precomputed black RGBA vignette overlaid on the finished frame
+        inputs += ["-loop", "1", "-framerate", str(fps), "-i", overlays.vignette_png(W, H, plan["vignette"])]
+        chains.append(f"[{idx}:v]trim=duration={span:.3f},format=rgba[vig]")
+        chains.append(f"{current}[vig]overlay=x=0:y=0:eof_action=pass[vout]")
+        current = "[vout]"
+        idx += 1
+
+    audio_label = None
+    if with_audio:
+        audio = []
+        for a in plan["audio"]:
+            if a["start"] >= t_end or a["start"] + a["duration"] <= t_start:
+                continue
+            start = a["start"] - t_start
+            # Entries that began before this range are trimmed at the front instead of delayed
+            offset = a.get("offset", 0.0) + max(0.0, -start)
+            audio.append({**a, "start": max(start, 0.0), "offset": offset, "duration": a["duration"] - max(0.0, -start)})
+        audio_inputs, audio_graph, audio_label = audio_mix_args(audio, span, first_input=idx)
+        inputs += audio_inputs
+        if audio_graph:
+            chains.append(audio_graph)
+
+    return inputs, ";".join(chains), current, audio_label
+
+# --- 3. Rendering ---
+
+def render(plan: dict, output_path: str, progress_callback=None, t_start: float = 0.0, t_end: float = None,
+           with_audio: bool = True, preset: str = "ultrafast", gop: int = None) -> str:
+    """Renders the plan with one ffmpeg process. progress_callback(fraction) gets 0..1."""
+    t_end = plan["duration"] if t_end is None else t_end
+    inputs, graph, video_label, audio_label = compile_graph(plan, t_start, t_end, with_audio)
+
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error", "-nostats", "-progress", "pipe:1"]
+    cmd += inputs + ["-filter_complex", graph, "-map", video_label]
+    cmd += ["-c:v", "libx264", "-preset", preset, "-pix_fmt", "yuv420p", "-r", str(plan["fps"])]
+    if gop:
+        cmd += ["-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0"]
+    if audio_label:
+        cmd += ["-map", audio_label, "-c:a", "aac"]
+    cmd += ["-t", f"{t_end - t_start:.3f}", output_path]
+
+    span_us = max((t_end - t_start) * 1_000_000, 1)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    for line in proc.stdout:
+        if progress_callback and line.startswith("out_time_us="):
+            value = line.split("=", 1)[1].strip()
+            if value.isdigit():
+                progress_callback(min(int(value) / span_us, 1.0))
+    stderr = proc.stderr.read()
+    if proc.wait() != 0:
+        raise RuntimeError(f"ffmpeg filtergraph render failed: {stderr.strip()[-500:]}")
+
+    if progress_callback:
+        progress_callback(1.0)
+    return output_path
+
+# --- 4. Golden Frames ---
+
+def extract_frame(path: str, t: float, width: int, height: int):
+    """Decodes the frame at time t as an RGB array."""
+    raw = subprocess.run(
+        [FFMPEG_BINARY, "-loglevel", "error", "-ss", f"{t:.3f}", "-i", path, "-frames:v", "1",
+         "-f", "rawvideo", "-pix_fmt", "rgb24", "-"],
+        check=True, capture_output=True
+    ).stdout
+    return np.frombuffer(raw, dtype=np.uint8).reshape((height, width, 3))
+
+def psnr(a, b) -> float:
+    mse = np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+def compare_frames(reference: str, candidate: str, times: list, width: int, height: int) -> list:
+    """PSNR (dB) of candidate vs reference at each time; > ~30 dB is visually identical."""
+    return [psnr(extract_frame(reference, t, width, height), extract_frame(candidate, t, width, height)) for t in times]
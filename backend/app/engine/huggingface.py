@@ -1,19 +1,43 @@
 # myg/backend/app/engine/huggingface.py
 import os
 import requests
-import uuid
+import time
+import random
 import logging
+import threading
+from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor
 from gradio_client import Client
 from app.config import settings
-from app.engine import s3_utils 
+from app.engine import s3_utils, result_cache
 
 logger = logging.getLogger(__name__)
 
-def generate_flux_image(prompt: str) -> bytes:
+FLUX_API_URL = "https://router.huggingface.co/hf-inference/models/black-forest-labs/FLUX.1-schnell"
+FLUX_STEPS = 4
+
+# --- RESULT CACHE KEYS ---
+
+def flux_cache_key(prompt: str) -> str:
+    return result_cache.make_key("flux", FLUX_API_URL, prompt=prompt, steps=FLUX_STEPS)
+
+def ltx_cache_key(prompt: str, aspect_ratio: str) -> str:
+    return result_cache.make_key("ltx", settings.VIDEO_SPACE_ID, prompt=prompt, aspect_ratio=aspect_ratio)
+
+def generate_flux_image(prompt: str) -> Tuple[bytes, bool]:
     """
     Calls Hugging Face FLUX.1-schnell via Serverless Inference API.
+    Identical prompts are served from the result cache.
+    Returns (image bytes, whether they came from the cache).
     """
-    API_URL = "https://router.huggingface.co/hf-inference/models/black-forest-labs/FLUX.1-schnell"
+    cache_key = flux_cache_key(prompt)
+    cached = result_cache.lookup(cache_key)
+    if cached:
+        content = result_cache.fetch_bytes(cache_key, cached)
+        if content is not None:
+            return content, True
+
+    API_URL = FLUX_API_URL
     
     headers = {
         "Authorization": f"Bearer {settings.HF_TOKEN}",
@@ -23,7 +47,7 @@ def generate_flux_image(prompt: str) -> bytes:
     payload = {
         "inputs": prompt,
         "parameters": {
-            "num_inference_steps": 4
+            "num_inference_steps": FLUX_STEPS
         }
     }
     
@@ -34,14 +58,22 @@ def generate_flux_image(prompt: str) -> bytes:
     if response.status_code != 200:
         logger.error(f"❌ Flux API Error: {response.status_code} - {response.text}")
         raise Exception(f"Hugging Face Error: {response.status_code} - {response.text}")
-        
-    return response.content
+
+    result_cache.store_bytes(cache_key, "flux", response.content, "cache/flux", ".png", "image/png")
+    return response.content, False
 
 def generate_ltx_video(prompt: str, aspect_ratio: str = "16:9") -> bytes:
     """
     Individual video generation.
     Passes aspect_ratio to the Gradio Space.
     """
+    cache_key = ltx_cache_key(prompt, aspect_ratio)
+    cached = result_cache.lookup(cache_key)
+    if cached:
+        content = result_cache.fetch_bytes(cache_key, cached)
+        if content is not None:
+            return content
+
     logger.info(f"🎬 Generating individual video: {prompt} | Ratio: {aspect_ratio}")
     try:
         client = Client(settings.VIDEO_SPACE_ID, token=settings.HF_TOKEN)
@@ -56,49 +88,150 @@ def generate_ltx_video(prompt: str, aspect_ratio: str = "16:9") -> bytes:
             
         if os.path.exists(result):
             os.remove(result)
-            
+
+        result_cache.store_bytes(cache_key, "ltx", content, "cache/ltx", ".mp4", "video/mp4")
         return content
     except Exception as e:
         logger.error(f"❌ Individual Video Generation Error: {str(e)}")
         raise e
 
-def generate_ltx_video_batch(optimized_segments: dict, aspect_ratio: str = "16:9") -> dict:
+# --- BATCH VIDEO ENGINE ---
+
+def _predict_with_retries(client, prompt: str, aspect_ratio: str, timestamp) -> str:
+    """Runs one Space prediction, retrying with exponential backoff and jitter."""
+    attempts = settings.VIDEO_BATCH_RETRIES + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            logger.info(f"🎬 Generating {aspect_ratio} video for segment at {timestamp}s (attempt {attempt}/{attempts})...")
+            return client.predict(
+                prompt=prompt,
+                aspect_ratio=aspect_ratio, # Passed to the Hugging Face Space
+                api_name="/predict"
+            )
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            delay = settings.VIDEO_BATCH_BACKOFF * (2 ** (attempt - 1))
+            delay += random.uniform(0, settings.VIDEO_BATCH_BACKOFF)
+            logger.warning(f"⚠️ Segment {timestamp}s failed ({e}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+def _store_segment(result_path: str, cache_key: str) -> str:
+    """Uploads a generated clip to its cache-addressed S3 key and removes the Gradio temp file."""
+    try:
+        size = os.path.getsize(result_path)
+        s3_key = result_cache.artifact_key("generated_segments", f"clip_{cache_key}", ".mp4")
+        logger.info(f"📦 Storing segment in S3: {s3_key}")
+        s3_utils.upload_path_to_s3(result_path, s3_key, "video/mp4")
+        result_cache.record_artifact(cache_key, "ltx", s3_key, size, shared=True)
+        return s3_key
+    finally:
+        if os.path.exists(result_path):
+            os.remove(result_path)
+
+class VideoBatchStream:
+    """
+    Incremental batch engine: segments can be submitted in several calls while earlier
+    ones are already generating (streaming pipeline). Up to `concurrency` segments are
+    generated at once; each finished clip is handed to a separate upload pool so the S3
+    upload of segment N overlaps generation of segment N+1.
+    """
+    def __init__(self, aspect_ratio: str = "16:9", concurrency: int = None, client=None):
+        self.aspect_ratio = aspect_ratio
+        self.client = client
+        self.results, self.failures = {}, {}
+        self._outstanding = 0  # segments submitted but neither stored nor failed yet
+        self._done = threading.Condition()
+        self._gen_pool = ThreadPoolExecutor(max_workers=max(1, concurrency or settings.VIDEO_BATCH_CONCURRENCY), thread_name_prefix="ltx-gen")
+        self._upload_pool = ThreadPoolExecutor(max_workers=settings.VIDEO_BATCH_UPLOAD_WORKERS, thread_name_prefix="ltx-upload")
+
+    def submit(self, optimized_segments: dict):
+        """Dispatches {timestamp: prompt}; segments generated recently are reused from the result cache."""
+        for timestamp, prompt in optimized_segments.items():
+            timestamp = float(timestamp)
+            cache_key = ltx_cache_key(prompt, self.aspect_ratio)
+            cached_key = result_cache.lookup_artifact(cache_key)
+            if cached_key:
+                with self._done:
+                    self.results[timestamp] = cached_key
+                continue
+
+            if self.client is None:
+                self.client = Client(settings.VIDEO_SPACE_ID, token=settings.HF_TOKEN)
+            with self._done:
+                self._outstanding += 1
+            future = self._gen_pool.submit(_predict_with_retries, self.client, prompt, self.aspect_ratio, timestamp)
+            future.add_done_callback(lambda f, ts=timestamp, key=cache_key: self._generated(f, ts, key))
+
+    def _settle(self, timestamp, s3_key=None, error=None):
+        with self._done:
+            if error is None:
+                self.results[timestamp] = s3_key
+            else:
+                self.failures[timestamp] = error
+            self._outstanding -= 1
+            self._done.notify_all()
+
+    def _generated(self, future, timestamp, cache_key):
+        try:
+            result_path = future.result()
+        except Exception as e:
+            logger.error(f"❌ Segment {timestamp}s failed after retries: {e}")
+            self._settle(timestamp, error=str(e))
+            return
+        upload = self._upload_pool.submit(_store_segment, result_path, cache_key)
+        upload.add_done_callback(lambda f: self._stored(f, timestamp))
+
+    def _stored(self, future, timestamp):
+        try:
+            self._settle(timestamp, s3_key=future.result())
+        except Exception as e:
+            logger.error(f"❌ Segment {timestamp}s upload failed: {e}")
+            self._settle(timestamp, error=str(e))
+
+    def finish(self):
+        """
+        Waits for every submitted segment. Returns (results, failures):
+          results:  {timestamp (float): s3_key} for every segment that succeeded
+          failures: {timestamp (float): error message} for segments that exhausted their retries
+        """
+        with self._done:
+            self._done.wait_for(lambda: self._outstanding == 0)
+        self.close()
+        logger.info(f"✅ Batch complete: {len(self.results)} succeeded, {len(self.failures)} failed")
+        return dict(self.results), dict(self.failures)
+
+    def close(self):
+        self._gen_pool.shutdown(wait=True)
+        self._upload_pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def run_video_batch(optimized_segments: dict, aspect_ratio: str = "16:9", concurrency: int = None, client=None):
+    """Generates a complete batch at once. Returns (results, failures), see VideoBatchStream.finish."""
+    with VideoBatchStream(aspect_ratio, concurrency, client) as stream:
+        stream.submit(optimized_segments)
+        return stream.finish()
+
+def generate_ltx_video_batch(optimized_segments: dict, aspect_ratio: str = "16:9", concurrency: int = None, client=None) -> dict:
     """
     Calls ZeroGPU Space for LTX-Video Generation for a batch of segments.
     Now supports aspect ratio selection.
+    Segments that fail are dropped from the result; the batch only fails if none succeed.
     """
     logger.info(f"🚀 Initializing LTX-Video Space ({settings.VIDEO_SPACE_ID}) for batch... Ratio: {aspect_ratio}")
-    
-    s3_results = {}
-    
+
     try:
-        client = Client(settings.VIDEO_SPACE_ID, token=settings.HF_TOKEN)
-        
-        for timestamp, prompt in optimized_segments.items():
-            logger.info(f"🎬 Generating {aspect_ratio} video for segment at {timestamp}s...")
-            
-            result = client.predict(
-                prompt=prompt,
-                aspect_ratio=aspect_ratio, # Passed to the Hugging Face Space
-                api_name="/predict"
-            )
-            
-            with open(result, "rb") as f:
-                content = f.read()
-            
-            file_name = f"clip_{uuid.uuid4()}.mp4"
-            s3_key = f"generated_segments/{file_name}"
-            
-            logger.info(f"📦 Storing segment in S3: {s3_key}")
-            s3_utils.upload_file_to_s3(content, s3_key, "video/mp4")
-            
-            s3_results[float(timestamp)] = s3_key
-            
-            if os.path.exists(result):
-                os.remove(result)
-            
+        s3_results, failures = run_video_batch(optimized_segments, aspect_ratio, concurrency, client)
+        if optimized_segments and not s3_results:
+            raise RuntimeError(f"All {len(failures)} segments failed: {next(iter(failures.values()))}")
         return s3_results
 
     except Exception as e:
         logger.error(f"❌ Batch Video Generation Error: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
@@ -9,6 +9,7 @@ SCRIPT_SPACE_ID = "amoghkrishnan/script_gen"
 def generate_idea(topic: str, duration: str = "30 Seconds"):
     """
     Calls the custom Qwen-2.5-7B-Instruct Space to generate a technical narration script.
+    Not result-cached: the output is sampled (temperature 0.7), so asking again must give a new script.
     """
     if not settings.HF_TOKEN:
         raise ValueError("HF_TOKEN is not configured in the environment.")
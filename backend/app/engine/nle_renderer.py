@@ -8,11 +8,13 @@ import tempfile
 import numpy as np
 from moviepy.config import change_settings
 from moviepy.editor import (
-    VideoFileClip, TextClip, CompositeVideoClip, 
-    AudioFileClip, ImageClip, ColorClip, CompositeAudioClip
+    CompositeVideoClip, 
+    ImageClip, ColorClip, CompositeAudioClip
 )
 from app.engine.assets import download_file as fetch_url_file 
-from app.engine import s3_utils 
+from app.engine import s3_utils, asset_cache, engines, proxies, overlays, text_raster, captions, compositor, sources, workspace
+from app.engine import timeline as timeline_plan
+from app.config import settings
 
 # Configure ImageMagick for text rendering (Standard Linux path)
 # Note: Ensure ImageMagick is installed on the EC2 instance: sudo apt-get install imagemagick
@@ -33,48 +35,36 @@ def hex_to_rgb(hex_color):
     hex_color = hex_color.lstrip('#')
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
-# --- CORE RENDERING ENGINE ---
-
-async def process_nle_task(task_data: dict, progress_callback=None):
+def collect_remote_sources(timeline: list) -> list:
     """
-    Entry point for NLE Export requests.
-    Downloads assets, builds the MoviePy composition, and uploads the result to S3.
+    Walks the whole timeline and returns every S3 key / URL the render will need,
+    in timeline order, skipping hidden tracks, muted audio, blobs and local files.
     """
-    def report(p):
-        if progress_callback: progress_callback(p)
-
-    report(5)
-    
-    # 1. Parse Resolution & FPS
-    res_str = task_data.get('resolution', '1920x1080')
-    fps = task_data.get('fps', 24)
-    try:
-        width, height = map(int, res_str.split('x'))
-    except Exception:
-        width, height = 1920, 1080
-    
-    timeline = task_data.get('timeline', [])
-    duration = float(task_data.get('duration', 0))
+    sources = []
+    for track in timeline:
+        if track.get('isHidden'): continue
+        for clip in track.get('clips', []):
+            c_type = clip.get('type')
+            src = clip.get('renderSrc') or clip.get('src')
+            if not src or c_type not in ['video', 'image', 'audio']: continue
+            if c_type == 'audio' and track.get('isMuted', False): continue
+            if src.startswith("blob:") or os.path.exists(src): continue
+            sources.append(src)
+    return sources
 
-    # Calculate duration if missing based on the last clip's end time
-    if duration <= 0:
-        for track in timeline:
-            for clip in track.get('clips', []):
-                end = float(clip.get('start', 0)) + float(clip.get('duration', 0))
-                duration = max(duration, end)
+# --- MOVIEPY ENGINE (fallback for timelines the compositor does not support) ---
 
-    logger.info(f"Starting NLE Render: {width}x{height} @ {fps}fps, {duration}s")
-    
+def render_with_moviepy(timeline: list, resolved_assets: dict, width: int, height: int, duration: float,
+                        fps: int, bg_color: tuple, local_output: str, report, vignette: float = 0):
     visual_clips = []
     audio_clips = []
-    
-    # 2. Base Background Layer
-    # FIXED: Use 'or' to handle cases where background_color is explicitly None in the payload
-    raw_bg = task_data.get('background_color') or '#000000'
-    bg_color = hex_to_rgb(raw_bg)
+    # One reader per distinct file, shared by every clip using it
+    registry = workspace.register(sources.SourceRegistry())
+
+    # Base Background Layer
     visual_clips.append(ColorClip(size=(width, height), color=bg_color, duration=duration))
 
-    # 3. Process Tracks & Clips
+    # Process Tracks & Clips
     # Tracks are processed in order (Bottom of list in JSON = Top layer in MoviePy)
     for track_index, track in enumerate(timeline):
         if track.get('isHidden'): continue
@@ -93,13 +83,8 @@ async def process_nle_task(task_data: dict, progress_callback=None):
                     if os.path.exists(src):
                         local_path = src
                     else:
-                        ext = os.path.splitext(src.split('?')[0])[1] or ".tmp"
-                        local_path = os.path.join(OUTPUT_DIR, f"nle_{uuid.uuid4()}{ext}")
-                        
-                        if src.startswith("http"):
-                            await fetch_url_file(src, local_path)
-                        else:
-                            s3_utils.download_file_from_s3(src, local_path)
+                        # Filled by the prefetch stage; missing means the download failed
+                        local_path = resolved_assets.get(src)
 
                 # Metadata & Properties
                 start = float(clip_data.get('start', 0))
@@ -110,7 +95,7 @@ async def process_nle_task(task_data: dict, progress_callback=None):
                 # Build Audio Clip
                 if c_type == 'audio':
                     if is_muted or not local_path: continue
-                    au = AudioFileClip(local_path)
+                    au = registry.audio(local_path, start, start + dur)
                     # Subclip ensures we don't exceed actual file duration
                     au = au.subclip(0, min(dur, au.duration))
                     audio_clips.append(au.set_start(start).volumex(volume))
@@ -119,17 +104,14 @@ async def process_nle_task(task_data: dict, progress_callback=None):
                 # Build Visual Clip
                 mp_clip = None
                 if c_type == 'text':
-                    mp_clip = TextClip(
-                        clip_data.get('content', ''), 
-                        fontsize=props.get('fontSize', 60), 
-                        color=props.get('color', 'white'), 
-                        font='Liberation-Sans-Bold',
-                        method='caption', 
-                        align='center',
-                        size=(int(width * (props.get('width', 80) / 100)), None)
-                    )
+                    mp_clip = text_raster.to_clip(text_raster.rasterize(
+                        clip_data.get('content', ''),
+                        size=props.get('fontSize', 60),
+                        color=props.get('color', 'white'),
+                        wrap_width=int(width * (props.get('width', 80) / 100))
+                    ))
                 elif c_type == 'video' and local_path:
-                    mp_clip = VideoFileClip(local_path)
+                    mp_clip = registry.video(local_path, start, start + dur)
                     # Extract internal audio if not muted
                     if not is_muted and mp_clip.audio:
                         v_au = mp_clip.audio.subclip(0, min(dur, mp_clip.duration))
@@ -171,30 +153,127 @@ async def process_nle_task(task_data: dict, progress_callback=None):
 
     report(60)
 
-    # 4. Composite & Render
+    # Composite & Render
     final_video = CompositeVideoClip(visual_clips, size=(width, height)).set_duration(duration)
+    if vignette > 0:
+        gain = overlays.vignette_gain(width, height, vignette)
+        final_video = final_video.fl_image(lambda frame: overlays.apply_gain(frame, gain))
+    caption_sheets = [captions.prepare(track, width, height) for track in captions.tracks(timeline)]
+    if caption_sheets:
+        final_video = final_video.fl(lambda gf, t: compositor.draw_captions(gf(t).copy(), caption_sheets, t))
     if audio_clips:
         final_video = final_video.set_audio(CompositeAudioClip(audio_clips))
 
-    output_filename = f"export_{uuid.uuid4()}.mp4"
-    local_output = os.path.join(OUTPUT_DIR, output_filename)
-    
     # Write final file using fast presets for NLE feedback
-    final_video.write_videofile(
-        local_output, 
-        fps=fps, 
-        codec="libx264", 
-        audio_codec="aac", 
-        preset="ultrafast", 
-        threads=4
+    try:
+        final_video.write_videofile(
+            local_output, 
+            fps=fps, 
+            codec="libx264", 
+            audio_codec="aac", 
+            preset="ultrafast", 
+            threads=4
+        )
+    finally:
+        final_video.close()
+        registry.close()
+
+# --- CORE RENDERING ENGINE ---
+
+async def process_nle_task(task_data: dict, progress_callback=None):
+    """
+    Entry point for NLE Export requests.
+    Prefetches assets, renders the timeline (fast engines, MoviePy fallback) and uploads the result to S3.
+    With `preview` set, renders a low-res/low-fps version from cached proxies instead.
+    """
+    def report(p):
+        if progress_callback: progress_callback(p)
+
+    report(5)
+    
+    # 1. Parse Resolution & FPS
+    res_str = task_data.get('resolution', '1920x1080')
+    fps = task_data.get('fps', 24)
+    try:
+        width, height = map(int, res_str.split('x'))
+    except Exception:
+        width, height = 1920, 1080
+    
+    timeline = task_data.get('timeline', [])
+    duration = float(task_data.get('duration', 0))
+
+    # Calculate duration if missing based on the last clip's end time
+    if duration <= 0:
+        for track in timeline:
+            for clip in track.get('clips', []):
+                end = float(clip.get('start', 0)) + float(clip.get('duration', 0))
+                duration = max(duration, end)
+
+    # Only forward progress when the integer percentage actually moves
+    last_reported = [5]
+    def report_step(p):
+        if p > last_reported[0]:
+            last_reported[0] = p
+            report(p)
+
+    # Preview mode: reduced resolution/fps rendered from low-res proxies of the sources
+    preview = bool(task_data.get('preview'))
+    prefetch_from = 5
+    if preview:
+        full_width = width
+        width, height, fps = proxies.preview_settings(width, height, fps)
+        visual_sources = [
+            clip.get('renderSrc') or clip.get('src')
+            for track in timeline for clip in track.get('clips', [])
+            if clip.get('type') in ('video', 'image')
+        ]
+        proxy_map = await proxies.ensure_proxies(
+            [src for src in collect_remote_sources(timeline) if src in visual_sources],
+            on_progress=lambda done, total: report_step(5 + int(25 * done / max(total, 1)))
+        )
+        timeline = proxies.preview_timeline(timeline, proxy_map, width / full_width)
+        prefetch_from = 30
+
+    logger.info(f"Starting NLE {'Preview' if preview else 'Render'}: {width}x{height} @ {fps}fps, {duration}s")
+
+    # 2. Prefetch Stage: download every distinct asset concurrently (-> 50%)
+    resolved_assets = await asset_cache.prefetch(
+        collect_remote_sources(timeline),
+        on_progress=lambda done, total: report_step(prefetch_from + int((50 - prefetch_from) * done / max(total, 1)))
     )
     
+    # 3. Base Background Layer
+    # FIXED: Use 'or' to handle cases where background_color is explicitly None in the payload
+    raw_bg = task_data.get('background_color') or '#000000'
+    bg_color = hex_to_rgb(raw_bg)
+    vignette = float(task_data.get('vignette_intensity') or 0)
+
+    output_filename = f"{'preview' if preview else 'export'}_{uuid.uuid4()}.mp4"
+    local_output = workspace.temp_path(output_filename)
+
+    # 4. Compile & Render (50% -> 90%)
+    # ffmpeg filtergraph or frame compositor when the timeline allows it, MoviePy otherwise.
+    rendered = False
+    if settings.RENDER_ENGINE != "moviepy":
+        plan = timeline_plan.compile_timeline(
+            timeline,
+            lambda src: src if os.path.exists(src) else resolved_assets.get(src),
+            width, height, duration, fps, bg_color, vignette
+        )
+        rendered = engines.render_plan(
+            plan, local_output,
+            progress_callback=lambda f: report_step(50 + int(40 * f)),
+            incremental=settings.RENDER_CHUNK_CACHE_ENABLED
+        )
+
+    if not rendered:
+        render_with_moviepy(timeline, resolved_assets, width, height, duration, fps, bg_color, local_output, report, vignette)
+
     report(90)
 
     # 5. Upload to S3 & Cleanup
     s3_key = f"completed/{output_filename}"
-    with open(local_output, 'rb') as f:
-        s3_utils.upload_file_to_s3(f.read(), s3_key, 'video/mp4')
+    s3_utils.upload_path_to_s3(local_output, s3_key, 'video/mp4')
 
     if os.path.exists(local_output): os.remove(local_output)
     
@@ -0,0 +1,61 @@
+# myg/backend/app/engine/overlays.py
+import os
+import logging
+from functools import lru_cache
+import numpy as np
+from PIL import Image as PILImage
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Static full-frame effects (vignette) precomputed once per (width, height, intensity).
+# The gain map is applied to each finished frame with one integer multiply instead of
+# alpha-compositing a masked ColorClip over every frame.
+
+GAIN_ONE = 256  # gain maps are fixed point: 256 == unchanged
+
+# --- 1. Vignette ---
+
+def vignette_alpha(width: int, height: int, intensity: float):
+    """Darkening alpha (0..1, float32) of the editor vignette: radius^1.5 scaled by intensity%."""
+    x = np.linspace(-1, 1, width, dtype=np.float32)
+    y = np.linspace(-1, 1, height, dtype=np.float32)
+    radius = np.sqrt(x[None, :] ** 2 + y[:, None] ** 2)
+    return np.clip((radius ** 1.5) * (intensity / 100.0), 0, 1)
+
+@lru_cache(maxsize=8)
+def vignette_gain(width: int, height: int, intensity: float):
+    """Ready-to-multiply (H, W, 1) uint16 gain map; cached, treat as read-only."""
+    gain = np.rint((1.0 - vignette_alpha(width, height, intensity)) * GAIN_ONE).astype(np.uint16)
+    gain.setflags(write=False)
+    return gain[:, :, None]
+
+def vignette_png(width: int, height: int, intensity: float) -> str:
+    """Black RGBA overlay of the vignette for ffmpeg graphs, written once to the asset cache."""
+    path = os.path.join(settings.ASSET_CACHE_DIR, f"vignette_{width}x{height}_{intensity:g}.png")
+    if not os.path.exists(path):
+        os.makedirs(settings.ASSET_CACHE_DIR, exist_ok=True)
+        alpha = np.rint(vignette_alpha(width, height, intensity) * 255).astype(np.uint8)
+        rgba = np.zeros((height, width, 4), dtype=np.uint8)
+        rgba[:, :, 3] = alpha
+        tmp_path = f"{path}.part.{os.getpid()}.png"
+        PILImage.fromarray(rgba, "RGBA").save(tmp_path)
+        os.replace(tmp_path, path)
+    else:
+        os.utime(path)
+    return path
+
+# --- 2. Application ---
+
+def apply_gain(frame, gain, scratch=None):
+    """
+    frame * gain in place (or into a copy when the frame is read-only, e.g. from MoviePy).
+    Pass a reusable uint16 `scratch` buffer of frame.shape to avoid per-frame allocation.
+    """
+    if scratch is None:
+        scratch = np.empty(frame.shape, dtype=np.uint16)
+    np.multiply(frame, gain, out=scratch)
+    np.right_shift(scratch, 8, out=scratch)
+    out = frame if frame.flags.writeable else np.empty_like(frame)
+    np.copyto(out, scratch, casting='unsafe')
+    return out
@@ -3,37 +3,42 @@ import logging
 import os
 import uuid
 import json 
-from app.engine import ideation, video, voice, scriptslice, json_processor, huggingface
+from app.engine import ideation, video, voice, scriptslice, json_processor, huggingface, captions, stages
 from app.engine import s3_utils 
 from app.config import settings 
 
 logger = logging.getLogger(__name__)
 
-def run_pipeline(task_data: dict, progress_callback=None):
+def build_stages(task_data: dict) -> list:
     """
-    The Standalone AI execution flow:
-    Script Generation -> TTS (Voice) -> ScriptSlice (Transcription) -> JSON Optimize -> Batch Video -> Render
-    
-    This function is strictly for automated content creation and is kept separate from 
-    direct NLE timeline rendering.
+    The Standalone AI execution flow as a stage DAG:
+    Script -> TTS (Voice) -> ScriptSlice (Transcription) -> JSON Optimize -> Batch Video -> Render
+    with the caption track built from the transcription alongside Optimize/Batch Video.
+    Every stage is idempotent and its output is checkpointed, so a retried task resumes
+    from the first stage that did not complete.
+    With PIPELINE_STREAMING, steps 3-5 collapse into one "stream" stage that optimizes and
+    dispatches each transcribed chunk while the rest of the narration is still decoding.
+    Each stage names the worker phase (queue) that runs it, see PHASES.
     """
-    def report(p):
-        if progress_callback: progress_callback(p)
+    caption_settings = task_data.get('captions')
+    transcription_mode = task_data.get('transcription_mode') or settings.TRANSCRIPTION_MODE
+    # Streaming decodes inside the generation task, so it is off when transcription has its own pool
+    streaming = settings.PIPELINE_STREAMING and not settings.TRANSCRIPTION_POOL_ENABLED
+    transcribe_phase = "transcription" if settings.TRANSCRIPTION_POOL_ENABLED else "generation"
 
     # 1. INITIAL SCRIPT GENERATION
     # Generates a script and hook based on the topic if no script is provided.
-    if not task_data.get('scripts'):
+    def script_stage(outputs, report):
+        if task_data.get('scripts'):
+            return task_data['scripts']
         report(5)
         logger.info("Generating script from title...")
         idea = ideation.generate_idea(topic=task_data.get('topic', task_data.get('title')), duration="30 Seconds")
-        task_data['scripts'] = idea['text']
-    
-    script_text = task_data['scripts']
-    report(10)
+        return idea['text']
 
-    try:
-        # 2. VOICE GENERATION (TTS -> S3)
-        # Converts the script text into an AI voice narration.
+    # 2. VOICE GENERATION (TTS -> S3)
+    # Converts the script text into an AI voice narration.
+    def voice_stage(outputs, report):
         voice_prompt_key = task_data.get('voice_url') or task_data.get('voice_prompt')
         voice_prompt_signed_url = None
         
@@ -42,18 +47,31 @@ def run_pipeline(task_data: dict, progress_callback=None):
             voice_prompt_signed_url = s3_utils.generate_signed_url(voice_prompt_key)
 
         logger.info("Step 2: Generating AI Voice narration...")
-        audio_s3_key = voice.generate_voice(script_text, voice_prompt_signed_url)
-        report(25)
+        return voice.generate_voice(outputs['script'], voice_prompt_signed_url)
 
-        # 3. SCRIPT SLICING (Audio -> Transcription Dictionary)
-        # Uses Whisper to determine exactly when each word is spoken.
-        logger.info("Step 3: Slicing script into timestamps using Whisper...")
-        raw_timestamps = scriptslice.mp3_to_timestamp_dict(audio_s3_key)
-        report(40)
+    # 3. SCRIPT SLICING (Audio -> Transcription Dictionary)
+    # Uses Whisper to determine exactly when each word is spoken. Since we synthesized the
+    # audio from script_text, 'align' mode skips decoding and only aligns the known words.
+    # With captions requested, the same pass also returns word timestamps.
+    def transcribe_stage(outputs, report):
+        logger.info(f"Step 3: Slicing script into timestamps (mode: {transcription_mode})...")
+        transcription = scriptslice.transcribe(
+            outputs['voice'],
+            mode=transcription_mode,
+            model_size=task_data.get('whisper_model'),
+            script_text=outputs['script'],
+            words=bool(caption_settings)
+        )
+        if caption_settings:
+            return {"timestamps": scriptslice.timestamp_dict(transcription), "words": transcription['words']}
+        return {"timestamps": transcription, "words": []}
 
-        # 4. JSON OPTIMIZATION
-        # Calls the amoghkrishnan/VIDEO-TIMESTAMPED-JSON Space to group timestamps into video segments.
+    # 4. JSON OPTIMIZATION
+    # Calls the amoghkrishnan/VIDEO-TIMESTAMPED-JSON Space to group timestamps into video segments.
+    def optimize_stage(outputs, report):
         logger.info("Step 4: Optimizing JSON via amoghkrishnan/VIDEO-TIMESTAMPED-JSON...")
+        # Checkpoints are JSON, so timestamp keys come back as strings
+        raw_timestamps = {float(k): v for k, v in outputs['transcribe']['timestamps'].items()}
         optimized_segments = json_processor.optimize_transcription_for_video(raw_timestamps)
         
         # --- TESTING: PRINT OPTIMIZED JSON ---
@@ -62,84 +80,203 @@ def run_pipeline(task_data: dict, progress_callback=None):
         print("="*50)
         print(json.dumps(optimized_segments, indent=4))
         print("="*50 + "\n")
+        return optimized_segments
 
-        # 5. BATCH VIDEO GENERATION
-        # Generates multiple cinematic video clips based on the optimized segments.
+    # 5. BATCH VIDEO GENERATION
+    # Generates multiple cinematic video clips based on the optimized segments.
+    # Segments finished by an earlier attempt are result-cache hits and are not regenerated.
+    def videos_stage(outputs, report):
         logger.info("Step 5: Batch generating cinematic video segments...")
-        video_segments = huggingface.generate_ltx_video_batch(optimized_segments)
-        report(75)
-
-        # 6. CONSTRUCT TIMELINE FOR RENDERER
-        # Builds a structured NLE-style timeline from the AI-generated assets.
-        logger.info("Step 6: Constructing render timeline...")
-        timeline = []
-        video_clips = []
-        
-        # Ensure timestamps are floats for sorting
-        sorted_timestamps = sorted([float(ts) for ts in video_segments.keys()])
-        
-        # Calculate precise max duration based on the start of the last clip + 5 seconds buffer
-        total_video_duration = 0
-        if sorted_timestamps:
-            total_video_duration = sorted_timestamps[-1] + 5.0
-        
-        for i, ts in enumerate(sorted_timestamps):
-            start_time = ts
-            # Calculate duration based on next segment or final end
-            duration = (sorted_timestamps[i+1] - ts) if i < len(sorted_timestamps)-1 else 5.0
-            
-            video_clips.append({
-                "id": f"clip-{ts}",
-                "type": "video",
-                "src": video_segments[ts], 
-                "start": start_time,
-                "duration": duration,
-                "properties": { "width": 100, "height": 100, "x": 50, "y": 50, "opacity": 1 }
-            })
-
-        # -- Track 1: The AI Visuals --
-        timeline.append({
-            "id": 101, "type": "video", "label": "AI Visuals", "isMuted": False,
-            "clips": video_clips
-        })
+        video_segments = huggingface.generate_ltx_video_batch(outputs['optimize'])
+        return {str(ts): key for ts, key in video_segments.items()}
 
-        # -- Track 2: The Narration Audio --
-        timeline.append({
-            "id": 102, "type": "audio", "label": "Narration", "isMuted": False,
-            "clips": [{
-                "id": "narration-main", "type": "audio", "src": audio_s3_key,
-                "start": 0, 
-                "duration": total_video_duration, 
-                "properties": { "volume": 1.0 }
-            }]
-        })
+    # 3-5. STREAMED SLICING -> OPTIMIZE -> BATCH VIDEO
+    # Each transcribed chunk is optimized and its segments are queued for generation at
+    # once, so the first clips render on the Space while later audio is still decoding.
+    def stream_stage(outputs, report):
+        logger.info(f"Steps 3-5: Streaming transcription into video generation (mode: {transcription_mode})...")
+        timestamps, words, optimized = {}, [], {}
+        chunks = scriptslice.iter_transcription(
+            outputs['voice'],
+            mode=transcription_mode,
+            model_size=task_data.get('whisper_model'),
+            script_text=outputs['script'],
+            words=bool(caption_settings)
+        )
+        with huggingface.VideoBatchStream() as batch:
+            for n, chunk in enumerate(chunks, start=1):
+                chunk_timestamps = scriptslice.timestamp_dict(chunk)
+                segments = json_processor.optimize_transcription_for_video(chunk_timestamps)
+                batch.submit(segments)
+                timestamps.update(chunk_timestamps)
+                words += chunk['words']
+                optimized.update({str(ts): prompt for ts, prompt in segments.items()})
+                logger.info(f"📤 Chunk {n}: dispatched {len(segments)} segments")
+                report(min(25 + n * 5, 45))
+            video_segments, failures = batch.finish()
 
-        # 7. FINAL RENDER
-        # Passes the generated timeline to the moviepy-based renderer.
+        if optimized and not video_segments:
+            raise RuntimeError(f"All {len(failures)} segments failed: {next(iter(failures.values()))}")
+        return {
+            "timestamps": {str(ts): text for ts, text in timestamps.items()},
+            "words": words,
+            "optimized": optimized,
+            "videos": {str(ts): key for ts, key in video_segments.items()},
+        }
+
+    # -- Word-level Captions (runs alongside steps 4-5) --
+    # One caption track (word-timed cues), rendered from a single sprite sheet.
+    def captions_stage(outputs, report):
+        if not caption_settings:
+            return None
+        logger.info("Step 6b: Building word-level caption track...")
+        words = outputs['stream' if streaming else 'transcribe']['words']
+        return captions.caption_track(words, caption_settings)
+
+    # 6. CONSTRUCT TIMELINE & 7. FINAL RENDER & 8. UPLOAD
+    def render_stage(outputs, report):
+        video_segments = outputs['stream']['videos'] if streaming else outputs['videos']
+        timeline, total_video_duration = build_timeline(video_segments, outputs['voice'], outputs['captions'])
+
+        # Passes the generated timeline to the renderer. This timeline is a plain sequence of
+        # full-frame clips under one narration track, so it takes the stream-copy engine.
         logger.info("Step 7: Finalizing and rendering video...")
-        task_data['timeline'] = timeline
-        task_data['duration'] = total_video_duration
+        render_data = dict(task_data)
+        render_data['timeline'] = timeline
+        render_data['duration'] = total_video_duration
         
         # Ensure resolution is landscape (1920x1080) for this pipeline
-        if not task_data.get('resolution') or task_data.get('resolution') == '1080x1920':
-             task_data['resolution'] = '1920x1080'
+        if not render_data.get('resolution') or render_data.get('resolution') == '1080x1920':
+             render_data['resolution'] = '1920x1080'
              
-        final_video_path = video.render_video(task_data, None, progress_callback)
+        final_video_path = video.render_video(render_data, None, lambda p: report(75 + int(p * 0.2)))
         
         # 8. UPLOAD FINAL VIDEO TO S3
         final_s3_key = f"completed/final_{uuid.uuid4()}.mp4"
-        with open(final_video_path, 'rb') as f:
-            s3_utils.upload_file_to_s3(f.read(), final_s3_key, 'video/mp4')
+        s3_utils.upload_path_to_s3(final_video_path, final_s3_key, 'video/mp4')
 
         # Cleanup local temporary file
         if os.path.exists(final_video_path): os.remove(final_video_path)
+        return final_s3_key
 
-        report(100)
+    if streaming:
+        return [
+            {"name": "script", "deps": [], "fn": script_stage, "progress": 10, "phase": "generation"},
+            {"name": "voice", "deps": ["script"], "fn": voice_stage, "progress": 25, "phase": "generation"},
+            {"name": "stream", "deps": ["voice", "script"], "fn": stream_stage, "progress": 75, "phase": "generation"},
+            {"name": "captions", "deps": ["stream"], "fn": captions_stage, "progress": 75, "phase": "generation"},
+            {"name": "render", "deps": ["stream", "voice", "captions"], "fn": render_stage, "progress": 95, "phase": "finalize"},
+        ]
+    return [
+        {"name": "script", "deps": [], "fn": script_stage, "progress": 10, "phase": "generation"},
+        {"name": "voice", "deps": ["script"], "fn": voice_stage, "progress": 25, "phase": "generation"},
+        {"name": "transcribe", "deps": ["voice", "script"], "fn": transcribe_stage, "progress": 40, "phase": transcribe_phase},
+        {"name": "optimize", "deps": ["transcribe"], "fn": optimize_stage, "progress": 45, "phase": "generation"},
+        {"name": "captions", "deps": ["transcribe"], "fn": captions_stage, "progress": 45, "phase": "generation"},
+        {"name": "videos", "deps": ["optimize"], "fn": videos_stage, "progress": 75, "phase": "generation"},
+        {"name": "render", "deps": ["videos", "voice", "captions"], "fn": render_stage, "progress": 95, "phase": "finalize"},
+    ]
+
+# Worker phases of a pipeline run. Each phase is one Celery task on its own queue that runs
+# the stages of that phase it can reach, checkpoints them and hands the run to next_phase():
+#   generation    script, voice, optimize, videos (remote I/O; transcription too unless pooled)
+#   transcription Whisper / alignment on the warm TRANSCRIPTION_POOL_ENABLED pool
+#   finalize      render + upload
+PHASES = ("generation", "transcription", "finalize")
+
+def next_phase(task_data: dict, state: dict):
+    """Phase of the first stage not yet done in `state`, or None when the run is complete."""
+    done = {name for name, record in ((state or {}).get("stages") or {}).items() if record.get("status") == "done"}
+    for stage in build_stages(task_data):
+        if stage["name"] not in done:
+            return stage["phase"]
+    return None
+
+def build_timeline(video_segments: dict, audio_s3_key: str, caption_track: dict = None):
+    """
+    6. CONSTRUCT TIMELINE FOR RENDERER
+    Builds a structured NLE-style timeline from the AI-generated assets.
+    Returns (timeline, total_video_duration).
+    """
+    logger.info("Step 6: Constructing render timeline...")
+    timeline = []
+    video_clips = []
+    
+    # Ensure timestamps are floats for sorting
+    segments = {float(ts): key for ts, key in video_segments.items()}
+    sorted_timestamps = sorted(segments.keys())
+    
+    # Calculate precise max duration based on the start of the last clip + 5 seconds buffer
+    total_video_duration = 0
+    if sorted_timestamps:
+        total_video_duration = sorted_timestamps[-1] + 5.0
+    
+    for i, ts in enumerate(sorted_timestamps):
+        start_time = ts
+        # Calculate duration based on next segment or final end
+        duration = (sorted_timestamps[i+1] - ts) if i < len(sorted_timestamps)-1 else 5.0
+        
+        video_clips.append({
+            "id": f"clip-{ts}",
+            "type": "video",
+            "src": segments[ts], 
+            "start": start_time,
+            "duration": duration,
+            "properties": { "width": 100, "height": 100, "x": 50, "y": 50, "opacity": 1 }
+        })
+
+    # -- Track 1: The AI Visuals --
+    timeline.append({
+        "id": 101, "type": "video", "label": "AI Visuals", "isMuted": False,
+        "clips": video_clips
+    })
+
+    # -- Track 2: The Narration Audio --
+    timeline.append({
+        "id": 102, "type": "audio", "label": "Narration", "isMuted": False,
+        "clips": [{
+            "id": "narration-main", "type": "audio", "src": audio_s3_key,
+            "start": 0, 
+            "duration": total_video_duration, 
+            "properties": { "volume": 1.0 }
+        }]
+    })
+
+    # -- Track 3: Word-level Captions --
+    if caption_track:
+        timeline.append(caption_track)
+
+    return timeline, total_video_duration
+
+def run_pipeline(task_data: dict, progress_callback=None, state: dict = None, on_checkpoint=None, phase: str = None):
+    """
+    Runs the Standalone AI execution flow (see build_stages).
+    `state` is the checkpoint state saved by a previous attempt (Task.pipeline_state) and
+    `on_checkpoint(state)` persists it after every stage transition.
+    With a `phase`, only that phase's stages run (others are restored from checkpoints) and
+    None is returned unless the run finished; the caller then dispatches next_phase().
+    
+    This function is strictly for automated content creation and is kept separate from 
+    direct NLE timeline rendering.
+    """
+    run_id = task_data.get('id') or uuid.uuid4()
+
+    try:
+        stage_list = build_stages(task_data)
+        runnable = None if phase is None else {s["name"] for s in stage_list if s["phase"] == phase}
+        outputs = stages.run_dag(
+            stage_list, run_id,
+            state=state, on_checkpoint=on_checkpoint, progress_callback=progress_callback, runnable=runnable
+        )
+        if 'render' not in outputs:
+            return None
+        # Reported as "Finalizing": "Completed" is published by the caller once the result is stored
+        if progress_callback: progress_callback(100)
         return {
-            "video_url": final_s3_key,
-            "script_used": script_text
+            "video_url": outputs['render'],
+            "script_used": outputs['script']
         }
 
     except Exception as e:
         logger.error(f"❌ Pipeline Failed: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
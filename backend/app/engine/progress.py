@@ -0,0 +1,167 @@
+# myg/backend/app/engine/progress.py
+import json
+import time
+import asyncio
+import logging
+import threading
+from typing import Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Task progress reporting.
+# Renderers call the progress callback many times per second. Ticks are coalesced
+# (PROGRESS_MIN_INTERVAL / PROGRESS_MIN_DELTA) and the survivors go to a Redis hash the API
+# reads; the tasks table is only written when the status text changes. Without Redis,
+# coalesced ticks fall back to the database so progress stays visible.
+# Every published tick is also sent on the owner's pub/sub channel for the SSE endpoint.
+
+KEY_PREFIX = "myg:progress:"
+CHANNEL_PREFIX = "myg:progress:user:"
+
+# Set by the task lifecycle only after the result is committed, never by progress ticks
+TERMINAL_STATUSES = ("Completed",)
+
+def channel(owner_id) -> str:
+    return f"{CHANNEL_PREFIX}{owner_id}"
+
+_redis = None
+_redis_retry_at = 0.0
+_redis_lock = threading.Lock()
+
+def _store():
+    """Lazily connects to Redis. Returns None while it is unreachable (retried every 60s)."""
+    global _redis, _redis_retry_at
+    with _redis_lock:
+        if _redis is None and time.time() >= _redis_retry_at:
+            try:
+                import redis
+                url = settings.PROGRESS_REDIS_URL or settings.CELERY_BROKER_URL
+                _redis = redis.Redis.from_url(url, socket_timeout=2, decode_responses=True)
+                _redis.ping()
+            except Exception as e:
+                logger.warning(f"⚠️ Progress store unavailable, falling back to the database: {e}")
+                _redis = None
+                _redis_retry_at = time.time() + 60
+        return _redis
+
+# --- 1. Hot Progress ---
+
+def publish(task_id, progress: float, status: str, owner_id=None, eta: float = None) -> bool:
+    """
+    Writes the latest progress/status for a task and, with an owner, pushes it to their
+    channel. Returns False if Redis is unavailable.
+    """
+    r = _store()
+    if r is None:
+        return False
+    try:
+        key = f"{KEY_PREFIX}{task_id}"
+        event = {"task_id": task_id, "progress": progress, "status": status, "eta": eta, "updated_at": time.time()}
+        pipe = r.pipeline()
+        pipe.hset(key, mapping={k: ("" if v is None else v) for k, v in event.items() if k != "task_id"})
+        pipe.expire(key, settings.PROGRESS_TTL)
+        if owner_id:
+            pipe.publish(channel(owner_id), json.dumps(event))
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Progress publish failed for task {task_id}: {e}")
+        return False
+
+def read(task_id) -> Optional[dict]:
+    """{progress, status, eta, updated_at} last published for a task, or None."""
+    r = _store()
+    if r is None:
+        return None
+    try:
+        raw = r.hgetall(f"{KEY_PREFIX}{task_id}")
+    except Exception as e:
+        logger.warning(f"⚠️ Progress read failed for task {task_id}: {e}")
+        return None
+    if not raw:
+        return None
+    # The tasks table stores whole percentages
+    return {
+        "progress": int(round(float(raw["progress"]))),
+        "status": raw["status"],
+        "eta": float(raw["eta"]) if raw.get("eta") else None,
+        "updated_at": float(raw["updated_at"]),
+    }
+
+async def events(owner_id, heartbeat: float = None):
+    """
+    Yields progress events published for the owner's tasks, and None every `heartbeat`
+    seconds without one (so the caller can keep the connection alive and notice disconnects).
+    """
+    import redis.asyncio as aioredis
+    url = settings.PROGRESS_REDIS_URL or settings.CELERY_BROKER_URL
+    heartbeat = heartbeat or settings.PROGRESS_SSE_HEARTBEAT
+    client = aioredis.Redis.from_url(url, decode_responses=True)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(channel(owner_id))
+    try:
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat)
+            if message is None:
+                yield None
+            elif message["type"] == "message":
+                yield json.loads(message["data"])
+            else:
+                await asyncio.sleep(0)
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
+
+# --- 2. Reporter ---
+
+class ProgressReporter:
+    """
+    Coalescing progress sink for one task.
+      persist(progress, status): durable write (DB commit), called on status transitions
+      on_publish(progress, status): optional hook for every tick that passes the throttle
+      owner_id: user whose event channel receives the ticks
+    The ETA extrapolates the average rate since this reporter started.
+    update() returns True when the tick passed the throttle, so callers can gate periodic
+    work (quota checks) on it. Terminal statuses are reported as "Finalizing": the task
+    lifecycle publishes them itself once the result is stored.
+    """
+    def __init__(self, task_id, persist, on_publish=None, owner_id=None):
+        self.task_id = task_id
+        self.persist = persist
+        self.on_publish = on_publish
+        self.owner_id = owner_id
+        self._status = None
+        self._progress = None
+        self._published_at = 0.0
+        self._started_at = time.time()
+        self._start_progress = None
+
+    def eta(self, progress: float, now: float) -> Optional[float]:
+        done = progress - self._start_progress
+        if done <= 0 or progress >= 100:
+            return None
+        return round((now - self._started_at) * (100 - progress) / done, 1)
+
+    def update(self, progress: float, status: str) -> bool:
+        if status in TERMINAL_STATUSES:
+            status = "Finalizing"
+        now = time.time()
+        transition = status != self._status
+        if not transition:
+            if progress == self._progress:
+                return False
+            if (now - self._published_at < settings.PROGRESS_MIN_INTERVAL
+                    and abs(progress - self._progress) < settings.PROGRESS_MIN_DELTA):
+                return False
+
+        if self._start_progress is None:
+            self._start_progress = progress
+        self._status, self._progress, self._published_at = status, progress, now
+        hot = publish(self.task_id, progress, status, owner_id=self.owner_id, eta=self.eta(progress, now))
+        if self.on_publish:
+            self.on_publish(progress, status)
+        if transition or not hot:
+            self.persist(progress, status)
+        return True
@@ -0,0 +1,143 @@
+# myg/backend/app/engine/proxies.py
+import os
+import copy
+import asyncio
+import hashlib
+import logging
+import subprocess
+from PIL import Image as PILImage
+from app.config import settings
+from app.engine import s3_utils, asset_cache
+from app.engine.timeline import FFMPEG_BINARY, IMAGE_EXTENSIONS, probe
+
+logger = logging.getLogger(__name__)
+
+# Low-resolution proxies of timeline media for preview exports.
+# A proxy is generated once per source and stored in S3 next to the original
+# ("<key>.proxy.mp4"); remote URLs get a key under proxies/ derived from the URL.
+
+PROXY_MARKER = ".proxy"
+
+# --- 1. Keys ---
+
+ALPHA_EXTENSIONS = ('.png', '.webp', '.gif')
+
+def proxy_key(src: str) -> str:
+    path = src.split('?')[0].lower()
+    if path.endswith(ALPHA_EXTENSIONS):
+        ext = ".png"  # Overlays may carry transparency
+    elif path.endswith(IMAGE_EXTENSIONS):
+        ext = ".jpg"
+    else:
+        ext = ".mp4"
+    if src.startswith("http"):
+        digest = hashlib.sha256(src.split('?')[0].encode("utf-8")).hexdigest()
+        return f"proxies/{digest}{PROXY_MARKER}{ext}"
+    return f"{src}{PROXY_MARKER}{ext}"
+
+# --- 2. Generation ---
+
+def _proxy_filter(short_side: int) -> str:
+    # Shrink the short side to `short_side`, keep the aspect ratio and even dimensions
+    return f"scale='if(gt(iw,ih),-2,{short_side})':'if(gt(iw,ih),{short_side},-2)'"
+
+def _transcode(local_path: str, out_path: str, short_side: int):
+    if not out_path.endswith(".mp4"):
+        with PILImage.open(local_path) as img:
+            img = img.convert("RGBA" if out_path.endswith(".png") else "RGB")
+            scale = short_side / min(img.size)
+            img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))), PILImage.BILINEAR)
+            img.save(out_path, quality=85) if out_path.endswith(".jpg") else img.save(out_path)
+        return
+
+    cmd = [
+        FFMPEG_BINARY, "-y", "-loglevel", "error", "-i", local_path,
+        "-vf", f"{_proxy_filter(short_side)},fps={settings.PREVIEW_MAX_FPS}",
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", "28", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "96k", out_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg proxy failed for {local_path}: {result.stderr.strip()[-500:]}")
+
+def ensure_proxy(src: str) -> str:
+    """
+    Returns the S3 key of the proxy for `src`, generating and uploading it on first use.
+    Sources that are already small enough are returned unchanged.
+    """
+    key = proxy_key(src)
+    if s3_utils.get_s3_etag(key):
+        return key
+
+    local_path = asset_cache.resolve(src)
+    size = probe(local_path)["size"]
+    if not size or min(size) <= settings.PROXY_SHORT_SIDE:
+        return src
+
+    logger.info(f"🪶 Generating proxy for {src}")
+    out_path = os.path.join(settings.ASSET_CACHE_DIR, f"proxy_{os.getpid()}_{os.path.basename(key)}")
+    try:
+        _transcode(local_path, out_path, settings.PROXY_SHORT_SIDE)
+        content_type = {".jpg": 'image/jpeg', ".png": 'image/png'}.get(os.path.splitext(key)[1], 'video/mp4')
+        s3_utils.upload_path_to_s3(out_path, key, content_type)
+    finally:
+        if os.path.exists(out_path):
+            os.remove(out_path)
+    return key
+
+async def ensure_proxies(sources, concurrency: int = None, on_progress=None) -> dict:
+    """
+    ensure_proxy() for many sources in parallel. Returns {src: proxy_src};
+    sources whose proxy could not be made map to themselves (full-res fallback).
+    """
+    unique = list(dict.fromkeys(sources))
+    semaphore = asyncio.Semaphore(concurrency or settings.ASSET_PREFETCH_CONCURRENCY)
+    proxies = {}
+    done = 0
+
+    async def make_one(src):
+        nonlocal done
+        async with semaphore:
+            try:
+                proxies[src] = await asyncio.to_thread(ensure_proxy, src)
+            except Exception as e:
+                logger.error(f"Proxy failed for {src}, using original: {e}")
+                proxies[src] = src
+            finally:
+                done += 1
+                if on_progress:
+                    on_progress(done, len(unique))
+
+    await asyncio.gather(*(make_one(src) for src in unique))
+    return proxies
+
+# --- 3. Preview Timelines ---
+
+def preview_settings(width: int, height: int, fps: int):
+    """Scaled (even) resolution and capped fps for a preview of a width x height export."""
+    scale = settings.PREVIEW_SCALE
+    p_w = max(2, int(width * scale) // 2 * 2)
+    p_h = max(2, int(height * scale) // 2 * 2)
+    return p_w, p_h, min(int(fps), settings.PREVIEW_MAX_FPS)
+
+def preview_timeline(timeline: list, proxies: dict, scale: float) -> list:
+    """
+    Copy of the timeline that points video/image clips at their proxies and scales
+    pixel-based text properties, so the layout matches the full-size export.
+    """
+    timeline = copy.deepcopy(timeline)
+    for track in timeline:
+        if track.get('type') == 'captions':
+            style = track.setdefault('style', {})
+            for key in ('size', 'y_pos', 'x_pos'):
+                if isinstance(style.get(key), (int, float)):
+                    style[key] = max(1, int(round(style[key] * scale)))
+        for clip in track.get('clips', []):
+            src = clip.get('renderSrc') or clip.get('src')
+            if clip.get('type') in ('video', 'image') and src in proxies:
+                clip['renderSrc'] = proxies[src]
+            elif clip.get('type') == 'text':
+                props = clip.setdefault('properties', {}) or {}
+                props['fontSize'] = max(1, int(round(float(props.get('fontSize', 60)) * scale)))
+                clip['properties'] = props
+    return timeline
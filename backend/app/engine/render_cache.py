@@ -0,0 +1,88 @@
+# myg/backend/app/engine/render_cache.py
+import os
+import json
+import hashlib
+import logging
+import threading
+from app.config import settings
+from app.engine import captions
+
+logger = logging.getLogger(__name__)
+
+# Encoded-chunk cache for incremental re-exports.
+# Each GOP-aligned chunk is keyed by the hash of its effective layer stack (sources,
+# transforms, text, timing relative to the chunk) plus canvas and encoder settings.
+# Chunks live in the worker asset cache, so its LRU eviction and pinning apply and
+# concurrent Celery children share them; a re-export only re-encodes chunks whose key changed.
+
+CHUNK_PREFIX = "chunk_"
+
+# Editor properties that do not affect the picture (audio is mixed once at concat time)
+NON_VISUAL_PROPS = {"volume"}
+
+# --- 1. Keys ---
+
+def source_id(path: str) -> str:
+    """
+    Content identity of a layer source. Asset cache entries are already named by
+    source + validator and get touched on every hit, so only their name and size count.
+    """
+    if not path:
+        return ""
+    st = os.stat(path)
+    if os.path.dirname(os.path.abspath(path)) == os.path.abspath(settings.ASSET_CACHE_DIR):
+        return f"{os.path.basename(path)}:{st.st_size}"
+    return f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+def _layer_signature(layer: dict, t0: float) -> dict:
+    signature = {k: v for k, v in layer.items() if k not in ("id", "path", "props")}
+    signature["source"] = source_id(layer.get("path"))
+    signature["props"] = {k: v for k, v in layer["props"].items() if k not in NON_VISUAL_PROPS}
+    # Timing relative to the chunk, so a chunk whose stack merely moved in time still matches
+    signature["start"] = round(layer["start"] - t0, 4)
+    signature["end"] = round(layer["end"] - t0, 4)
+    return signature
+
+def chunk_key(plan: dict, engine: str, t0: float, t1: float, gop: int) -> str:
+    """Hash of everything visible in [t0, t1) plus the canvas and encoder settings."""
+    stack = [
+        _layer_signature(layer, t0)
+        for layer in plan["layers"]
+        if layer["start"] < t1 and layer["end"] > t0
+    ]
+    caption_stack = [
+        {"style": track.get("style"), "cues": [
+            {"text": c["text"], "start": round(c["start"] - t0, 4), "end": round(c["end"] - t0, 4)}
+            for c in captions.cues_between(track, t0, t1)
+        ]}
+        for track in plan["captions"]
+    ]
+    canonical = json.dumps({
+        "engine": engine, "gop": gop, "span": round(t1 - t0, 4), "captions": caption_stack,
+        "canvas": [plan["width"], plan["height"], plan["fps"], list(plan["background"]), plan["vignette"]],
+        "stack": stack,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+# --- 2. Storage ---
+
+def chunk_path(key: str) -> str:
+    return os.path.join(settings.ASSET_CACHE_DIR, f"{CHUNK_PREFIX}{key}.mp4")
+
+def lookup(key: str):
+    """Local path of a cached chunk (refreshing its LRU position) or None."""
+    path = chunk_path(key)
+    if not os.path.exists(path):
+        return None
+    os.utime(path)
+    return path
+
+def part_path(key: str) -> str:
+    """Temporary render target; the '.part.' marker keeps eviction away from it."""
+    os.makedirs(settings.ASSET_CACHE_DIR, exist_ok=True)
+    return f"{chunk_path(key)}.part.{os.getpid()}.{threading.get_ident()}.mp4"
+
+def publish(tmp_path: str, key: str) -> str:
+    path = chunk_path(key)
+    os.replace(tmp_path, path)
+    return path
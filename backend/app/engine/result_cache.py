@@ -0,0 +1,196 @@
+# myg/backend/app/engine/result_cache.py
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from typing import Optional
+from app.config import settings
+from app.engine import s3_utils
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed cache for deterministic remote generation results (videos, images, voices).
+# Artifacts live in S3 under a key derived from the request hash; a Redis index holds
+# metadata, enforces the TTL and tracks last access for size-based LRU eviction.
+# Eviction deletes the artifacts the cache alone owns (results served as bytes). Artifacts
+# whose S3 key was handed out (lookup_artifact / record_artifact(shared=True)) end up in
+# pipeline checkpoints and saved timelines, so evicting them only forgets the entry and the
+# object then belongs to whatever references it.
+
+INDEX_PREFIX = "myg:rc:entry:"
+LRU_KEY = "myg:rc:lru"       # sorted set: hash -> last access time
+OBJECTS_KEY = "myg:rc:objects"  # hash: hash -> {s3_key, size, shared}, outlives the TTL'd entry
+BYTES_KEY = "myg:rc:bytes"   # total bytes stored
+
+_redis = None
+_redis_retry_at = 0.0
+_redis_lock = threading.Lock()
+
+def _index():
+    """Lazily connects to the Redis index. Returns None if the cache is disabled or unreachable."""
+    global _redis, _redis_retry_at
+    if not settings.RESULT_CACHE_ENABLED:
+        return None
+    with _redis_lock:
+        if _redis is None and time.time() >= _redis_retry_at:
+            try:
+                import redis
+                url = settings.RESULT_CACHE_REDIS_URL or settings.CELERY_BROKER_URL
+                _redis = redis.Redis.from_url(url, socket_timeout=2, decode_responses=True)
+                _redis.ping()
+            except Exception as e:
+                logger.warning(f"⚠️ Result cache disabled, index unavailable: {e}")
+                _redis = None
+                _redis_retry_at = time.time() + 60
+        return _redis
+
+# --- 1. Keys ---
+
+def strip_signature(url: Optional[str]) -> Optional[str]:
+    """Drops the query string so presigned URLs for the same object hash identically."""
+    return url.split('?')[0] if url else url
+
+def make_key(endpoint: str, space_id: str, **params) -> str:
+    """Hash of (endpoint, model/space id, params) with params in canonical order."""
+    canonical = json.dumps({"endpoint": endpoint, "space": space_id, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def artifact_key(prefix: str, key: str, ext: str) -> str:
+    """Deterministic S3 key for a cached artifact (random when caching is disabled)."""
+    name = key if settings.RESULT_CACHE_ENABLED else str(uuid.uuid4())
+    return f"{prefix}/{name}{ext}"
+
+# --- 2. Lookup ---
+
+def _drop(r, key: str):
+    """Removes an entry, its bookkeeping and, unless its key was handed out, its S3 artifact."""
+    raw = r.hget(OBJECTS_KEY, key)
+    obj = json.loads(raw) if raw else {}
+    pipe = r.pipeline()
+    pipe.delete(INDEX_PREFIX + key)
+    pipe.zrem(LRU_KEY, key)
+    pipe.hdel(OBJECTS_KEY, key)
+    if obj.get("size"):
+        pipe.decrby(BYTES_KEY, int(obj["size"]))
+    pipe.execute()
+
+    if obj.get("s3_key") and not obj.get("shared"):
+        s3_utils.delete_file_from_s3(obj["s3_key"])
+
+def _forget(key: str, reason):
+    """Drops an entry whose artifact is gone, so the caller regenerates it."""
+    logger.warning(f"⚠️ Cached artifact unavailable, dropping {key[:12]}: {reason}")
+    r = _index()
+    if r is None:
+        return
+    try:
+        _drop(r, key)
+    except Exception as e:
+        logger.warning(f"⚠️ Result cache drop failed: {e}")
+
+def _share(r, key: str):
+    """Marks an entry's artifact as referenced outside the cache (never deleted on eviction)."""
+    raw = r.hget(OBJECTS_KEY, key)
+    if raw:
+        obj = json.loads(raw)
+        if not obj.get("shared"):
+            obj["shared"] = True
+            r.hset(OBJECTS_KEY, key, json.dumps(obj))
+
+def lookup(key: str) -> Optional[dict]:
+    """Returns the cache entry for `key` (refreshing its LRU position) or None on a miss."""
+    r = _index()
+    if r is None:
+        return None
+    try:
+        raw = r.get(INDEX_PREFIX + key)
+        if raw is None:
+            # Expired by TTL: clean up the bookkeeping left behind
+            if r.zscore(LRU_KEY, key) is not None:
+                _drop(r, key)
+            return None
+        r.zadd(LRU_KEY, {key: time.time()})
+        entry = json.loads(raw)
+        logger.info(f"⚡ Result cache hit: {entry.get('endpoint')} {key[:12]}")
+        return entry
+    except Exception as e:
+        logger.warning(f"⚠️ Result cache lookup failed: {e}")
+        return None
+
+def fetch_bytes(key: str, entry: dict) -> Optional[bytes]:
+    """Reads a cached artifact. A missing object counts as a miss and drops the entry."""
+    try:
+        return s3_utils.read_file_from_s3(entry["s3_key"])
+    except RuntimeError as e:
+        _forget(key, e)
+        return None
+
+def lookup_artifact(key: str) -> Optional[str]:
+    """
+    S3 key of a cached artifact for callers that keep referencing the key itself, or None on
+    a miss. The object must still exist; from then on eviction leaves it in place.
+    """
+    entry = lookup(key)
+    if not entry:
+        return None
+    if not s3_utils.get_s3_etag(entry["s3_key"]):
+        _forget(key, "object missing")
+        return None
+    r = _index()
+    if r is not None:
+        try:
+            _share(r, key)
+        except Exception as e:
+            logger.warning(f"⚠️ Result cache update failed: {e}")
+    return entry["s3_key"]
+
+# --- 3. Store ---
+
+def _record(key: str, entry: dict, size: int, shared: bool = False):
+    r = _index()
+    if r is None:
+        return
+    try:
+        entry["created_at"] = time.time()
+        previous = r.hget(OBJECTS_KEY, key)
+        pipe = r.pipeline()
+        if previous:
+            pipe.decrby(BYTES_KEY, int(json.loads(previous).get("size") or 0))
+        pipe.set(INDEX_PREFIX + key, json.dumps(entry), ex=settings.RESULT_CACHE_TTL)
+        pipe.zadd(LRU_KEY, {key: time.time()})
+        pipe.hset(OBJECTS_KEY, key, json.dumps({"s3_key": entry.get("s3_key"), "size": size, "shared": shared}))
+        pipe.incrby(BYTES_KEY, size)
+        pipe.execute()
+        _evict(r)
+    except Exception as e:
+        logger.warning(f"⚠️ Result cache store failed: {e}")
+
+def record_artifact(key: str, endpoint: str, s3_key: str, size: int, shared: bool = False):
+    """Indexes an artifact that was already uploaded to `s3_key` (shared: the key is handed out)."""
+    _record(key, {"endpoint": endpoint, "s3_key": s3_key, "size": size}, size, shared)
+
+def store_bytes(key: str, endpoint: str, content: bytes, prefix: str, ext: str, content_type: str) -> str:
+    """Uploads `content` under the deterministic key for `key`, indexes it and returns the S3 key."""
+    s3_key = artifact_key(prefix, key, ext)
+    s3_utils.upload_file_to_s3(content, s3_key, content_type)
+    record_artifact(key, endpoint, s3_key, len(content))
+    return s3_key
+
+# --- 4. Eviction ---
+
+def _evict(r):
+    """Removes TTL-expired entries, then least recently used ones until under the byte budget."""
+    stale = r.zrangebyscore(LRU_KEY, 0, time.time() - settings.RESULT_CACHE_TTL)
+    for key in stale:
+        _drop(r, key)
+
+    total = int(r.get(BYTES_KEY) or 0)
+    while total > settings.RESULT_CACHE_MAX_BYTES:
+        oldest = r.zrange(LRU_KEY, 0, 0)
+        if not oldest:
+            break
+        logger.info(f"♻️ Evicting cached result {oldest[0][:12]}")
+        _drop(r, oldest[0])
+        total = int(r.get(BYTES_KEY) or 0)
@@ -1,21 +1,46 @@
 # miyog/backend/app/engine/s3_utils.py
 import boto3
 import os
+import time
+import threading
+from collections import OrderedDict
 from app.config import settings
 from fastapi import HTTPException
 import logging
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
+from boto3.s3.transfer import TransferConfig
+from boto3.exceptions import S3UploadFailedError
 
 logger = logging.getLogger(__name__)
 
 # --- 1. S3 Client Initialization ---
+# boto3 clients are thread-safe but expensive to build, so one is shared per process.
+# Keyed by PID because Celery prefork children must not reuse the parent's connections.
+_clients = {}
+_clients_lock = threading.Lock()
+
 def get_s3_client():
-    return boto3.client(
-        's3',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID or None,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY or None,
-        region_name=settings.AWS_REGION
-    )
+    pid = os.getpid()
+    client = _clients.get(pid)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        if pid not in _clients:
+            _clients.clear()
+            _clients[pid] = boto3.session.Session().client(
+                's3',
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID or None,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY or None,
+                region_name=settings.AWS_REGION,
+                config=BotoConfig(
+                    max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                    retries={'max_attempts': 5, 'mode': 'adaptive'},
+                    tcp_keepalive=True
+                )
+            )
+        return _clients[pid]
 
 # --- 2. Server-side Upload Function ---
 def upload_file_to_s3(file_content: bytes, file_key: str, content_type: str):
@@ -32,7 +57,77 @@ def upload_file_to_s3(file_content: bytes, file_key: str, content_type: str):
         raise HTTPException(status_code=500, detail=f"S3 Upload Failed: {str(e)}")
     return file_key
 
-# --- 3. Presigned POST (Frontend direct upload) ---
+# --- 3. Streaming Multipart Upload (Used by Workers) ---
+def _transfer_config():
+    # Memory stays bounded at roughly chunksize * max_concurrency regardless of file size
+    return TransferConfig(
+        multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+        multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+        max_concurrency=settings.S3_UPLOAD_CONCURRENCY,
+        use_threads=True
+    )
+
+def _progress_tracker(file_key: str, total_bytes: int, progress_callback=None):
+    """
+    boto3 reports byte increments from its worker threads; this accumulates them and
+    forwards (uploaded, total) to progress_callback, logging every ~10%.
+    """
+    state = {"uploaded": 0, "logged": 0}
+    lock = threading.Lock()
+
+    def on_bytes(amount):
+        with lock:
+            state["uploaded"] += amount
+            uploaded = state["uploaded"]
+            pct = int(100 * uploaded / total_bytes) if total_bytes else 0
+            if pct >= state["logged"] + 10:
+                state["logged"] = pct - pct % 10
+                logger.info(f"⬆️ {file_key}: {uploaded}/{total_bytes} bytes ({pct}%)")
+        if progress_callback:
+            progress_callback(uploaded, total_bytes)
+
+    return on_bytes
+
+def upload_path_to_s3(local_path: str, file_key: str, content_type: str, progress_callback=None):
+    """
+    Uploads a file from disk without reading it into memory.
+    Files above S3_MULTIPART_THRESHOLD use multipart upload with parallel parts.
+    progress_callback(uploaded_bytes, total_bytes) is invoked from upload threads.
+    """
+    s3 = get_s3_client()
+    total = os.path.getsize(local_path)
+    try:
+        s3.upload_file(
+            local_path,
+            settings.S3_BUCKET_NAME,
+            file_key,
+            ExtraArgs={"ContentType": content_type},
+            Config=_transfer_config(),
+            Callback=_progress_tracker(file_key, total, progress_callback)
+        )
+    except (ClientError, S3UploadFailedError) as e:
+        logger.error(f"S3 Upload failed for {file_key}: {e}")
+        raise HTTPException(status_code=500, detail=f"S3 Upload Failed: {str(e)}")
+    return file_key
+
+def upload_stream_to_s3(fileobj, file_key: str, content_type: str, total_bytes: int = None, progress_callback=None):
+    """Same as upload_path_to_s3 for a readable binary stream (e.g. an open pipe or file)."""
+    s3 = get_s3_client()
+    try:
+        s3.upload_fileobj(
+            fileobj,
+            settings.S3_BUCKET_NAME,
+            file_key,
+            ExtraArgs={"ContentType": content_type},
+            Config=_transfer_config(),
+            Callback=_progress_tracker(file_key, total_bytes, progress_callback)
+        )
+    except (ClientError, S3UploadFailedError) as e:
+        logger.error(f"S3 Upload failed for {file_key}: {e}")
+        raise HTTPException(status_code=500, detail=f"S3 Upload Failed: {str(e)}")
+    return file_key
+
+# --- 4. Presigned POST (Frontend direct upload) ---
 def generate_presigned_post(object_name: str, file_type: str, expiration: int = 3600):
     s3 = get_s3_client()
     try:
@@ -48,7 +143,7 @@ def generate_presigned_post(object_name: str, file_type: str, expiration: int =
         logger.error(f"S3 Presigned Post Error for {object_name}: {e}")
         return None
 
-# --- 4. File Download Function (Used by Workers) ---
+# --- 5. File Download Function (Used by Workers) ---
 def download_file_from_s3(s3_key: str, local_path: str):
     s3 = get_s3_client()
     try:
@@ -62,10 +157,60 @@ def download_file_from_s3(s3_key: str, local_path: str):
         logger.error(f"S3 Download failed for {s3_key}: {e}")
         raise RuntimeError(f"S3 Download failed for {s3_key}: {e}")
 
-# --- 5. Secure Signed URL Generation (GET) ---
-def generate_signed_url(s3_key: str, expiration: int = 3600):
+# --- 6. Object Read / Delete / Head (Used by the result and asset caches) ---
+def get_s3_etag(s3_key: str):
+    s3 = get_s3_client()
+    try:
+        return s3.head_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_key).get('ETag', '').strip('"')
+    except Exception as e:
+        logger.error(f"S3 Head failed for {s3_key}: {e}")
+        return None
+
+def read_file_from_s3(s3_key: str) -> bytes:
+    s3 = get_s3_client()
+    try:
+        response = s3.get_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_key)
+        return response['Body'].read()
+    except Exception as e:
+        logger.error(f"S3 Read failed for {s3_key}: {e}")
+        raise RuntimeError(f"S3 Read failed for {s3_key}: {e}")
+
+def delete_file_from_s3(s3_key: str):
     s3 = get_s3_client()
+    try:
+        s3.delete_object(Bucket=settings.S3_BUCKET_NAME, Key=s3_key)
+    except Exception as e:
+        logger.error(f"S3 Delete failed for {s3_key}: {e}")
+
+# --- 7. Secure Signed URL Generation (GET) ---
+# Task polling asks for the same URL every few seconds; a URL is reused until it is
+# within SIGNED_URL_REFRESH_MARGIN seconds of expiring.
+_signed_urls = OrderedDict()  # (s3_key, expiration) -> (url, expires_at)
+_signed_urls_lock = threading.Lock()
+SIGNED_URL_CACHE_SIZE = 10000
+
+def generate_signed_url(s3_key: str, expiration: int = 3600):
     if not s3_key: return None
+
+    cache_key = (s3_key, expiration)
+    now = time.time()
+    with _signed_urls_lock:
+        cached = _signed_urls.get(cache_key)
+        if cached and cached[1] - now > min(settings.SIGNED_URL_REFRESH_MARGIN, expiration / 2):
+            _signed_urls.move_to_end(cache_key)
+            return cached[0]
+
+    url = _presign_get(s3_key, expiration)
+    if url:
+        with _signed_urls_lock:
+            _signed_urls[cache_key] = (url, now + expiration)
+            _signed_urls.move_to_end(cache_key)
+            while len(_signed_urls) > SIGNED_URL_CACHE_SIZE:
+                _signed_urls.popitem(last=False)
+    return url
+
+def _presign_get(s3_key: str, expiration: int):
+    s3 = get_s3_client()
     try:
         filename = os.path.basename(s3_key)
         return s3.generate_presigned_url(
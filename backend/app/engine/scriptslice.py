@@ -1,55 +1,372 @@
 # myg/backend/app/engine/scriptslice.py
 import whisper # type: ignore
 import os
-import tempfile
-from app.engine import s3_utils
+import re
+import gc
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from app.engine import s3_utils, workspace
+from app.config import settings
 
-def mp3_to_timestamp_dict(audio_src):
+logger = logging.getLogger(__name__)
+
+# Whisper checkpoints that can be selected per task
+WHISPER_SIZES = ("tiny", "base", "small", "medium")
+
+# --- 1. Process-wide Model Registry ---
+# Approximate resident size (MB) of each checkpoint once loaded, used for budget accounting.
+MODEL_FOOTPRINT_MB = {
+    "tiny": 150,
+    "base": 300,
+    "small": 1000,
+    "medium": 2600,
+    "large": 5500,
+    "mms_fa": 1300,
+}
+
+_models = OrderedDict()  # (name, device) -> loaded model, least recently used first
+_models_lock = threading.Lock()  # Guards _models/_loading only, never held while loading
+_loading = {}  # (name, device) -> lock held by the thread loading that model
+
+def _footprint(name: str) -> int:
+    return MODEL_FOOTPRINT_MB.get(name.split(".")[0].split("-")[0], MODEL_FOOTPRINT_MB["large"])
+
+def _evict_for(required_mb: int):
+    """Drops least recently used models until `required_mb` fits in the memory budget."""
+    budget = settings.WHISPER_MEMORY_BUDGET_MB
+    used = sum(_footprint(name) for name, _ in _models)
+    while _models and used + required_mb > budget:
+        (name, device), _ = _models.popitem(last=False)
+        used -= _footprint(name)
+        logger.info(f"♻️ Evicting model '{name}' ({device}) to stay within {budget}MB")
+    gc.collect()
+
+def _cached(key):
+    """Caller holds _models_lock."""
+    if key in _models:
+        _models.move_to_end(key)
+        return _models[key]
+    return None
+
+def _get_cached_model(name: str, device: str, loader):
     """
-    Transcribes an audio file (local path or S3 key) and returns a dictionary.
-    Key: Start time in seconds (float)
-    Value: The transcribed text
+    Returns the cached model for (name, device), loading it on a miss. A cold load only
+    blocks callers waiting for that same model; hits on other models proceed meanwhile.
     """
-    local_path = audio_src
-    is_temp = False
+    key = (name, device)
+    with _models_lock:
+        model = _cached(key)
+        if model is not None:
+            return model
+        load_lock = _loading.setdefault(key, threading.Lock())
 
-    # 1. Resolve S3 key to a local file if necessary
-    if not os.path.exists(audio_src):
-        print(f"📥 Downloading audio from S3 for transcription: {audio_src}")
-        temp_dir = tempfile.gettempdir()
-        local_path = os.path.join(temp_dir, f"transcribe_{os.path.basename(audio_src)}")
-        s3_utils.download_file_from_s3(audio_src, local_path)
-        is_temp = True
+    with load_lock:
+        with _models_lock:
+            # Loaded by another thread while we waited
+            model = _cached(key)
+            if model is not None:
+                return model
+            _evict_for(_footprint(name))
 
-    try:
-        # 2. Load the Whisper model
-        # Using 'medium' for high accuracy as requested in your original logic
-        print("🎙️ Loading Whisper 'medium' model...")
-        model = whisper.load_model("medium")
+        try:
+            print(f"🎙️ Loading '{name}' model on {device}...")
+            model = loader()
+            with _models_lock:
+                _models[key] = model
+            return model
+        finally:
+            with _models_lock:
+                _loading.pop(key, None)
+
+def get_whisper_model(size: str = None, device: str = None):
+    """
+    Returns a loaded Whisper model, loading it lazily on first use.
+    Models are kept for the lifetime of the process, keyed by (size, device).
+    """
+    size = size or settings.WHISPER_MODEL_SIZE
+    device = device or settings.WHISPER_DEVICE
+    return _get_cached_model(size, device, lambda: whisper.load_model(size, device=device))
+
+def get_alignment_model(device: str = None):
+    """Returns the torchaudio MMS forced-alignment model, tokenizer and aligner."""
+    device = device or settings.WHISPER_DEVICE
+
+    def load():
+        import torchaudio # type: ignore
+        bundle = torchaudio.pipelines.MMS_FA
+        return {
+            "bundle": bundle,
+            "model": bundle.get_model(with_star=False).to(device),
+            "tokenizer": bundle.get_tokenizer(),
+            "aligner": bundle.get_aligner(),
+        }
+
+    return _get_cached_model("mms_fa", device, load)
+
+def clear_model_cache():
+    """Releases every cached model (used on worker shutdown)."""
+    with _models_lock:
+        _models.clear()
+    gc.collect()
+
+# --- 2. Transcription Backends ---
+# Every backend returns {"segments": [{start, end, text}], "words": [{word, start, end}]}
+
+def _transcribe_whisper(local_path: str, model_size: str = None, script_text: str = None, words: bool = False):
+    """Free-form decoding with openai-whisper."""
+    device = settings.WHISPER_DEVICE
+    model = get_whisper_model(model_size, device)
+
+    print(f"🔍 Transcribing: {local_path}...")
+    result = model.transcribe(local_path, word_timestamps=words, fp16=(device != "cpu"))
+
+    segments, word_list = [], []
+    for segment in result['segments']:
+        segments.append({"start": segment['start'], "end": segment['end'], "text": segment['text'].strip()})
+        for w in segment.get('words', []):
+            word_list.append({"word": w['word'].strip(), "start": w['start'], "end": w['end']})
+
+    return {"segments": segments, "words": word_list}
+
+def _normalize_word(word: str) -> str:
+    # The MMS aligner vocabulary is lowercase latin letters and apostrophes only
+    return re.sub(r"[^a-z']", "", word.lower())
+
+def _align_script(local_path: str, model_size: str = None, script_text: str = None, words: bool = True):
+    """
+    Forced alignment of a known script against the audio (no decoding).
+    Used for our own TTS output, where the spoken text is exactly `script_text`.
+    """
+    if not script_text:
+        raise ValueError("Forced alignment requires the script text")
+
+    import torch # type: ignore
+    import torchaudio # type: ignore
+
+    fa = get_alignment_model()
+    bundle = fa["bundle"]
+
+    waveform, sample_rate = torchaudio.load(local_path)
+    waveform = waveform.mean(0, keepdim=True)
+    if sample_rate != bundle.sample_rate:
+        waveform = torchaudio.functional.resample(waveform, sample_rate, bundle.sample_rate)
+
+    # Keep the original spelling for output, the normalized form for the aligner
+    original = script_text.split()
+    kept = [(w, _normalize_word(w)) for w in original]
+    kept = [(w, n) for w, n in kept if n]
+    if not kept:
+        return {"segments": [], "words": []}
+
+    print(f"📐 Aligning {len(kept)} words against: {local_path}...")
+    with torch.inference_mode():
+        emission, _ = fa["model"](waveform.to(settings.WHISPER_DEVICE))
+        token_spans = fa["aligner"](emission[0], fa["tokenizer"]([n for _, n in kept]))
+
+    seconds_per_frame = waveform.size(1) / emission.size(1) / bundle.sample_rate
+    word_list = [
+        {"word": w, "start": spans[0].start * seconds_per_frame, "end": spans[-1].end * seconds_per_frame}
+        for (w, _), spans in zip(kept, token_spans)
+    ]
+
+    # Rebuild sentence-level segments from the script punctuation
+    segments, current = [], []
+    for w in word_list:
+        current.append(w)
+        if re.search(r"[.!?;:]['\"]?$", w["word"]):
+            segments.append(current)
+            current = []
+    if current:
+        segments.append(current)
+
+    return {
+        "segments": [
+            {"start": s[0]["start"], "end": s[-1]["end"], "text": " ".join(w["word"] for w in s)}
+            for s in segments
+        ],
+        "words": word_list,
+    }
+
+BACKENDS = {
+    "whisper": _transcribe_whisper,
+    "align": _align_script,
+}
 
-        # 3. Transcribe the audio
-        print(f"🔍 Transcribing: {local_path}...")
-        result = model.transcribe(local_path)
+# --- 3. Transcription ---
 
-        # 4. Extract segments and build the dictionary {start_time: text}
-        timestamp_dict = {}
-        for segment in result['segments']:
-            start_time = round(segment['start'], 2)  # Rounding to 2 decimal places
-            text = segment['text'].strip()
-            timestamp_dict[start_time] = text
+def _localize(audio_src):
+    """Returns (local_path, is_temp), downloading S3 keys into the job workspace."""
+    if os.path.exists(audio_src):
+        return audio_src, False
+    print(f"📥 Downloading audio from S3 for transcription: {audio_src}")
+    local_path = workspace.temp_path(f"transcribe_{os.path.basename(audio_src)}")
+    s3_utils.download_file_from_s3(audio_src, local_path)
+    return local_path, True
 
-        return timestamp_dict
+def transcribe_detailed(audio_src, mode: str = None, model_size: str = None, script_text: str = None, words: bool = False):
+    """
+    Transcribes an audio file (local path or S3 key) with the selected backend.
+    mode: 'whisper' (free-form decoding) or 'align' (forced alignment of script_text).
+    model_size: one of WHISPER_SIZES for the whisper backend.
+    """
+    mode = mode or "whisper"
+    if mode not in BACKENDS:
+        raise ValueError(f"Unknown transcription mode '{mode}'. Expected one of {list(BACKENDS)}")
+    if model_size and model_size not in WHISPER_SIZES:
+        raise ValueError(f"Unknown Whisper model '{model_size}'. Expected one of {list(WHISPER_SIZES)}")
+
+    # 1. Resolve S3 key to a local file if necessary
+    local_path, is_temp = _localize(audio_src)
+
+    try:
+        return BACKENDS[mode](local_path, model_size=model_size, script_text=script_text, words=words)
 
     except Exception as e:
         print(f"❌ Transcription Error: {str(e)}")
         raise e
     finally:
-        # 5. Cleanup temporary downloaded audio
+        # 2. Cleanup temporary downloaded audio
         if is_temp and os.path.exists(local_path):
             os.remove(local_path)
 
+def mp3_to_timestamp_dict(audio_src, mode: str = None, model_size: str = None, script_text: str = None):
+    """
+    Transcribes an audio file (local path or S3 key) and returns a dictionary.
+    Key: Start time in seconds (float)
+    Value: The transcribed text
+    """
+    result = transcribe_detailed(audio_src, mode=mode, model_size=model_size, script_text=script_text)
+    return timestamp_dict(result)
+
+def timestamp_dict(result: dict) -> dict:
+    """{segment start (float, 2 decimals): text} from a transcribe_detailed() result."""
+    timestamps = {}
+    for segment in result['segments']:
+        timestamps[round(segment['start'], 2)] = segment['text']  # Rounding to 2 decimal places
+    return timestamps
+
+def transcribe(audio_src, mode: str = None, model_size: str = None, script_text: str = None, words: bool = False):
+    """
+    Step 3 entry point used by the pipeline. Always transcribes in the current process:
+    with TRANSCRIPTION_POOL_ENABLED the pipeline runs this stage as its own task on the
+    warm transcription pool (see pipeline.PHASES) instead of waiting on it from another task.
+    Returns the {start: text} dict, or the full {segments, words} result when `words` is set
+    (word timestamps feed the caption track).
+    """
+    if words:
+        return transcribe_detailed(audio_src, mode=mode, model_size=model_size, script_text=script_text, words=True)
+    return mp3_to_timestamp_dict(audio_src, mode=mode, model_size=model_size, script_text=script_text)
+
+# --- 4. Streaming ---
+
+def _chunk_bounds(audio, sample_rate: int, chunk_seconds: float):
+    """
+    Sample ranges of ~chunk_seconds, each cut at the quietest 100 ms within the last
+    5 seconds of its window so chunk edges fall between words.
+    """
+    total = len(audio)
+    chunk = int(chunk_seconds * sample_rate)
+    hop = sample_rate // 10
+    start = 0
+    while start < total:
+        end = start + chunk
+        if end >= total:
+            yield start, total
+            return
+        search_from = max(start + hop, end - 5 * sample_rate)
+        frames = audio[search_from:end][: (end - search_from) // hop * hop].reshape(-1, hop)
+        if len(frames):
+            end = search_from + int((frames ** 2).mean(axis=1).argmin()) * hop + hop // 2
+        yield start, end
+        start = end
+
+def iter_transcription(audio_src, mode: str = None, model_size: str = None, script_text: str = None,
+                       words: bool = False, chunk_seconds: float = None):
+    """
+    Yields {"segments", "words"} batches (absolute times) as the audio is decoded, so
+    downstream stages can start on the first batch while the rest is still transcribing.
+    Whisper decodes the audio in chunks cut at pauses, each primed with the previous
+    chunk's text. Forced alignment needs the whole script and yields a single batch.
+    """
+    mode = mode or "whisper"
+    if mode != "whisper":
+        result = transcribe(audio_src, mode=mode, model_size=model_size, script_text=script_text, words=True)
+        yield result if words else {"segments": result["segments"], "words": []}
+        return
+
+    device = settings.WHISPER_DEVICE
+    model = get_whisper_model(model_size, device)
+    local_path, is_temp = _localize(audio_src)
+    try:
+        audio = whisper.load_audio(local_path)
+        sample_rate = whisper.audio.SAMPLE_RATE
+        prompt = None
+        for start, end in _chunk_bounds(audio, sample_rate, chunk_seconds or settings.TRANSCRIPTION_STREAM_CHUNK):
+            offset = start / sample_rate
+            print(f"🔍 Transcribing {offset:.1f}s - {end / sample_rate:.1f}s of {local_path}...")
+            result = model.transcribe(audio[start:end], word_timestamps=words, fp16=(device != "cpu"), initial_prompt=prompt)
+
+            segments, word_list = [], []
+            for segment in result['segments']:
+                segments.append({"start": segment['start'] + offset, "end": segment['end'] + offset, "text": segment['text'].strip()})
+                for w in segment.get('words', []):
+                    word_list.append({"word": w['word'].strip(), "start": w['start'] + offset, "end": w['end'] + offset})
+
+            if segments:
+                prompt = " ".join(seg["text"] for seg in segments)[-200:]
+                yield {"segments": segments, "words": word_list}
+    finally:
+        if is_temp and os.path.exists(local_path):
+            os.remove(local_path)
+
+# --- 5. Benchmark ---
+
+def _word_drift(reference: list, candidate: list) -> float:
+    """Mean absolute start-time difference (s) for words present in both transcripts, matched in order."""
+    diffs, j = [], 0
+    for ref in reference:
+        key = _normalize_word(ref["word"])
+        for k in range(j, min(j + 5, len(candidate))):
+            if _normalize_word(candidate[k]["word"]) == key:
+                diffs.append(abs(candidate[k]["start"] - ref["start"]))
+                j = k + 1
+                break
+    return sum(diffs) / len(diffs) if diffs else float("nan")
+
+def benchmark(audio_path: str, script_text: str = None, repeats: int = 2):
+    """
+    Compares wall time and word timestamp drift of every mode against whisper 'medium'.
+    The first run of each mode loads the model; the best of the warm runs is reported.
+    """
+    modes = [("whisper", size) for size in WHISPER_SIZES]
+    if script_text:
+        modes.append(("align", None))
+
+    results = {}
+    for mode, size in modes:
+        timings = []
+        for _ in range(repeats + 1):
+            t0 = time.perf_counter()
+            out = transcribe_detailed(audio_path, mode=mode, model_size=size, script_text=script_text, words=True)
+            timings.append(time.perf_counter() - t0)
+        results[(mode, size)] = {"cold": timings[0], "warm": min(timings[1:]), "words": out["words"]}
+
+    reference = results[("whisper", "medium")]["words"]
+    print(f"{'mode':<16}{'cold (s)':>10}{'warm (s)':>10}{'speedup':>9}{'drift (ms)':>12}")
+    base = results[("whisper", "medium")]["warm"]
+    for (mode, size), r in results.items():
+        label = f"{mode}:{size}" if size else mode
+        drift = _word_drift(reference, r["words"]) * 1000
+        print(f"{label:<16}{r['cold']:>10.2f}{r['warm']:>10.2f}{base / r['warm']:>8.1f}x{drift:>12.0f}")
+    return results
+
 if __name__ == "__main__":
-    # Example usage for standalone testing
-    # data = mp3_to_timestamp_dict("your-s3-key-or-local-path.wav")
-    # print(data)
-    pass
\ No newline at end of file
+    # Usage: python -m app.engine.scriptslice <audio.wav> [script.txt]
+    if len(sys.argv) < 2:
+        print("Usage: python -m app.engine.scriptslice <audio> [script.txt]")
+        sys.exit(1)
+    script = open(sys.argv[2]).read() if len(sys.argv) > 2 else None
+    benchmark(sys.argv[1], script)
@@ -0,0 +1,107 @@
+# myg/backend/app/engine/sources.py
+import logging
+import threading
+from collections import OrderedDict
+from moviepy.editor import VideoFileClip, AudioFileClip
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Per-render registry of MoviePy sources.
+# A media file's ffmpeg reader is shared by clips that use it one after another on the
+# timeline; clips derive from the shared base with subclip/loop, which keep the reader.
+# Clips overlapping in time get their own reader: interleaved reads at different offsets
+# would make FFMPEG_VideoReader restart ffmpeg on nearly every frame (backward seeks and
+# jumps of 100+ frames re-initialize it). A small LRU of decoded frames in front of each
+# reader absorbs the short back-and-forth of loops.
+
+# --- 1. Frame Cache ---
+
+def _cache_frames(reader, max_frames: int):
+    """Wraps reader.get_frame with an LRU keyed by frame index (MoviePy frames are immutable)."""
+    get_frame = reader.get_frame
+    cache = OrderedDict()
+    lock = threading.Lock()
+
+    def cached_get_frame(t):
+        key = int(reader.fps * t + 0.00001)  # Same frame index FFMPEG_VideoReader uses
+        with lock:
+            frame = cache.get(key)
+            if frame is not None:
+                cache.move_to_end(key)
+                return frame
+            frame = get_frame(t)
+            cache[key] = frame
+            if len(cache) > max_frames:
+                cache.popitem(last=False)
+            return frame
+
+    reader.get_frame = cached_get_frame
+
+# --- 2. Registry ---
+
+def _overlaps(spans: list, start: float, end: float) -> bool:
+    return any(start < s_end and s_start < end for s_start, s_end in spans)
+
+class SourceRegistry:
+    """
+    Opens the readers of a render and closes everything on close().
+    Usage: registry.video(path, start, end).subclip(0, dur) / registry.audio(path, start, end)...
+    where [start, end) is when the clip plays on the timeline. A reader is reused only by
+    clips whose spans do not overlap; without a span the clip gets a reader of its own.
+    """
+    def __init__(self, frame_cache: int = None):
+        self.frame_cache = settings.SOURCE_FRAME_CACHE if frame_cache is None else frame_cache
+        self._videos = {}  # path -> [(clip, [timeline spans])]
+        self._audios = {}
+        self.requests = 0
+
+    def _lease(self, lanes: dict, path: str, start, end, open_clip):
+        self.requests += 1
+        entries = lanes.setdefault(path, [])
+        if start is not None and end is not None:
+            for clip, spans in entries:
+                if spans is not None and not _overlaps(spans, start, end):
+                    spans.append((start, end))
+                    return clip
+        clip = open_clip(path)
+        entries.append((clip, None if start is None or end is None else [(start, end)]))
+        return clip
+
+    def _open_video(self, path: str) -> VideoFileClip:
+        clip = VideoFileClip(path)
+        if self.frame_cache > 0:
+            _cache_frames(clip.reader, self.frame_cache)
+        return clip
+
+    def video(self, path: str, start: float = None, end: float = None) -> VideoFileClip:
+        return self._lease(self._videos, path, start, end, self._open_video)
+
+    def audio(self, path: str, start: float = None, end: float = None) -> AudioFileClip:
+        return self._lease(self._audios, path, start, end, AudioFileClip)
+
+    def _clips(self) -> list:
+        return [clip for lanes in (self._videos, self._audios) for entries in lanes.values() for clip, _ in entries]
+
+    @property
+    def open_readers(self) -> int:
+        return len(self._clips())
+
+    def close(self):
+        """Closes every reader (and soundtrack reader) opened by this registry."""
+        for clip in self._clips():
+            try:
+                clip.close()
+            except Exception as e:
+                logger.warning(f"Failed to close source reader: {e}")
+        if self.requests:
+            logger.info(f"🎬 Source registry: {self.requests} clip references served by {self.open_readers} readers")
+        self._videos.clear()
+        self._audios.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
@@ -0,0 +1,132 @@
+# myg/backend/app/engine/stages.py
+import json
+import time
+import queue
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.engine import s3_utils
+
+logger = logging.getLogger(__name__)
+
+# In-process DAG scheduler for multi-stage jobs.
+# Each stage is idempotent: fn(outputs, report) -> JSON-serializable output. Stages run as
+# soon as their dependencies are done (independent ones concurrently); every output is
+# checkpointed to S3 and the job state (stage -> status/artifact) is handed to
+# on_checkpoint, which persists it (the Task row). A retry with the saved state reloads
+# finished outputs and resumes from the first incomplete stage.
+
+CHECKPOINT_PREFIX = "pipeline"
+
+# --- 1. Checkpoints ---
+
+def checkpoint_key(run_id, stage: str) -> str:
+    return f"{CHECKPOINT_PREFIX}/{run_id}/{stage}.json"
+
+def save_output(run_id, stage: str, output) -> str:
+    key = checkpoint_key(run_id, stage)
+    s3_utils.upload_file_to_s3(json.dumps(output).encode("utf-8"), key, 'application/json')
+    return key
+
+def load_output(artifact: str):
+    # read_file_from_s3 raises RuntimeError for a missing/unreadable object
+    try:
+        raw = s3_utils.read_file_from_s3(artifact)
+    except RuntimeError as e:
+        raise RuntimeError(f"Checkpoint {artifact} is missing: {e}") from e
+    return json.loads(raw)
+
+def _restore(state: dict, names) -> dict:
+    """Outputs of stages recorded as done; stages whose checkpoint cannot be read are re-run."""
+    outputs = {}
+    for name, record in (state.get("stages") or {}).items():
+        if name not in names or record.get("status") != "done":
+            continue
+        try:
+            outputs[name] = load_output(record["artifact"])
+            logger.info(f"⏭️ Stage '{name}' restored from checkpoint")
+        except (RuntimeError, ValueError, KeyError) as e:  # Missing, corrupt or unrecorded
+            logger.warning(f"Stage '{name}' checkpoint unusable, re-running: {e}")
+    return outputs
+
+# --- 2. Scheduler ---
+
+def run_dag(stages: list, run_id, state: dict = None, on_checkpoint=None, progress_callback=None,
+            max_workers: int = 3, runnable=None) -> dict:
+    """
+    stages: [{"name", "deps": [names], "fn": fn(outputs, report), "progress": int}] where
+    `progress` is the overall percentage reached when the stage completes.
+    runnable: names this call may execute (default: all); the others are only restored from
+    their checkpoints, and the call returns once no allowed stage can run.
+    Returns {stage name: output}. State updates and progress callbacks always run on the
+    calling thread, so they may use thread-bound resources such as a DB session.
+    """
+    by_name = {s["name"]: s for s in stages}
+    state = dict(state or {})
+    state["stages"] = dict(state.get("stages") or {})
+    outputs = _restore(state, by_name)
+
+    progress_queue = queue.Queue()
+    last_progress = [0]
+
+    def forward_progress():
+        while not progress_queue.empty():
+            p = progress_queue.get_nowait()
+            if progress_callback and p > last_progress[0]:
+                last_progress[0] = p
+                progress_callback(p)
+
+    def record(name, **fields):
+        state["stages"][name] = {**state["stages"].get(name, {}), **fields, "at": time.time()}
+        if on_checkpoint:
+            on_checkpoint(state)
+
+    for name in outputs:
+        progress_queue.put(by_name[name]["progress"])
+    forward_progress()
+
+    running = {}
+    error = None
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stage") as pool:
+        while True:
+            if error is None:
+                for stage in stages:
+                    name = stage["name"]
+                    if name in outputs or name in running.values():
+                        continue
+                    if runnable is not None and name not in runnable:
+                        continue
+                    if all(dep in outputs for dep in stage["deps"]):
+                        logger.info(f"▶️ Stage '{name}' started")
+                        record(name, status="running")
+                        # Each stage runs in a copy of the caller's context (workspace etc.)
+                        future = pool.submit(contextvars.copy_context().run, stage["fn"], dict(outputs), progress_queue.put)
+                        running[future] = name
+
+            if not running:
+                break
+
+            done, _ = wait(list(running), timeout=0.5, return_when=FIRST_COMPLETED)
+            forward_progress()
+            for future in done:
+                name = running.pop(future)
+                try:
+                    output = future.result()
+                    outputs[name] = output
+                    record(name, status="done", artifact=save_output(run_id, name, output))
+                    progress_queue.put(by_name[name]["progress"])
+                    logger.info(f"✅ Stage '{name}' done")
+                except Exception as e:
+                    # Let stages already running finish (and checkpoint) before failing the job
+                    logger.error(f"❌ Stage '{name}' failed: {e}")
+                    record(name, status="failed", error=str(e)[:500])
+                    error = error or e
+            forward_progress()
+
+    if error is not None:
+        raise error
+
+    missing = [s["name"] for s in stages if s["name"] not in outputs]
+    if missing and runnable is None:
+        raise RuntimeError(f"Stages never became runnable: {missing}")
+    return outputs
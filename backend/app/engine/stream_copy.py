@@ -0,0 +1,159 @@
+# myg/backend/app/engine/stream_copy.py
+import os
+import re
+import hashlib
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from app.config import settings
+from app.engine.timeline import FFMPEG_BINARY, audio_mix_args, probe
+
+logger = logging.getLogger(__name__)
+
+# Stream-copy engine for "simple sequence" timelines (e.g. the AI pipeline's LTX clips
+# under one narration track): back-to-back full-frame clips, nothing composited on top.
+# Clips that already match the target codec/size/fps are copied as-is; otherwise each
+# clip is normalized once (cached in the asset cache) and the results are copied.
+# Output is produced by the concat demuxer plus a single audio mux.
+
+TARGET_CODEC = "h264"
+TARGET_PIX_FMT = "yuv420p"
+GAP_TOLERANCE_FRAMES = 0.5  # clips must butt up to within half a frame
+
+# --- 1. Support Check ---
+
+def unsupported_reasons(plan: dict) -> list:
+    reasons = list(plan["unsupported"])
+    W, H, fps = plan["width"], plan["height"], plan["fps"]
+    layers = sorted(plan["layers"], key=lambda l: l["start"])
+    if not layers:
+        return reasons + ["empty timeline"]
+    if plan["vignette"] > 0 or plan["captions"]:
+        reasons.append("vignette/captions need a re-encode")
+
+    cursor = 0.0
+    for layer in layers:
+        if layer["type"] != 'video':
+            reasons.append(f"{layer['type']} layer {layer['id']}")
+            continue
+        if layer["opacity"] < 1 or layer["rotation"]:
+            reasons.append(f"opacity/rotation on clip {layer['id']}")
+        w, h = layer["size"]
+        if w < W or h < H or layer["x"] != 50 or layer["y"] != 50:
+            reasons.append(f"clip {layer['id']} does not cover the frame")
+        if abs(layer["start"] - cursor) > GAP_TOLERANCE_FRAMES / fps:
+            reasons.append(f"gap or overlap before clip {layer['id']}")
+        cursor = layer["end"]
+
+    if abs(cursor - plan["duration"]) > GAP_TOLERANCE_FRAMES / fps:
+        reasons.append("clips do not span the full duration")
+    return reasons
+
+def supports(plan: dict) -> bool:
+    return not unsupported_reasons(plan)
+
+# --- 2. Normalization ---
+
+_STREAM_RE = re.compile(r"Stream #\d+:\d+.*?: Video: (\w+).*?, (\w+)(?:\(|,)")
+
+def stream_signature(path: str):
+    """(codec, pix_fmt) of the first video stream, parsed from ffmpeg's stream info."""
+    result = subprocess.run([FFMPEG_BINARY, "-hide_banner", "-i", path], capture_output=True, text=True)
+    match = _STREAM_RE.search(result.stderr)
+    return (match.group(1), match.group(2)) if match else (None, None)
+
+def _copyable(layer: dict, plan: dict) -> bool:
+    if layer["loop"] or tuple(layer["size"]) != (plan["width"], plan["height"]):
+        return False
+    if round(probe(layer["path"])["fps"] or 0, 3) != round(float(plan["fps"]), 3):
+        return False
+    return stream_signature(layer["path"]) == (TARGET_CODEC, TARGET_PIX_FMT)
+
+def _normalized_path(layer: dict, plan: dict) -> str:
+    key = f"{layer['path']}\n{os.path.getmtime(layer['path'])}\n{plan['width']}x{plan['height']}@{plan['fps']}\n{layer['duration']:.3f}"
+    return os.path.join(settings.ASSET_CACHE_DIR, f"norm_{hashlib.sha256(key.encode('utf-8')).hexdigest()}.mp4")
+
+def normalize(layer: dict, plan: dict) -> str:
+    """
+    Re-encodes one clip to the target size/fps/codec with a center crop (the editor's
+    100% cover rule) and its exact timeline duration. Cached, so each clip is done once.
+    """
+    W, H, fps = plan["width"], plan["height"], plan["fps"]
+    path = _normalized_path(layer, plan)
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    os.makedirs(settings.ASSET_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.part.{os.getpid()}.mp4"
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error"]
+    if layer["loop"]:
+        cmd += ["-stream_loop", "-1"]
+    cmd += [
+        "-i", layer["path"], "-t", f"{layer['duration']:.3f}", "-an",
+        "-vf", f"scale={W}:{H}:force_original_aspect_ratio=increase,crop={W}:{H},fps={fps},setsar=1",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", TARGET_PIX_FMT, tmp_path
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise RuntimeError(f"ffmpeg normalize failed for {layer['path']}: {result.stderr.strip()[-500:]}")
+    os.replace(tmp_path, path)
+    return path
+
+# --- 3. Concat ---
+
+def concat_files(plan: dict, files: list, output_path: str, outpoints: list = None) -> str:
+    """
+    Joins `files` with the concat demuxer without re-encoding video and muxes the plan's
+    audio, mixed once over the full duration. `outpoints` optionally trims each file.
+    """
+    list_path = output_path + ".concat.txt"
+    with open(list_path, "w") as f:
+        for i, path in enumerate(files):
+            f.write(f"file '{os.path.abspath(path)}'\n")
+            if outpoints and outpoints[i] is not None:
+                f.write(f"outpoint {outpoints[i]:.3f}\n")
+
+    cmd = [FFMPEG_BINARY, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+    audio_inputs, audio_graph, audio_label = audio_mix_args(plan["audio"], plan["duration"], first_input=1)
+    cmd += audio_inputs
+    if audio_label:
+        cmd += ["-filter_complex", audio_graph]
+    cmd += ["-map", "0:v", "-c:v", "copy"]
+    if audio_label:
+        cmd += ["-map", audio_label, "-c:a", "aac"]
+    cmd += ["-t", f"{plan['duration']:.3f}", "-movflags", "+faststart", output_path]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"ffmpeg concat failed: {result.stderr.strip()[-500:]}")
+    finally:
+        os.remove(list_path)
+    return output_path
+
+# --- 4. Rendering ---
+
+def render(plan: dict, output_path: str, progress_callback=None, **_) -> str:
+    """Renders a simple sequence with stream copies. Extra engine kwargs (chunking) do not apply."""
+    layers = sorted(plan["layers"], key=lambda l: l["start"])
+
+    if all(_copyable(layer, plan) for layer in layers):
+        logger.info(f"⚡ Stream-copying {len(layers)} clips")
+        files = [layer["path"] for layer in layers]
+        outpoints = [layer["duration"] for layer in layers]
+    else:
+        # Mixed sources cannot share one bitstream; bring every clip to the same parameters
+        logger.info(f"🔧 Normalizing {len(layers)} clips for stream copy")
+        with ThreadPoolExecutor(max_workers=settings.RENDER_SEGMENT_WORKERS or os.cpu_count() or 1) as pool:
+            files = list(pool.map(lambda layer: normalize(layer, plan), layers))
+        outpoints = None
+    if progress_callback:
+        progress_callback(0.8)
+
+    concat_files(plan, files, output_path, outpoints)
+    if progress_callback:
+        progress_callback(1.0)
+    return output_path
@@ -0,0 +1,188 @@
+# myg/backend/app/engine/text_raster.py
+import os
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from PIL import Image as PILImage, ImageDraw, ImageFont, ImageColor
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# In-process text renderer (Pillow/FreeType) replacing TextClip(method='caption'),
+# which shells out to ImageMagick once per clip. Fonts (and with them FreeType's glyph
+# cache) are loaded once per (font, size); finished layouts are cached per
+# (content, font, size, color, wrap width, ...) and returned as RGBA arrays.
+# The layout cache keeps only each layout's ink bounding box (a one-word caption on a
+# 1536 px wrap width is mostly transparent) and is bounded by TEXT_RASTER_CACHE_BYTES,
+# since worker children live for many tasks.
+
+DEFAULT_FONT = "Liberation-Sans-Bold"
+FONT_DIRS = ["/usr/share/fonts", "/usr/local/share/fonts", os.path.expanduser("~/.fonts")]
+
+# --- 1. Fonts ---
+
+def _normalize(name: str) -> str:
+    return "".join(ch for ch in name.lower() if ch.isalnum())
+
+@lru_cache(maxsize=None)
+def font_path(name: str):
+    """Resolves an ImageMagick-style font name ('Liberation-Sans-Bold') or a path to a font file."""
+    if os.path.isfile(name):
+        return name
+    wanted = _normalize(name)
+    for root_dir in FONT_DIRS:
+        for root, _, files in os.walk(root_dir):
+            for f in files:
+                stem, ext = os.path.splitext(f)
+                if ext.lower() in ('.ttf', '.otf') and _normalize(stem) == wanted:
+                    return os.path.join(root, f)
+    logger.warning(f"Font '{name}' not found, using Pillow's default font")
+    return None
+
+@lru_cache(maxsize=64)
+def get_font(name: str, size: int):
+    path = font_path(name)
+    if path is None:
+        return ImageFont.load_default()
+    return ImageFont.truetype(path, size)
+
+# --- 2. Layout ---
+
+def _text_width(font, text: str) -> float:
+    return font.getlength(text) if hasattr(font, "getlength") else font.getsize(text)[0]
+
+def wrap_lines(text: str, font, wrap_width: int = None) -> list:
+    """Greedy word wrap to wrap_width pixels (explicit newlines are kept)."""
+    if not wrap_width:
+        return text.split("\n")
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if line and _text_width(font, candidate) > wrap_width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+# --- 3. Rasterization ---
+
+_layouts = OrderedDict()  # args -> (ink, left, top, canvas_w, canvas_h)
+_layouts_bytes = 0
+_layouts_lock = threading.Lock()
+
+def _layout(content: str, font: str, size: int, color: str, wrap_width: int,
+            align: str, stroke_color: str, stroke_width: int):
+    pil_font = get_font(font, size)
+    lines = wrap_lines(content, pil_font, wrap_width)
+    ascent, descent = pil_font.getmetrics() if hasattr(pil_font, "getmetrics") else (size, 0)
+    line_height = ascent + descent + 2 * stroke_width
+    widths = [int(np.ceil(_text_width(pil_font, line))) + 2 * stroke_width for line in lines]
+    canvas_w = wrap_width or max(widths + [1])
+    canvas_h = max(1, line_height * len(lines))
+
+    img = PILImage.new("RGBA", (canvas_w, canvas_h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    fill = ImageColor.getcolor(color, "RGBA")
+    stroke = ImageColor.getcolor(stroke_color, "RGBA") if stroke_width else None
+    for i, (line, line_w) in enumerate(zip(lines, widths)):
+        if align == 'center':
+            x = (canvas_w - line_w) // 2
+        elif align in ('right', 'East'):
+            x = canvas_w - line_w
+        else:
+            x = 0
+        draw.text((x + stroke_width, i * line_height + stroke_width), line, font=pil_font, fill=fill,
+                  stroke_width=stroke_width, stroke_fill=stroke)
+
+    # Keep only the ink; copy so the full canvas is freed
+    rgba = np.asarray(img)
+    alpha = rgba[:, :, 3]
+    rows, cols = np.flatnonzero(alpha.any(axis=1)), np.flatnonzero(alpha.any(axis=0))
+    if rows.size:
+        top, left = int(rows[0]), int(cols[0])
+        ink = rgba[top:rows[-1] + 1, left:cols[-1] + 1].copy()
+    else:
+        top, left, ink = 0, 0, np.zeros((0, 0, 4), dtype=np.uint8)
+    ink.setflags(write=False)
+    return ink, left, top, canvas_w, canvas_h
+
+def _cached_layout(*args):
+    global _layouts_bytes
+    with _layouts_lock:
+        entry = _layouts.get(args)
+        if entry is not None:
+            _layouts.move_to_end(args)
+            return entry
+
+    entry = _layout(*args)
+    with _layouts_lock:
+        if args not in _layouts:
+            _layouts[args] = entry
+            _layouts_bytes += entry[0].nbytes
+            while _layouts_bytes > settings.TEXT_RASTER_CACHE_BYTES and len(_layouts) > 1:
+                _, evicted = _layouts.popitem(last=False)
+                _layouts_bytes -= evicted[0].nbytes
+    return entry
+
+def cache_clear():
+    global _layouts_bytes
+    with _layouts_lock:
+        _layouts.clear()
+        _layouts_bytes = 0
+
+def rasterize(content: str, font: str = DEFAULT_FONT, size: int = 60, color: str = 'white', wrap_width: int = None,
+              align: str = 'center', stroke_color: str = 'black', stroke_width: int = 0):
+    """
+    Renders text like TextClip(method='caption', size=(wrap_width, None)): words wrapped
+    to wrap_width, lines aligned inside it. Returns an (H, W, 4) uint8 array.
+    """
+    ink, left, top, canvas_w, canvas_h = _cached_layout(
+        str(content), font, int(size), str(color), int(wrap_width) if wrap_width else None,
+        align, stroke_color, int(stroke_width)
+    )
+    rgba = np.zeros((canvas_h, canvas_w, 4), dtype=np.uint8)
+    rgba[top:top + ink.shape[0], left:left + ink.shape[1]] = ink
+    return rgba
+
+def to_clip(rgba):
+    """MoviePy ImageClip (with mask) for the legacy render paths."""
+    from moviepy.editor import ImageClip
+    mask = ImageClip(rgba[:, :, 3] / 255.0, ismask=True)
+    return ImageClip(np.ascontiguousarray(rgba[:, :, :3])).set_mask(mask)
+
+# --- 4. Benchmark ---
+
+def benchmark(words: int = 200, wrap_width: int = 1536):
+    """Caption-style workload (one clip per word) through TextClip vs the Pillow renderer."""
+    from moviepy.editor import TextClip
+    vocabulary = [f"word{i % 40}" for i in range(words)]
+
+    started = time.perf_counter()
+    for word in vocabulary:
+        clip = TextClip(word, fontsize=80, color='yellow', font=DEFAULT_FONT, method='caption',
+                        align='center', size=(wrap_width, None))
+        clip.get_frame(0)
+        clip.close()
+    textclip_s = time.perf_counter() - started
+
+    cache_clear()
+    started = time.perf_counter()
+    for word in vocabulary:
+        rasterize(word, DEFAULT_FONT, 80, 'yellow', wrap_width)
+    pillow_s = time.perf_counter() - started
+
+    print(f"TextClip: {textclip_s:.2f}s ({words / textclip_s:.0f} clips/s)")
+    print(f"Pillow:   {pillow_s:.3f}s ({words / max(pillow_s, 1e-9):.0f} clips/s), {textclip_s / max(pillow_s, 1e-9):.0f}x faster")
+    return {"textclip_s": textclip_s, "pillow_s": pillow_s}
+
+if __name__ == "__main__":
+    # Usage: python -m app.engine.text_raster [words]
+    benchmark(*[int(a) for a in sys.argv[1:2]])
@@ -0,0 +1,187 @@
+# myg/backend/app/engine/timeline.py
+import math
+import logging
+from PIL import Image as PILImage
+from moviepy.config import get_setting
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from app.engine import captions
+
+logger = logging.getLogger(__name__)
+
+# Same binary MoviePy uses, so every engine decodes/encodes with one ffmpeg build
+FFMPEG_BINARY = get_setting("FFMPEG_BINARY")
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif')
+
+# --- 1. Source Probing ---
+
+def probe(path: str) -> dict:
+    """Returns {size: (w, h), duration, fps, has_audio} for a local media file."""
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        with PILImage.open(path) as img:
+            return {"size": img.size, "duration": None, "fps": None, "has_audio": False}
+
+    infos = ffmpeg_parse_infos(path)
+    return {
+        "size": tuple(infos["video_size"]) if infos.get("video_found") else None,
+        "duration": infos.get("duration"),
+        "fps": infos.get("video_fps"),
+        "has_audio": bool(infos.get("audio_found")),
+    }
+
+def timeline_duration(timeline: list) -> float:
+    """End time of the last clip on the timeline."""
+    duration = 0.0
+    for track in timeline:
+        for clip in track.get('clips', []):
+            end = float(clip.get('start', 0)) + float(clip.get('duration', 0))
+            duration = max(duration, end)
+    return duration
+
+# --- 2. Geometry ---
+
+def scaled_size(src_w: int, src_h: int, props: dict, width: int, height: int):
+    """
+    Editor sizing rules shared by every engine:
+    100% x 100% means cover the canvas (no black bars); otherwise scale to a width percentage.
+    """
+    p_w, p_h = float(props.get('width', 100)), float(props.get('height', 100))
+    if p_w == 100 and p_h == 100:
+        scale = max(width / src_w, height / src_h)
+    else:
+        scale = (width * (p_w / 100.0)) / src_w
+    return max(1, int(round(src_w * scale))), max(1, int(round(src_h * scale)))
+
+def rotated_size(w: int, h: int, rotation: float):
+    """Bounding box of a w x h layer rotated by `rotation` degrees (MoviePy rotate expands)."""
+    if not rotation:
+        return w, h
+    rad = math.radians(rotation)
+    c, s = abs(math.cos(rad)), abs(math.sin(rad))
+    return int(math.ceil(w * c + h * s)), int(math.ceil(w * s + h * c))
+
+def place(layer: dict, w: int, h: int, width: int, height: int):
+    """Top-left pixel position of a w x h layer centered on its editor (x%, y%) coordinates."""
+    pos_x = (width * (layer["x"] / 100.0)) - (w / 2)
+    pos_y = (height * (layer["y"] / 100.0)) - (h / 2)
+    return int(pos_x), int(pos_y)
+
+# --- 3. Timeline Compilation ---
+
+def compile_timeline(timeline: list, resolve, width: int, height: int, duration: float, fps: int, background=(0, 0, 0), vignette: float = 0) -> dict:
+    """
+    Flattens the track/clip JSON into a render plan shared by every engine:
+      layers: visual layers bottom-to-top with resolved paths and pixel sizes
+      audio:  audio sources (audio clips and un-muted video soundtracks) to mix
+      vignette: task vignette_intensity (0-100), applied over the finished frame
+      captions: word-timed caption tracks, drawn last from a sprite sheet
+      unsupported: features no fast engine can render (forces the MoviePy fallback)
+    `resolve(src)` maps an S3 key / URL / path to a local file or None.
+    """
+    plan = {
+        "width": width, "height": height, "fps": fps, "duration": duration,
+        "background": tuple(background), "vignette": float(vignette or 0),
+        "layers": [], "audio": [], "captions": captions.tracks(timeline), "unsupported": [],
+    }
+    probes = {}
+
+    for track in timeline:
+        if track.get('isHidden'): continue
+        is_muted = track.get('isMuted', False)
+
+        for clip in track.get('clips', []):
+            c_type = clip.get('type')
+            src = clip.get('renderSrc') or clip.get('src')
+            props = clip.get('properties', {}) or {}
+            start = float(clip.get('start', 0))
+            dur = float(clip.get('duration', 1))
+
+            if c_type not in ('video', 'image', 'audio', 'text'):
+                continue
+
+            local_path = None
+            if c_type != 'text':
+                if not src or src.startswith("blob:"):
+                    continue
+                try:
+                    local_path = resolve(src)
+                    if local_path and local_path not in probes:
+                        probes[local_path] = probe(local_path)
+                except Exception as e:
+                    logger.error(f"Skipping clip {clip.get('id')}: {e}")
+                    continue
+                if not local_path:
+                    continue
+
+            info = probes.get(local_path, {})
+            volume = float(props.get('volume', 1.0))
+
+            if c_type == 'audio':
+                if is_muted: continue
+                src_dur = info.get("duration") or dur
+                plan["audio"].append({"path": local_path, "start": start, "duration": min(dur, src_dur), "volume": volume})
+                continue
+
+            rotation = float(props.get('rotation', 0))
+            layer = {
+                "id": clip.get('id'),
+                "type": c_type,
+                "path": local_path,
+                "start": start,
+                "duration": dur,
+                "end": start + dur,
+                "opacity": float(props.get('opacity', 1)),
+                "rotation": rotation,
+                "x": float(props.get('x', 50)),
+                "y": float(props.get('y', 50)),
+                "props": props,
+            }
+
+            if c_type == 'text':
+                layer["content"] = clip.get('content', '')
+                layer["wrap_width"] = int(width * (float(props.get('width', 80)) / 100))
+            else:
+                if not info.get("size"):
+                    logger.error(f"Skipping clip {clip.get('id')}: no video stream in {local_path}")
+                    continue
+                layer["size"] = scaled_size(info["size"][0], info["size"][1], props, width, height)
+
+            if c_type == 'video':
+                src_dur = info.get("duration") or dur
+                layer["source_duration"] = src_dur
+                layer["loop"] = src_dur < dur
+                if not is_muted and info.get("has_audio"):
+                    plan["audio"].append({"path": local_path, "start": start, "duration": min(dur, src_dur), "volume": volume})
+
+            plan["layers"].append(layer)
+
+    return plan
+
+# --- 4. Audio Mixing (ffmpeg) ---
+
+def audio_mix_args(audio: list, duration: float, first_input: int = 1):
+    """
+    ffmpeg arguments that mix every audio entry of a plan over the full duration.
+    Returns (input_args, filter_complex, output_label); label is None when there is no audio.
+    Mirrors CompositeAudioClip: clips are trimmed, delayed to their start and summed.
+    """
+    if not audio:
+        return [], "", None
+
+    inputs, chains, labels = [], [], []
+    for i, entry in enumerate(audio):
+        idx = first_input + i
+        inputs += ["-i", entry["path"]]
+        delay_ms = int(round(entry["start"] * 1000))
+        offset = entry.get("offset", 0.0)  # Seek into the source (chunked renders)
+        chains.append(
+            f"[{idx}:a]atrim={offset:.3f}:{offset + entry['duration']:.3f},asetpts=PTS-STARTPTS,"
+            f"volume={entry['volume']:.3f},adelay={delay_ms}:all=1[a{i}]"
+        )
+        labels.append(f"[a{i}]")
+
+    chains.append(
+        f"{''.join(labels)}amix=inputs={len(labels)}:normalize=0:duration=longest,"
+        f"apad=whole_dur={duration:.3f},atrim=0:{duration:.3f}[aout]"
+    )
+    return inputs, ";".join(chains), "[aout]"
@@ -3,8 +3,8 @@ from moviepy.config import change_settings
 change_settings({"IMAGEMAGICK_BINARY": "/usr/bin/convert"})
 
 from moviepy.editor import (
-    VideoFileClip, TextClip, CompositeVideoClip, 
-    AudioFileClip, ImageClip, afx, CompositeAudioClip, ColorClip
+    CompositeVideoClip, 
+    ImageClip, afx, CompositeAudioClip, ColorClip
 )
 from moviepy.video.fx.all import crop, margin
 import os
@@ -12,7 +12,9 @@ import whisper
 import asyncio
 from PIL import Image as PILImage 
 from app.engine.assets import generate_image_keywords, fetch_pixabay_image, download_file as fetch_url_file 
-from app.engine import s3_utils 
+from app.engine import s3_utils, asset_cache, engines, overlays, text_raster, captions, compositor, sources, workspace
+from app.engine import timeline as timeline_plan
+from app.config import settings
 import numpy as np
 import tempfile 
 import uuid
@@ -28,25 +30,33 @@ def hex_to_rgb(hex_color):
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
 def apply_vignette(clip, intensity):
-    if intensity <= 0: return clip
+    # Cached gain map, one multiply per frame (no masked ColorClip composite)
+    if not intensity or intensity <= 0: return clip
     w, h = clip.size
-    x = np.linspace(-1, 1, w)
-    y = np.linspace(-1, 1, h)
-    X, Y = np.meshgrid(x, y)
-    radius = np.sqrt(X**2 + Y**2)
-    factor = intensity / 100.0
-    mask_layer = (radius ** 1.5) * factor
-    mask_layer = np.clip(mask_layer, 0, 1) 
-    vignette_clip = ColorClip(size=(w, h), color=(0,0,0), duration=clip.duration)
-    mask_clip = ImageClip(mask_layer, ismask=True).set_duration(clip.duration)
-    vignette_clip = vignette_clip.set_mask(mask_clip)
-    return CompositeVideoClip([clip, vignette_clip])
+    gain = overlays.vignette_gain(w, h, float(intensity))
+    return clip.fl_image(lambda frame: overlays.apply_gain(frame, gain))
 
 # --- NLE RENDERING ENGINE ---
 
-def render_timeline(timeline_data: list, output_path: str, width: int, height: int, duration: float, fps: int = 24):
+def _resolve_src(src: str):
+    if src.startswith("blob:"): return None
+    if os.path.exists(src): return src
+    return asset_cache.resolve(src)
+
+def render_timeline(timeline_data: list, output_path: str, width: int, height: int, duration: float, fps: int = 24, engine: str = None, vignette: float = 0):
+    # Fast path: ffmpeg filtergraph / frame compositor render most timelines without MoviePy
+    engine = engine or settings.RENDER_ENGINE
+    if engine != "moviepy":
+        plan = timeline_plan.compile_timeline(timeline_data, _resolve_src, width, height, duration, fps, vignette=vignette)
+        print(f"Rendering Timeline: {len(plan['layers'])} layers, Duration: {duration}s, FPS: {fps}")
+        if engines.render_plan(plan, output_path, engine=engine):
+            return output_path
+        print("No fast engine supports this timeline, using MoviePy")
+
     visual_clips = []
     audio_clips = []
+    # One reader per distinct file, shared by every clip using it
+    registry = workspace.register(sources.SourceRegistry())
     
     # 1. Base Layer (Background Color)
     visual_clips.append(ColorClip(size=(width, height), color=(0,0,0), duration=duration))
@@ -72,14 +82,8 @@ def render_timeline(timeline_data: list, output_path: str, width: int, height: i
                     if os.path.exists(src):
                         local_path = src
                     else:
-                        clean_name = os.path.basename(src).split('?')[0][-20:] 
-                        local_path = os.path.join(OUTPUT_DIR, f"clip_{uuid.uuid4()}_{clean_name}")
-                        
-                        if src.startswith("http"):
-                            import asyncio
-                            asyncio.run(fetch_url_file(src, local_path))
-                        else:
-                            s3_utils.download_file_from_s3(src, local_path)
+                        # Shared worker-local cache (S3 key + ETag / URL + validators)
+                        local_path = asset_cache.resolve(src)
 
                 if not local_path or not os.path.exists(local_path): continue
 
@@ -92,7 +96,7 @@ def render_timeline(timeline_data: list, output_path: str, width: int, height: i
                 # --- AUDIO FIX: PREVENT LOOPING AT END ---
                 if c_type == 'audio':
                     if is_muted: continue
-                    au_clip = AudioFileClip(local_path)
+                    au_clip = registry.audio(local_path, start, start + dur)
                     
                     # Do not loop narration if the timeline duration is slightly longer than the file
                     actual_dur = min(dur, au_clip.duration)
@@ -104,17 +108,14 @@ def render_timeline(timeline_data: list, output_path: str, width: int, height: i
                 mp_clip = None
                 
                 if c_type == 'text':
-                    mp_clip = TextClip(
-                        clip_data.get('content', 'Text'), 
-                        fontsize=props.get('fontSize', 60), 
-                        color=props.get('color', 'white'), 
-                        font='Liberation-Sans-Bold',
-                        method='caption', 
-                        align='center',
-                        size=(int(width * 0.8), None)
-                    )
+                    mp_clip = text_raster.to_clip(text_raster.rasterize(
+                        clip_data.get('content', 'Text'),
+                        size=props.get('fontSize', 60),
+                        color=props.get('color', 'white'),
+                        wrap_width=int(width * 0.8)
+                    ))
                 elif c_type == 'video':
-                    mp_clip = VideoFileClip(local_path)
+                    mp_clip = registry.video(local_path, start, start + dur)
                     if not is_muted and mp_clip.audio is not None:
                         vid_audio = mp_clip.audio
                         # Apply same trim logic to internal video audio
@@ -167,10 +168,18 @@ def render_timeline(timeline_data: list, output_path: str, width: int, height: i
 
     # Composite & Write
     final_video = CompositeVideoClip(visual_clips, size=(width, height)).set_duration(duration)
+    final_video = apply_vignette(final_video, vignette)
+    caption_sheets = [captions.prepare(track, width, height) for track in captions.tracks(timeline_data)]
+    if caption_sheets:
+        final_video = final_video.fl(lambda gf, t: compositor.draw_captions(gf(t).copy(), caption_sheets, t))
     if audio_clips:
         final_video = final_video.set_audio(CompositeAudioClip(audio_clips))
     
-    final_video.write_videofile(output_path, fps=fps, codec="libx264", audio_codec="aac", preset="ultrafast", threads=4)
+    try:
+        final_video.write_videofile(output_path, fps=fps, codec="libx264", audio_codec="aac", preset="ultrafast", threads=4)
+    finally:
+        final_video.close()
+        registry.close()
     return output_path
 
 def render_video(task_data: dict, audio_path: str, progress_callback=None) -> str:
@@ -192,7 +201,7 @@ def render_video(task_data: dict, audio_path: str, progress_callback=None) -> st
                     end = float(clip.get('start', 0)) + float(clip.get('duration', 0))
                     if end > max_duration: max_duration = end
         
-        output_path = os.path.join(OUTPUT_DIR, f"final_{task_data.get('id', 'temp')}.mp4")
-        return render_timeline(timeline, output_path, W, H, max_duration, fps)
+        output_path = workspace.temp_path(f"final_{task_data.get('id', 'temp')}.mp4")
+        return render_timeline(timeline, output_path, W, H, max_duration, fps, vignette=task_data.get('vignette_intensity', 0))
 
     return "error_no_timeline"
\ No newline at end of file
@@ -1,9 +1,8 @@
 import os
-import uuid
 import logging
 from gradio_client import Client, handle_file
 from app.config import settings
-from app.engine import s3_utils 
+from app.engine import s3_utils, result_cache
 
 logger = logging.getLogger(__name__)
 
@@ -14,10 +13,19 @@ def generate_voice(text: str, audio_prompt_url: str = None) -> str:
     """
     Calls the Chatterbox TTS Space. 
     Matches the 2-parameter API: (text, audio_prompt)
+    Repeat requests for the same text and voice prompt reuse the cached narration.
     """
     if not settings.HF_TOKEN:
         raise ValueError("HF_TOKEN is not configured in .env")
-    
+
+    # Presigned prompt URLs change per request; hash the underlying object instead
+    cache_key = result_cache.make_key(
+        "tts", VOICE_SPACE_ID, text=text, audio_prompt=result_cache.strip_signature(audio_prompt_url)
+    )
+    cached_key = result_cache.lookup_artifact(cache_key)
+    if cached_key:
+        return cached_key
+
     try:
         logger.info(f"🎤 Connecting to TTS Space: {VOICE_SPACE_ID}")
         client = Client(VOICE_SPACE_ID, token=settings.HF_TOKEN)
@@ -34,14 +42,12 @@ def generate_voice(text: str, audio_prompt_url: str = None) -> str:
         
         # result is the path to the temporary .wav file
         if os.path.exists(result):
-            with open(result, "rb") as f:
-                audio_bytes = f.read()
-            
-            file_name = f"voice_{uuid.uuid4()}.wav"
-            s3_key = f"generated_audio/{file_name}"
+            audio_size = os.path.getsize(result)
+            s3_key = result_cache.artifact_key("generated_audio", f"voice_{cache_key}", ".wav")
             
             logger.info(f"📦 Uploading generated voice to S3: {s3_key}")
-            s3_utils.upload_file_to_s3(audio_bytes, s3_key, "audio/wav")
+            s3_utils.upload_path_to_s3(result, s3_key, "audio/wav")
+            result_cache.record_artifact(cache_key, "tts", s3_key, audio_size, shared=True)
             
             # Cleanup local Gradio temp file
             if os.path.exists(result):
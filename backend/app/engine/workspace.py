@@ -0,0 +1,188 @@
+# myg/backend/app/engine/workspace.py
+import os
+import time
+import shutil
+import socket
+import logging
+import tempfile
+import threading
+import contextvars
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Per-job workspace: a scoped temp directory plus the readers/handles opened for the job.
+# Teardown (close handles, delete the directory) is guaranteed on success and failure, so
+# a worker child can run many tasks without leaking files or ffmpeg subprocesses.
+# The active workspace is tracked in a context variable; engine code asks for temp paths
+# through temp_path() and keeps working outside a job (falls back to the OS temp dir).
+# WORKSPACE_ROOT is shared by every container, each with its own PID namespace, so a
+# directory is named job.<host>.<pid>.<job id>.* and its owner touches HEARTBEAT_FILE while
+# it runs: other hosts judge liveness by the heartbeat only, never by a foreign PID.
+
+HEARTBEAT_FILE = ".heartbeat"
+
+_current = contextvars.ContextVar("workspace", default=None)
+
+class WorkspaceQuotaExceeded(RuntimeError):
+    pass
+
+class Workspace:
+    def __init__(self, job_id, quota_bytes: int = None, root: str = None):
+        self.job_id = str(job_id)
+        self.quota_bytes = settings.WORKSPACE_QUOTA_BYTES if quota_bytes is None else quota_bytes
+        self.root = root or settings.WORKSPACE_ROOT
+        self.dir = None
+        self._resources = []
+        self._token = None
+        self._stop_heartbeat = None
+
+    # --- 1. Lifecycle ---
+
+    def open(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.dir = tempfile.mkdtemp(prefix=f"job.{_host()}.{os.getpid()}.{self.job_id}.", dir=self.root)
+        self._start_heartbeat()
+        self._token = _current.set(self)
+        logger.info(f"🗂️ Workspace opened: {self.dir}")
+        return self
+
+    def close(self):
+        """Closes registered resources (newest first) and deletes the directory. Never raises."""
+        while self._resources:
+            resource = self._resources.pop()
+            try:
+                resource.close()
+            except Exception as e:
+                logger.warning(f"Workspace {self.job_id}: failed to close {resource!r}: {e}")
+
+        if self._stop_heartbeat is not None:
+            self._stop_heartbeat.set()
+            self._stop_heartbeat = None
+
+        if self.dir:
+            used = self.usage()
+            shutil.rmtree(self.dir, ignore_errors=True)
+            logger.info(f"🧹 Workspace closed: {self.dir} ({used / 1024 ** 2:.1f} MB released)")
+            self.dir = None
+
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _start_heartbeat(self):
+        heartbeat = os.path.join(self.dir, HEARTBEAT_FILE)
+        open(heartbeat, "a").close()
+        stop = self._stop_heartbeat = threading.Event()
+
+        def beat():
+            while not stop.wait(settings.WORKSPACE_HEARTBEAT_SECONDS):
+                try:
+                    os.utime(heartbeat)
+                except FileNotFoundError:
+                    return
+
+        threading.Thread(target=beat, name=f"workspace-{self.job_id}", daemon=True).start()
+
+    # --- 2. Files & Resources ---
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.dir, os.path.basename(name))
+
+    def register(self, resource):
+        """Closes `resource` (anything with close()) at teardown. Returns it for chaining."""
+        self._resources.append(resource)
+        return resource
+
+    def usage(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.dir or ""):
+            for f in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, f))
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def check_quota(self):
+        """Raises WorkspaceQuotaExceeded once the job's files exceed its disk quota."""
+        if not self.quota_bytes or not self.dir:
+            return
+        used = self.usage()
+        if used > self.quota_bytes:
+            raise WorkspaceQuotaExceeded(
+                f"Job {self.job_id} uses {used / 1024 ** 2:.0f} MB of scratch space (quota {self.quota_bytes / 1024 ** 2:.0f} MB)"
+            )
+
+# --- 3. Helpers ---
+
+def current():
+    """The workspace of the running job, or None."""
+    return _current.get()
+
+def temp_path(name: str) -> str:
+    """Scratch path for `name` inside the active workspace (OS temp dir outside a job)."""
+    ws = current()
+    if ws is not None and ws.dir:
+        return ws.path(name)
+    return os.path.join(tempfile.gettempdir(), os.path.basename(name))
+
+def register(resource):
+    """Registers a resource with the active workspace; without one the caller must close it."""
+    ws = current()
+    return ws.register(resource) if ws is not None else resource
+
+def check_quota():
+    ws = current()
+    if ws is not None:
+        ws.check_quota()
+
+def _host() -> str:
+    """This container's name (its id under Docker), safe to embed in a dotted directory name."""
+    return socket.gethostname().replace(".", "_")
+
+def _last_beat(path: str) -> float:
+    try:
+        return os.path.getmtime(os.path.join(path, HEARTBEAT_FILE))
+    except FileNotFoundError:
+        return os.path.getmtime(path)
+
+def sweep_stale(max_age: int = None):
+    """
+    Deletes workspaces left behind by killed children or containers: any whose heartbeat is
+    older than max_age, and this host's own ones whose owner PID is gone.
+    """
+    root = settings.WORKSPACE_ROOT
+    max_age = settings.WORKSPACE_STALE_SECONDS if max_age is None else max_age
+    host = _host()
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if not name.startswith("job"):
+            continue
+        path = os.path.join(root, name)
+        parts = name.split(".")
+        try:
+            stale = time.time() - _last_beat(path) > max_age
+            if not stale and len(parts) == 5 and parts[1] == host and parts[2].isdigit():
+                # Same PID namespace: a missing owner means the workspace is abandoned
+                try:
+                    os.kill(int(parts[2]), 0)
+                except ProcessLookupError:
+                    stale = True
+                except PermissionError:
+                    pass
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"🧹 Removed stale workspace {name}")
+        except FileNotFoundError:
+            pass
@@ -1,22 +1,24 @@
 # backend/app/main.py
 from fastapi import FastAPI, Depends, HTTPException, File, UploadFile, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 from pydantic import BaseModel
 import os
+import json
 import uuid
 import logging
 
 from app.models import Base, Project, Task, User
-from app.auth import get_current_user_id
-from worker.tasks import generate_video_task
+from app.auth import get_current_user_id, get_stream_user_id, issue_stream_token
+from worker.tasks import dispatch as dispatch_task
 from app.schemas.task_schema import TaskCreateRequest
 from app.engine import ideation as ideation_engine
 from app.engine import voice as voice_engine
 from app.engine import assets as assets_engine
 from app.engine import s3_utils 
+from app.engine import progress as progress_store
 from app.engine.huggingface import generate_flux_image, generate_ltx_video
 from app.config import DATABASE_URL, settings 
 
@@ -157,7 +159,7 @@ def generate_script(request: GenerateScriptRequest):
 
 @app.post("/api/ai/generate_image")
 async def ai_generate_image(request: dict = Body(...), user_id: str = Depends(get_current_user_id), db: Session = Depends(get_db)):
-    """Generates an AI image (Flux) and deducts 1 credit."""
+    """Generates an AI image (Flux) and deducts 1 credit (cached results are free)."""
     # 1. Credit Check
     user = db.query(User).filter(User.id == user_id).first()
     if not user or user.credits < 1:
@@ -165,13 +167,14 @@ async def ai_generate_image(request: dict = Body(...), user_id: str = Depends(ge
 
     try:
         prompt = request.get("prompt")
-        image_bytes = generate_flux_image(prompt)
+        image_bytes, cache_hit = generate_flux_image(prompt)
         s3_key = f"generated/{user_id}/{uuid.uuid4()}.png"
         s3_utils.upload_file_to_s3(image_bytes, s3_key, "image/png")
         
-        # 2. Credit Deduction
-        user.credits -= 1
-        db.commit()
+        # 2. Credit Deduction (no GPU time was spent on a cache hit)
+        if not cache_hit:
+            user.credits -= 1
+            db.commit()
         
         return {"url": s3_utils.generate_signed_url(s3_key), "remaining_credits": user.credits}
     except Exception as e:
@@ -179,6 +182,45 @@ async def ai_generate_image(request: dict = Body(...), user_id: str = Depends(ge
 
 # --- VIDEO TASK ENDPOINTS ---
 
+# Declared before /api/tasks/{task_id} so "events" is not parsed as a task id
+@app.post("/api/tasks/events/token")
+def task_events_token(user_id: str = Depends(get_current_user_id)):
+    """Short-lived token for opening GET /api/tasks/events with EventSource (?token=)."""
+    return {"token": issue_stream_token(user_id), "expires_in": settings.STREAM_TOKEN_TTL}
+
+@app.get("/api/tasks/events")
+def task_events(db: Session = Depends(get_db), user_id: str = Depends(get_stream_user_id)):
+    """
+    Server-Sent Events stream of progress/status/ETA for the user's tasks, pushed by the
+    workers over Redis pub/sub. Starts with a snapshot of every unfinished task. Tasks that
+    finished before the client subscribed are not replayed: clients fetch GET
+    /api/tasks/{task_id} once the stream opens, and again on Completed for the video URL.
+    The snapshot query and Redis reads are blocking, so this is a sync endpoint (run in the
+    threadpool); only the stream itself runs on the event loop, over async Redis.
+    """
+    active = db.query(Task.id, Task.status, Task.progress).join(Project).filter(
+        Project.owner_id == user_id, Task.status != "Completed", ~Task.status.startswith("Error")
+    ).all()
+    snapshot = []
+    for task_id, status, progress in active:
+        hot = progress_store.read(task_id) or {"progress": progress, "status": status, "eta": None}
+        snapshot.append({"task_id": task_id, **hot})
+    db.close()  # The stream can stay open for hours; don't hold a pooled connection
+
+    async def stream():
+        for event in snapshot:
+            yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+        async for event in progress_store.events(user_id):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx / ALB)
+    })
+
 @app.get("/api/tasks/{task_id}")
 def get_task(task_id: int, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
     """Checks the progress or result of a video generation task."""
@@ -190,10 +232,14 @@ def get_task(task_id: int, db: Session = Depends(get_db), user_id: str = Depends
     if video_url and not video_url.startswith("/api/video/temp/"):
         video_url = s3_utils.generate_signed_url(video_url)
 
+    # Workers only commit status transitions; live progress comes from Redis
+    hot = progress_store.read(task.id) or {}
+
     return {
         "id": task.id,
-        "status": task.status,
-        "progress": task.progress, 
+        "status": hot.get("status", task.status),
+        "progress": hot.get("progress", task.progress), 
+        "eta": hot.get("eta"),
         "video_url": video_url, 
         "title": task.title,
         "script": task.script
@@ -201,16 +247,26 @@ def get_task(task_id: int, db: Session = Depends(get_db), user_id: str = Depends
 
 @app.post("/api/tasks/generate")
 def create_task(request: TaskCreateRequest, db: Session = Depends(get_db), user_id: str = Depends(get_current_user_id)):
-    """Queues a video generation task and deducts 5 credits."""
-    # 1. Credit Check (Video generation is expensive, costing 5 credits)
+    """Queues a video generation task and deducts 5 credits (1 for a timeline preview)."""
+    # 1. Credit Check (Video generation is expensive, costing 5 credits; previews cost 1)
     user = db.query(User).filter(User.id == user_id).first()
-    cost = 5
+    cost = 1 if request.preview and request.timeline else 5
     if not user or user.credits < cost:
         raise HTTPException(status_code=403, detail=f"Insufficient credits. This action requires {cost} credits.")
 
     # 2. Create the task record
+    # Caption settings are stored flat on the Task row
+    caption_columns = {}
+    if request.captions:
+        c = request.captions
+        caption_columns = {
+            "caption_font": c.font, "caption_size": c.size, "caption_color": c.color,
+            "caption_y": c.y_pos, "caption_x": c.x_pos, "caption_words_per_screen": c.words_per_screen
+        }
+
     new_task = Task(
-        **request.dict(exclude={'scripts'}), 
+        **request.dict(exclude={'scripts', 'transcription_mode', 'whisper_model', 'preview', 'captions'}), 
+        **caption_columns,
         script=request.scripts,
         status="Processing",
         progress=0
@@ -222,10 +278,10 @@ def create_task(request: TaskCreateRequest, db: Session = Depends(get_db), user_
     db.commit()
     db.refresh(new_task)
     
-    # 4. Trigger Worker
+    # 4. Trigger Worker (queue per workload class: exports vs AI pipelines)
     task_payload = request.dict(by_alias=True)
     task_payload['id'] = new_task.id 
-    generate_video_task.delay(task_payload)
+    dispatch_task(task_payload)
     
     return {"status": "queued", "task_id": new_task.id, "remaining_credits": user.credits}
 
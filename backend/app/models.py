@@ -59,6 +59,8 @@ class Task(Base):
     caption_words_per_screen = Column(Integer, default=1)
 
     timeline_data = Column(JSON, nullable=True)
+    # AI pipeline stage checkpoints: {"stages": {name: {status, artifact (S3 key), error, at}}}
+    pipeline_state = Column(JSON, nullable=True)
 
     project_id = Column(Integer, ForeignKey("projects.id", ondelete="CASCADE"), nullable=True)
     project = relationship("Project", back_populates="tasks")
@@ -1,5 +1,10 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Literal
+
+# Mirrors scriptslice.BACKENDS and scriptslice.WHISPER_SIZES, so bad values are rejected
+# with a 422 before any credits are charged
+TranscriptionMode = Literal["whisper", "align"]
+WhisperModel = Literal["tiny", "base", "small", "medium"]
 
 class TaskFiles(BaseModel):
     foreground: Optional[str] = Field(None, alias="Foreground")
@@ -35,6 +40,10 @@ class TaskCreateRequest(BaseModel):
     # Visual & Audio Settings
     background_color: Optional[str] = None
     vignette_intensity: int = 0
+
+    # Transcription: 'whisper' or 'align', and a Whisper size (tiny/base/small/medium)
+    transcription_mode: Optional[TranscriptionMode] = None
+    whisper_model: Optional[WhisperModel] = None
     
     # Metadata
     # MODIFIED: project_id is now optional
@@ -44,6 +53,8 @@ class TaskCreateRequest(BaseModel):
     
     # NLE Timeline Data
     timeline: Optional[List[Dict[str, Any]]] = None 
+    # Quick low-res preview of the timeline (PREVIEW_SCALE resolution, capped fps, proxy media)
+    preview: bool = False
 
     class Config:
         populate_by_name = True
\ No newline at end of file
@@ -2,8 +2,16 @@
 
 if [ "$PROCESS_TYPE" = "worker" ]; then 
     echo "Starting Celery Worker..."
-    # Points to the celery_app inside the worker directory
-    celery -A worker.celery_app worker --loglevel=info
+    # Single-box deployment: one worker consuming every queue
+    celery -A worker.celery_app worker --loglevel=info -Q "${RENDER_QUEUE:-render},${GENERATION_QUEUE:-generation},${TRANSCRIPTION_QUEUE:-transcription},${FINALIZE_QUEUE:-finalize}"
+elif [ "$PROCESS_TYPE" = "render" ] || [ "$PROCESS_TYPE" = "generation" ] || [ "$PROCESS_TYPE" = "finalize" ]; then
+    echo "Starting $PROCESS_TYPE Worker Pool..."
+    # Queue, pool type, concurrency, prefetch and recycling come from WORKER_POOLS
+    python -m worker.celery_app "$PROCESS_TYPE"
+elif [ "$PROCESS_TYPE" = "transcriber" ]; then
+    echo "Starting Transcription Worker Pool..."
+    # Long-lived children keep Whisper models resident across tasks
+    python -m worker.celery_app transcription
 else
     echo "Starting FastAPI Web Server..."
     # Points to the FastAPI app in app/main.py
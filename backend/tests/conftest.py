@@ -0,0 +1,11 @@
+import os
+
+# app.config requires deployment secrets at import; tests never reach those services
+for name, value in {
+    "POSTGRES_USER": "test", "POSTGRES_PASSWORD": "test", "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432", "POSTGRES_DB": "test", "SUPABASE_JWT_SECRET": "test",
+    "SUPABASE_ANON_KEY": "test", "HF_TOKEN": "test", "GEMINI_API_KEY": "test",
+    "PIXABAY_API_KEY": "test", "AWS_REGION": "us-east-1", "AWS_ACCESS_KEY_ID": "test",
+    "AWS_SECRET_ACCESS_KEY": "test", "S3_BUCKET_NAME": "test",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,28 @@
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("moviepy.editor")
+
+from app.engine.timeline import FFMPEG_BINARY
+
+if not (shutil.which(FFMPEG_BINARY) or os.path.exists(FFMPEG_BINARY)):
+    pytest.skip("ffmpeg is not available", allow_module_level=True)
+
+from app.engine import ffmpeg_graph, video, compositor, timeline as timeline_plan
+
+
+def test_filtergraph_matches_moviepy_golden_frames(tmp_path):
+    """The single-graph render must be visually identical to the MoviePy path."""
+    width, height, fps, duration = 1280, 720, 24, 6.0
+    timeline = compositor._synthetic_timeline(str(tmp_path), tracks=6, duration=duration)
+
+    reference = video.render_timeline(timeline, str(tmp_path / "moviepy.mp4"), width, height, duration, fps, engine="moviepy")
+    plan = timeline_plan.compile_timeline(timeline, lambda p: p, width, height, duration, fps)
+    assert not ffmpeg_graph.unsupported_reasons(plan)
+    candidate = ffmpeg_graph.render(plan, str(tmp_path / "ffmpeg.mp4"))
+
+    # > ~30 dB PSNR is visually identical
+    scores = ffmpeg_graph.compare_frames(reference, candidate, [0.5, 1.5, 2.5, 4.0, 5.5], width, height)
+    assert min(scores) > 30, scores
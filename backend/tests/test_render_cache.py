@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.config import settings
+from app.engine import engines, stream_copy, timeline as timeline_plan
+
+
+class CountingEncoder:
+    """Stands in for a render engine: writes a placeholder chunk and records the span."""
+    def __init__(self):
+        self.spans = []
+
+    def render(self, plan, output_path, t_start=None, t_end=None, with_audio=True, gop=None, progress_callback=None):
+        self.spans.append((t_start, t_end))
+        with open(output_path, "wb") as f:
+            f.write(f"{t_start}-{t_end}".encode())
+        return output_path
+
+
+@pytest.fixture
+def encoder(monkeypatch, tmp_path):
+    stub = CountingEncoder()
+    monkeypatch.setattr(settings, "ASSET_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setitem(engines.ENGINES, "compositor", stub)
+    # Threads, so the stub's counter is shared with the chunk workers
+    monkeypatch.setattr(engines, "_segment_executor", lambda workers: ThreadPoolExecutor(max_workers=workers))
+    monkeypatch.setattr(stream_copy, "concat_files", lambda plan, segments, output_path: open(output_path, "wb").close())
+    return stub
+
+
+def _timeline(edited=None):
+    """60 s of captions, one every 6 s; `edited` replaces the text of that clip."""
+    return [{
+        "id": 1, "type": "text",
+        "clips": [
+            {"id": f"t{i}", "type": "text", "content": "Edited caption" if i == edited else f"Caption {i}",
+             "start": i * 6.0, "duration": 3.0,
+             "properties": {"fontSize": 60, "x": 50, "y": 80, "width": 80}}
+            for i in range(10)
+        ]
+    }]
+
+
+def _render(timeline, output_path):
+    plan = timeline_plan.compile_timeline(timeline, lambda p: p, 1920, 1080, 60.0, 24)
+    engines.render_segmented("compositor", plan, str(output_path), workers=2, incremental=True)
+    return engines.segment_bounds(plan)[1]
+
+
+def test_reexport_only_encodes_the_changed_chunk(encoder, tmp_path):
+    bounds = _render(_timeline(), tmp_path / "first.mp4")
+    assert sorted(encoder.spans) == bounds
+
+    encoder.spans.clear()
+    _render(_timeline(edited=4), tmp_path / "second.mp4")  # Caption at 24 s -> 27 s
+    assert encoder.spans == [(20.0, 30.0)]
+
+
+def test_unchanged_reexport_encodes_nothing(encoder, tmp_path):
+    _render(_timeline(), tmp_path / "first.mp4")
+    encoder.spans.clear()
+    _render(_timeline(), tmp_path / "second.mp4")
+    assert encoder.spans == []
@@ -0,0 +1,82 @@
+import io
+import os
+
+import pytest
+
+moto = pytest.importorskip("moto")
+
+import boto3
+from fastapi import HTTPException
+from app.config import settings
+from app.engine import s3_utils
+
+PART = 5 * 1024 ** 2  # S3's minimum multipart part size
+
+
+@pytest.fixture
+def bucket(monkeypatch):
+    monkeypatch.setattr(settings, "S3_MULTIPART_THRESHOLD", PART)
+    monkeypatch.setattr(settings, "S3_MULTIPART_CHUNKSIZE", PART)
+    with moto.mock_aws():
+        s3_utils._clients.clear()  # Build the shared client inside the mock
+        boto3.client("s3", region_name=settings.AWS_REGION).create_bucket(Bucket=settings.S3_BUCKET_NAME)
+        yield settings.S3_BUCKET_NAME
+    s3_utils._clients.clear()
+
+
+def _write(path, size):
+    with open(path, "wb") as f:
+        f.write(os.urandom(size))
+    return str(path)
+
+
+def _etag(key):
+    return s3_utils.get_s3_client().head_object(Bucket=settings.S3_BUCKET_NAME, Key=key)["ETag"].strip('"')
+
+
+def test_small_file_is_a_single_part_upload(bucket, tmp_path):
+    path = _write(tmp_path / "small.bin", 1024)
+    calls = []
+    s3_utils.upload_path_to_s3(path, "small.bin", "application/octet-stream", lambda done, total: calls.append((done, total)))
+
+    assert "-" not in _etag("small.bin")  # Multipart ETags end in -<part count>
+    assert calls[-1] == (1024, 1024)
+    assert s3_utils.read_file_from_s3("small.bin") == open(path, "rb").read()
+
+
+def test_large_file_is_uploaded_in_parts_with_progress(bucket, tmp_path):
+    size = 2 * PART + 1024
+    path = _write(tmp_path / "large.bin", size)
+    calls = []
+    s3_utils.upload_path_to_s3(path, "large.bin", "video/mp4", lambda done, total: calls.append((done, total)))
+
+    assert _etag("large.bin").endswith("-3")
+    assert calls[-1] == (size, size)
+    assert [done for done, _ in calls] == sorted(done for done, _ in calls)
+    assert s3_utils.read_file_from_s3("large.bin") == open(path, "rb").read()
+
+
+def test_stream_upload(bucket):
+    content = os.urandom(PART + 10)
+    calls = []
+    s3_utils.upload_stream_to_s3(io.BytesIO(content), "stream.bin", "video/mp4", len(content),
+                                 lambda done, total: calls.append((done, total)))
+
+    assert _etag("stream.bin").endswith("-2")
+    assert calls[-1] == (len(content), len(content))
+    assert s3_utils.read_file_from_s3("stream.bin") == content
+
+
+def test_upload_failures_surface_as_http_errors(bucket, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "S3_BUCKET_NAME", "missing-bucket")
+    path = _write(tmp_path / "small.bin", 1024)
+
+    with pytest.raises(HTTPException) as exc:
+        s3_utils.upload_path_to_s3(path, "small.bin", "application/octet-stream")
+    assert exc.value.status_code == 500
+
+    with pytest.raises(HTTPException):
+        s3_utils.upload_stream_to_s3(io.BytesIO(b"data"), "small.bin", "application/octet-stream", 4)
+
+    with pytest.raises(HTTPException):
+        s3_utils.upload_file_to_s3(b"data", "small.bin", "application/octet-stream")
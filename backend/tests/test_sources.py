@@ -0,0 +1,75 @@
+import subprocess
+
+import pytest
+
+moviepy_editor = pytest.importorskip("moviepy.editor")
+
+from moviepy.config import get_setting
+from app.engine.sources import SourceRegistry
+
+
+@pytest.fixture(scope="module")
+def source(tmp_path_factory):
+    """6 s, 24 fps test pattern with a tone, so frames differ by offset."""
+    path = str(tmp_path_factory.mktemp("sources") / "pattern.mp4")
+    subprocess.run(
+        [get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+         "-f", "lavfi", "-i", "testsrc=size=160x90:rate=24:duration=6",
+         "-f", "lavfi", "-i", "sine=frequency=440:duration=6",
+         "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", path],
+        check=True,
+    )
+    return path
+
+
+def _count_initializations(clip):
+    calls = []
+    initialize = clip.reader.initialize
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return initialize(*args, **kwargs)
+
+    clip.reader.initialize = counted
+    return calls
+
+
+def test_sequential_clips_share_a_reader(source):
+    with SourceRegistry() as registry:
+        first = registry.video(source, 0, 2)
+        second = registry.video(source, 2, 4)
+        assert first is second
+        assert registry.open_readers == 1
+
+
+def test_overlapping_clips_get_separate_readers(source):
+    with SourceRegistry() as registry:
+        first = registry.video(source, 0, 3)
+        second = registry.video(source, 1, 4)
+        third = registry.video(source, 3, 5)  # After `first` ends: reuses its reader
+        assert first is not second
+        assert third is first
+        assert registry.open_readers == 2
+
+        first_audio = registry.audio(source, 0, 3)
+        second_audio = registry.audio(source, 1, 4)
+        assert first_audio is not second_audio
+
+
+def test_overlapping_subclips_do_not_thrash_the_reader(source):
+    with SourceRegistry() as registry:
+        a = registry.video(source, 0, 2)
+        b = registry.video(source, 0, 2)
+        a_inits, b_inits = _count_initializations(a), _count_initializations(b)
+
+        # Two layers read offsets 4 s apart on every frame of the composite
+        composite = moviepy_editor.CompositeVideoClip([
+            a.subclip(0, 2).set_start(0),
+            b.subclip(4, 6).set_start(0).set_position((80, 45)),
+        ], size=(160, 90))
+        for frame in composite.iter_frames(fps=24):
+            pass
+
+        # One initial seek per reader instead of a restart per frame
+        assert len(a_inits) <= 1
+        assert len(b_inits) <= 1
@@ -0,0 +1,23 @@
+from typing import get_args
+
+import pytest
+from pydantic import ValidationError
+
+from app.schemas.task_schema import TaskCreateRequest, TranscriptionMode, WhisperModel
+
+
+def test_transcription_options_are_validated():
+    request = TaskCreateRequest(transcription_mode="align", whisper_model="small")
+    assert (request.transcription_mode, request.whisper_model) == ("align", "small")
+    assert TaskCreateRequest().transcription_mode is None
+
+    with pytest.raises(ValidationError):
+        TaskCreateRequest(transcription_mode="whsiper")
+    with pytest.raises(ValidationError):
+        TaskCreateRequest(whisper_model="huge")
+
+
+def test_transcription_options_match_the_engine():
+    scriptslice = pytest.importorskip("app.engine.scriptslice")
+    assert set(get_args(TranscriptionMode)) == set(scriptslice.BACKENDS)
+    assert set(get_args(WhisperModel)) == set(scriptslice.WHISPER_SIZES)
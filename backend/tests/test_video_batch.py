@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+pytest.importorskip("gradio_client")
+
+from app.config import settings
+from app.engine import huggingface, s3_utils
+from app.engine.fake_gradio import FakeGradioClient
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    """No result cache, no S3 and no backoff: uploads just report their key."""
+    monkeypatch.setattr(settings, "RESULT_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "VIDEO_BATCH_RETRIES", 2)
+    monkeypatch.setattr(settings, "VIDEO_BATCH_BACKOFF", 0)
+    monkeypatch.setattr(s3_utils, "upload_path_to_s3", lambda path, key, content_type, progress_callback=None: key)
+
+
+def _segments(n):
+    return {i * 3.0: f"Segment prompt {i}" for i in range(n)}
+
+
+def test_transient_failures_are_retried():
+    fake = FakeGradioClient(latency=0.01, fail_prompts={"Segment prompt 1": 2})
+    ok, failed = huggingface.run_video_batch(_segments(3), concurrency=2, client=fake)
+
+    assert sorted(ok) == [0.0, 3.0, 6.0]
+    assert failed == {}
+    assert fake.prompt_calls["Segment prompt 1"] == 3  # Two failures, then success
+
+
+def test_permanent_failure_is_dropped_without_failing_the_batch():
+    fake = FakeGradioClient(latency=0.01, fail_prompts={"Segment prompt 2": None})
+    ok, failed = huggingface.run_video_batch(_segments(4), concurrency=2, client=fake)
+
+    assert sorted(ok) == [0.0, 3.0, 9.0]
+    assert list(failed) == [6.0]
+    assert fake.prompt_calls["Segment prompt 2"] == settings.VIDEO_BATCH_RETRIES + 1
+
+    # The public entry point only raises when every segment fails
+    assert sorted(huggingface.generate_ltx_video_batch(_segments(4), concurrency=2, client=FakeGradioClient(
+        latency=0.01, fail_prompts={"Segment prompt 2": None}))) == [0.0, 3.0, 9.0]
+    with pytest.raises(RuntimeError, match="All 2 segments failed"):
+        huggingface.generate_ltx_video_batch(_segments(2), client=FakeGradioClient(latency=0.01, failure_rate=1.0))
+
+
+def test_concurrency_limits_requests_in_flight():
+    fake = FakeGradioClient(latency=0.1)
+    ok, failed = huggingface.run_video_batch(_segments(8), concurrency=3, client=fake)
+
+    assert len(ok) == 8 and failed == {}
+    assert fake.max_in_flight == 3
+
+
+def test_generated_temp_files_are_removed():
+    fake = FakeGradioClient(latency=0.01)
+    created = []
+    predict = fake.predict
+    fake.predict = lambda *args, **kwargs: created.append(predict(*args, **kwargs)) or created[-1]
+
+    huggingface.run_video_batch(_segments(3), concurrency=2, client=fake)
+    assert len(created) == 3
+    assert not any(os.path.exists(path) for path in created)
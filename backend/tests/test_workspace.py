@@ -0,0 +1,64 @@
+import os
+import time
+
+import pytest
+
+from app.config import settings
+from app.engine import workspace
+
+
+@pytest.fixture
+def root(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "WORKSPACE_ROOT", str(tmp_path))
+    monkeypatch.setattr(settings, "WORKSPACE_HEARTBEAT_SECONDS", 0.05)
+    return tmp_path
+
+
+def _dead_pid():
+    pid = 2 ** 22 - 1
+    while True:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return pid
+        except PermissionError:
+            pass
+        pid -= 1
+
+
+def _fake_workspace(root, host, pid, age=0):
+    path = root / f"job.{host}.{pid}.7.abc123"
+    path.mkdir()
+    heartbeat = path / workspace.HEARTBEAT_FILE
+    heartbeat.touch()
+    then = time.time() - age
+    os.utime(heartbeat, (then, then))
+    return path
+
+
+def test_other_containers_are_judged_by_heartbeat_not_pid(root):
+    # A PID from another container's namespace says nothing about liveness here
+    fresh = _fake_workspace(root, "other-container", _dead_pid())
+    stale = _fake_workspace(root, "gone-container", os.getpid(), age=settings.WORKSPACE_STALE_SECONDS + 60)
+
+    workspace.sweep_stale()
+    assert fresh.exists()
+    assert not stale.exists()
+
+
+def test_own_workspaces_of_dead_children_are_swept(root):
+    dead = _fake_workspace(root, workspace._host(), _dead_pid())
+    with workspace.Workspace(1) as live:
+        workspace.sweep_stale()
+        assert os.path.isdir(live.dir)
+    assert not dead.exists()
+
+
+def test_running_job_keeps_its_heartbeat_fresh(root):
+    with workspace.Workspace(2) as ws:
+        heartbeat = os.path.join(ws.dir, workspace.HEARTBEAT_FILE)
+        os.utime(heartbeat, (0, 0))
+        time.sleep(0.2)
+        assert time.time() - os.path.getmtime(heartbeat) < 1
+        directory = ws.dir
+    assert not os.path.exists(directory)
@@ -1,4 +1,5 @@
-from celery import Celery 
+import sys
+from celery import Celery
 from app.config import settings
 from app.config import DATABASE_URL # <--- NEW: Import DATABASE_URL from config
 
@@ -6,28 +7,95 @@ celery_app = Celery(
     "worker",
     broker=settings.CELERY_BROKER_URL,
     # Use the variable from settings, which grabs the correct 'db+postgresql://' string from Beanstalk
-    backend=settings.CELERY_RESULT_BACKEND, 
+    backend=settings.CELERY_RESULT_BACKEND,
     include=['worker.tasks']
 )
 
+# Workload classes. Each pool is started as its own worker (python -m worker.celery_app <pool>)
+# so a backlog of AI jobs never occupies the slots that quick exports need.
+#   queues:              queues the pool consumes
+#   pool / concurrency:  Celery execution pool and slot count
+#   prefetch:            messages reserved per slot (1 = a long job never hoards short ones)
+#   max_tasks_per_child: recycling safety net, 0 = never
+# The broker visibility timeout is deliberately global (BROKER_VISIBILITY_TIMEOUT): the Redis
+# transport keeps one unacked index that every worker restores from, so a pool with a shorter
+# timeout would redeliver other pools' long-running messages.
+WORKER_POOLS = {
+    # NLE exports & previews: ffmpeg/compositor renders, one per core
+    "render": {
+        "queues": [settings.RENDER_QUEUE], "pool": "prefork", "concurrency": settings.RENDER_CONCURRENCY,
+        "prefetch": 1, "max_tasks_per_child": settings.WORKER_MAX_TASKS_PER_CHILD,
+    },
+    # AI pipelines up to the final render. Mostly waiting on remote Spaces, but Whisper /
+    # alignment also run here unless TRANSCRIPTION_POOL_ENABLED, so processes, not threads
+    "generation": {
+        "queues": [settings.GENERATION_QUEUE], "pool": "prefork", "concurrency": settings.GENERATION_CONCURRENCY,
+        "prefetch": 1, "max_tasks_per_child": settings.WORKER_MAX_TASKS_PER_CHILD,
+    },
+    # Whisper: long-lived children keep models resident across tasks
+    "transcription": {
+        "queues": [settings.TRANSCRIPTION_QUEUE], "pool": "prefork", "concurrency": 1,
+        "prefetch": 1, "max_tasks_per_child": 0,
+    },
+    # Final render + upload of AI pipelines
+    "finalize": {
+        "queues": [settings.FINALIZE_QUEUE], "pool": "prefork", "concurrency": settings.FINALIZE_CONCURRENCY,
+        "prefetch": 1, "max_tasks_per_child": settings.WORKER_MAX_TASKS_PER_CHILD,
+    },
+}
+
 celery_app.conf.update(
     task_serializer="json",
     accept_content=["json"],
-    result_serializer="json",   
+    result_serializer="json",
     timezone="UTC",
     enable_utc=True,
-    # SQS-specific configuration
     broker_transport_options={
-        'visibility_timeout': 3600, # Set long timeout (1 hour) for heavy video tasks
+        # Must exceed the longest job of any pool (see WORKER_POOLS)
+        'visibility_timeout': settings.BROKER_VISIBILITY_TIMEOUT,
+        # Redis: per-message priorities (0 = highest) are kept in one list per step
+        'priority_steps': list(range(10)),
+        'sep': ':',
     },
     # Best practices for memory-heavy workers (FFmpeg, Whisper)
-    worker_max_tasks_per_child=1, # CRITICAL: Forces worker cleanup after each task
+    # CRITICAL: Forces worker cleanup after a bounded number of tasks. Pools override this
+    # per workload class (WORKER_POOLS).
+    worker_max_tasks_per_child=settings.WORKER_MAX_TASKS_PER_CHILD or None,
+    worker_prefetch_multiplier=1,
     task_acks_late=True, # Acknowledge task only after job fully completes
+    task_default_queue=settings.RENDER_QUEUE,
+    task_routes={
+        'worker.tasks.export_timeline_task': {'queue': settings.RENDER_QUEUE},
+        'worker.tasks.run_pipeline_task': {'queue': settings.GENERATION_QUEUE},
+        'worker.tasks.transcribe_pipeline_task': {'queue': settings.TRANSCRIPTION_QUEUE},
+        'worker.tasks.finalize_pipeline_task': {'queue': settings.FINALIZE_QUEUE},
+    },
 
 )
 
+def worker_argv(pool_name: str) -> list:
+    """`celery worker` arguments for one of WORKER_POOLS."""
+    spec = WORKER_POOLS[pool_name]
+    argv = [
+        "worker", "--loglevel=info", "-n", f"{pool_name}@%h",
+        "-Q", ",".join(spec["queues"]),
+        "-P", spec["pool"], "-c", str(spec["concurrency"]),
+        "--prefetch-multiplier", str(spec["prefetch"]),
+    ]
+    if spec["pool"] == "prefork":
+        # Hand messages only to idle children instead of queueing them behind a busy one
+        argv += ["-O", "fair"]
+    return argv
 
+def start_pool(pool_name: str):
+    spec = WORKER_POOLS[pool_name]
+    celery_app.conf.worker_max_tasks_per_child = spec["max_tasks_per_child"] or None
+    celery_app.worker_main(worker_argv(pool_name))
 
-
-
-
+if __name__ == "__main__":
+    # Usage: python -m worker.celery_app <render|generation|transcription|finalize>
+    if len(sys.argv) != 2 or sys.argv[1] not in WORKER_POOLS:
+        sys.exit(f"Usage: python -m worker.celery_app <{'|'.join(WORKER_POOLS)}>")
+    # Tasks register on the importable module's app, not on this __main__ copy
+    from worker.celery_app import start_pool as start
+    start(sys.argv[1])
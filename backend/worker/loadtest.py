@@ -0,0 +1,79 @@
+# myg/backend/worker/loadtest.py
+import time
+import argparse
+import statistics
+from contextlib import ExitStack
+from celery.contrib.testing.worker import start_worker
+from worker.celery_app import celery_app, WORKER_POOLS
+from worker import tasks
+
+# Queue-isolation load test on an in-memory broker (no Redis, database or GPU needed).
+# Jobs go through the real tasks.dispatch routing onto the WORKER_POOLS queues; only the
+# task bodies are replaced by sleeps. Enqueues a backlog of slow AI jobs, then a burst of
+# short exports, and reports export latency (enqueue -> finished) for two topologies:
+#   shared: one worker consuming every queue with the pools' combined slots
+#   split:  one worker per WORKER_POOLS entry, as deployed
+# Pools run as in-process thread workers here; queues, routing and slot counts are real.
+# The memory transport only refills a freed slot when the consumer loop wakes (every ~2s
+# while idle), so job lengths are kept well above that jitter.
+# Usage: python -m worker.loadtest [--ai-jobs 16] [--exports 6] [--ai-seconds 8] ...
+
+def _simulated_run(celery_task, payload: dict, work, retry: bool = False):
+    """Stands in for tasks._run: occupies the worker slot, then reports when it finished."""
+    time.sleep(payload["seconds"])
+    return {"finished_at": time.time()}
+
+def _topology(name: str) -> list:
+    """[(worker name, queues, slots)]"""
+    pools = [(pool, spec["queues"], spec["concurrency"]) for pool, spec in WORKER_POOLS.items()]
+    if name == "split":
+        return pools
+    queues = [q for _, pool_queues, _ in pools for q in pool_queues]
+    return [("shared", queues, sum(slots for _, _, slots in pools))]
+
+def run(topology: str, ai_jobs: int, exports: int, ai_seconds: float, export_seconds: float) -> list:
+    """Returns the latency (seconds) of every export."""
+    timeout = ai_seconds * ai_jobs + 60
+    with ExitStack() as stack:
+        for name, queues, slots in _topology(topology):
+            stack.enter_context(start_worker(
+                celery_app, pool="threads", concurrency=slots, queues=queues,
+                perform_ping_check=False, shutdown_timeout=timeout,
+            ))
+
+        backlog = [tasks.dispatch({"id": n, "seconds": ai_seconds}) for n in range(ai_jobs)]
+        time.sleep(0.1)  # Let the backlog occupy the workers first
+
+        submitted = []
+        for n in range(exports):
+            payload = {"id": ai_jobs + n, "timeline": [{"clips": []}], "duration": 15, "seconds": export_seconds}
+            submitted.append((time.time(), tasks.dispatch(payload)))
+
+        latencies = [result.get(timeout=timeout)["finished_at"] - enqueued for enqueued, result in submitted]
+        for result in backlog:
+            result.get(timeout=timeout)
+    return latencies
+
+def _summary(latencies: list) -> str:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return f"median {statistics.median(ordered):6.2f}s   p95 {p95:6.2f}s   max {ordered[-1]:6.2f}s"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export latency under an AI-job backlog")
+    parser.add_argument("--ai-jobs", type=int, default=16)
+    parser.add_argument("--exports", type=int, default=6)
+    parser.add_argument("--ai-seconds", type=float, default=8.0)
+    parser.add_argument("--export-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    celery_app.conf.broker_url = "memory://"
+    celery_app.conf.result_backend = "cache+memory://"
+    celery_app.conf.broker_transport_options = {"polling_interval": 0.01}
+    tasks._run = _simulated_run
+
+    print(f"Backlog: {args.ai_jobs} AI jobs x {args.ai_seconds}s, then {args.exports} exports x {args.export_seconds}s")
+    print("Slots: " + ", ".join(f"{pool}={spec['concurrency']}" for pool, spec in WORKER_POOLS.items()))
+    for topology in ("shared", "split"):
+        latencies = run(topology, args.ai_jobs, args.exports, args.ai_seconds, args.export_seconds)
+        print(f"{topology:>7}: {_summary(latencies)}")
@@ -1,46 +1,79 @@
-# myg/backend/worker/tasks.py 
+# myg/backend/worker/tasks.py
 
 import os
 import logging
-import asyncio
-from celery import Celery
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.attributes import flag_modified
 from app.config import DATABASE_URL, settings
 from app.models import Task
-from app.engine import pipeline, nle_renderer
+from app.engine import pipeline, nle_renderer, workspace, progress, assets
+from worker.celery_app import celery_app
 
 logger = logging.getLogger(__name__)
 
-# Initialize Celery
-celery_app = Celery("worker", broker=settings.CELERY_BROKER_URL)
-
 # Database Setup
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-@celery_app.task(name="worker.tasks.generate_video_task", bind=True)
-def generate_video_task(self, payload: dict):
+# Each workload class has its own task and queue (see WORKER_POOLS in celery_app.py):
+#   export_timeline_task   -> RENDER_QUEUE      NLE exports & previews, short ones prioritized
+#   run_pipeline_task        -> GENERATION_QUEUE     AI pipeline up to the final render (remote I/O)
+#   transcribe_pipeline_task -> TRANSCRIPTION_QUEUE  AI transcription stage (TRANSCRIPTION_POOL_ENABLED)
+#   finalize_pipeline_task   -> FINALIZE_QUEUE       AI final render + upload
+
+# --- 1. Dispatch ---
+
+def export_priority(payload: dict) -> int:
+    """Redis priority (0 = highest): previews and short exports jump ahead of long renders."""
+    if payload.get("preview"):
+        return 0
+    if float(payload.get("duration") or 0) <= settings.SHORT_EXPORT_SECONDS:
+        return 2
+    return 6
+
+def dispatch(payload: dict):
+    """Enqueues a task payload on the queue for its workload class."""
+    if payload.get("timeline"):
+        return export_timeline_task.apply_async((payload,), queue=settings.RENDER_QUEUE, priority=export_priority(payload))
+    return run_pipeline_task.apply_async((payload,), queue=settings.GENERATION_QUEUE)
+
+# --- 2. Task Lifecycle ---
+
+def _run(celery_task, payload: dict, work, retry: bool = False):
     """
-    The central task router. 
-    It determines whether to run the automated AI pipeline or render a manual NLE timeline.
+    Shared task lifecycle: loads the Task row, reports progress, runs `work(task, db, progress_callback)`
+    inside a job workspace and records the outcome. `work` returns the result, or None when the
+    job was handed to another queue and is not finished yet.
     """
     task_id = payload.get("id")
     db = SessionLocal()
     task = None
-    
+    owner_id = None
+
     try:
         # 1. Fetch the task from the database
         task = db.query(Task).filter(Task.id == task_id).first()
         if not task:
             logger.error(f"Task {task_id} not found.")
             return "Task not found"
+        # Live events go to the owner's channel (GET /api/tasks/events)
+        owner_id = str(task.project.owner_id) if task.project else None
 
         # 2. Define the progress callback for both paths
-        def progress_callback(p):
+        # Ticks are coalesced into Redis; the row is only committed when the status changes
+        def persist(p, status):
+            task.progress = p
+            task.status = status
+            db.commit()
+
+        reporter = progress.ProgressReporter(
+            task_id, persist, owner_id=owner_id,
             # Update Celery state for frontend polling
-            self.update_state(state='PROGRESS', meta={'progress': p})
-            
+            on_publish=lambda p, status: celery_task.update_state(state='PROGRESS', meta={'progress': p, 'status': status})
+        )
+
+        def progress_callback(p):
             # Determine status message based on the processing path
             if payload.get("timeline"):
                 # Manual NLE Path Status
@@ -52,57 +85,152 @@ def generate_video_task(self, payload: dict):
                 if p < 25: status = "Generating Script/Voice"
                 elif p < 50: status = "Transcribing Audio"
                 elif p < 100: status = "Optimizing Visuals"
-                else: status = "Completed"
-            
-            task.progress = p
-            task.status = status
-            db.commit()
+                # Not "Completed": that is published below, after video_url is committed
+                else: status = "Finalizing"
+
+            # Fail fast instead of filling the worker's disk; the quota walk runs at the
+            # throttled rate, not on every tick
+            if reporter.update(p, status):
+                workspace.check_quota()
 
-        # 3. Routing Logic
-        logger.info(f"🚀 Starting Task {task_id}")
-
-        if payload.get("timeline"):
-            # --- PATH A: MANUAL NLE EDITOR EXPORT ---
-            logger.info(f"Routing to NLE Renderer (Manual Edit Detected)")
-            
-            # nle_renderer.process_nle_task is an async function
-            result = asyncio.run(nle_renderer.process_nle_task(payload, progress_callback))
-        
-        else:
-            # --- PATH B: STANDALONE AI PIPELINE ---
-            logger.info(f"Routing to Standalone AI Pipeline")
-            
-            # Extract voice prompt reference from payload if it exists
-            files = payload.get("files", {})
-            voice_prompt = files.get("Audio Track") if isinstance(files, dict) else None
-
-            # Prepare task data for the AI pipeline engine
-            task_data = {
-                "title": task.title,
-                "scripts": task.script,
-                "voice_url": voice_prompt,
-                "resolution": payload.get("resolution", "1080x1920"),
-                "fps": payload.get("fps", 24)
-            }
-            
-            result = pipeline.run_pipeline(task_data, progress_callback)
+        # 3. Run
+        # Everything the job writes or opens lives in its workspace and is torn down
+        # on success or failure, so children can run many tasks (WORKER_MAX_TASKS_PER_CHILD).
+        logger.info(f"🚀 Starting Task {task_id} ({celery_task.name})")
+        workspace.sweep_stale()
+
+        with workspace.Workspace(task_id):
+            result = work(task, db, progress_callback)
+
+        if result is None:
+            return None
 
         # 4. Finalize Task Record
         task.video_url = result.get("video_url") or result.get("audio_url")
         task.status = "Completed"
         task.progress = 100
         db.commit()
-        
+        progress.publish(task_id, 100, task.status, owner_id=owner_id)
+
         logger.info(f"✅ Task {task_id} Successfully Completed")
         return result
 
     except Exception as e:
         logger.error(f"❌ Task {task_id} Failed: {str(e)}")
+        # AI pipeline attempts resume from their last checkpointed stage, so retrying is cheap
+        if task and retry and celery_task.request.retries < settings.PIPELINE_MAX_RETRIES:
+            task.status = "Retrying"
+            db.commit()
+            progress.publish(task_id, task.progress or 0, task.status, owner_id=owner_id)
+            raise celery_task.retry(exc=e, countdown=settings.PIPELINE_RETRY_DELAY)
         if task:
             task.status = f"Error: {str(e)[:100]}"
             db.commit()
+            progress.publish(task_id, task.progress or 0, task.status, owner_id=owner_id)
         raise e
     finally:
 
         db.close()
 
+# --- 3. Manual NLE Editor Export ---
+
+@celery_app.task(name="worker.tasks.export_timeline_task", bind=True, acks_late=True)
+def export_timeline_task(self, payload: dict):
+    def work(task, db, progress_callback):
+        logger.info(f"Routing to NLE Renderer (Manual Edit Detected)")
+        # nle_renderer.process_nle_task is an async function; its HTTP client is closed with the loop
+        return assets.run_with_http_client(nle_renderer.process_nle_task(payload, progress_callback))
+
+    return _run(self, payload, work)
+
+# --- 4. Standalone AI Pipeline ---
+
+def _pipeline_run(task, db, payload: dict, progress_callback, phase: str):
+    # Extract voice prompt reference from payload if it exists
+    files = payload.get("files", {})
+    voice_prompt = files.get("Audio Track") if isinstance(files, dict) else None
+
+    # Prepare task data for the AI pipeline engine
+    task_data = {
+        "id": task.id,
+        "title": task.title,
+        "scripts": task.script,
+        "voice_url": voice_prompt,
+        "resolution": payload.get("resolution", "1080x1920"),
+        "fps": payload.get("fps", 24),
+        "vignette_intensity": payload.get("vignette_intensity", 0),
+        "captions": payload.get("captions"),
+        "transcription_mode": payload.get("transcription_mode"),
+        "whisper_model": payload.get("whisper_model")
+    }
+
+    # Stage checkpoints live on the Task row so a retry (or the finalize task) resumes where
+    # the previous attempt stopped
+    def save_pipeline_state(state):
+        task.pipeline_state = state
+        flag_modified(task, "pipeline_state")
+        db.commit()
+
+    return pipeline.run_pipeline(
+        task_data, progress_callback,
+        state=task.pipeline_state, on_checkpoint=save_pipeline_state, phase=phase
+    ), task_data
+
+def _pipeline_phase(celery_task, payload: dict, phase: str):
+    """
+    Runs one phase of the pipeline and chains the next one onto its queue, so no task ever
+    blocks a worker slot waiting on another queue. The last phase completes the task.
+    """
+    def work(task, db, progress_callback):
+        result, task_data = _pipeline_run(task, db, payload, progress_callback, phase)
+        if result is not None:
+            return result
+
+        following = pipeline.next_phase(task_data, task.pipeline_state)
+        if following is None or following == phase:
+            raise RuntimeError(f"Pipeline phase '{phase}' stopped with no stage left to hand off")
+        next_task, queue = PHASE_TASKS[following]
+        task.status = PHASE_STATUS[following]
+        db.commit()
+        owner_id = str(task.project.owner_id) if task.project else None
+        progress.publish(task.id, task.progress or 0, task.status, owner_id=owner_id)
+        next_task.apply_async((payload,), queue=queue)
+        return None
+
+    return _run(celery_task, payload, work, retry=True)
+
+@celery_app.task(name="worker.tasks.run_pipeline_task", bind=True, acks_late=True)
+def run_pipeline_task(self, payload: dict):
+    """Script, voice and video generation (and transcription unless pooled)."""
+    logger.info(f"Routing to Standalone AI Pipeline")
+    return _pipeline_phase(self, payload, "generation")
+
+@celery_app.task(name="worker.tasks.transcribe_pipeline_task", bind=True, acks_late=True)
+def transcribe_pipeline_task(self, payload: dict):
+    """The transcription stage, on the pool that keeps Whisper models warm."""
+    return _pipeline_phase(self, payload, "transcription")
+
+@celery_app.task(name="worker.tasks.finalize_pipeline_task", bind=True, acks_late=True)
+def finalize_pipeline_task(self, payload: dict):
+    """Final render + upload; earlier stages are restored from their checkpoints."""
+    return _pipeline_phase(self, payload, "finalize")
+
+# pipeline.PHASES -> (task, queue)
+PHASE_TASKS = {
+    "generation": (run_pipeline_task, settings.GENERATION_QUEUE),
+    "transcription": (transcribe_pipeline_task, settings.TRANSCRIPTION_QUEUE),
+    "finalize": (finalize_pipeline_task, settings.FINALIZE_QUEUE),
+}
+PHASE_STATUS = {
+    "generation": "Queued for Visuals",
+    "transcription": "Queued for Transcription",
+    "finalize": "Queued for Render",
+}
+
+@celery_app.task(name="worker.tasks.generate_video_task", bind=True)
+def generate_video_task(self, payload: dict):
+    """
+    Legacy entry point kept for messages queued before the queue split.
+    Forwards the payload to the task for its workload class.
+    """
+    return dispatch(payload).id
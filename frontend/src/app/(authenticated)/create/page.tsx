@@ -8,11 +8,7 @@ import {
   ArrowPathIcon
 } from "@heroicons/react/24/outline";
 import EngineSetupModal from "@/components/modals/EngineSetupModal";
-
-// Constants for backend communication
-const API_BASE_URL = process.env.NODE_ENV === 'production' 
-  ? '/backend-api/api' 
-  : "http://localhost:8000/api";
+import { api, baseURL, endpoints } from "@/lib/api";
 
 interface Message {
   id: string;
@@ -50,54 +46,98 @@ export default function CreatePage() {
   }, [messages]);
 
   /**
-   * POLL TASK STATUS
-   * Checks the backend every 3 seconds to update progress bars and final video.
+   * WATCH TASK STATUS
+   * Subscribes to the backend's progress event stream to update progress bars and shows
+   * the final video once the task reports "Completed".
    */
-  const pollTaskStatus = async (taskId: string, messageId: string) => {
-    const interval = setInterval(async () => {
-      try {
-        const response = await fetch(`${API_BASE_URL}/tasks/${taskId}`);
-        if (!response.ok) throw new Error("Task fetch failed");
-        
-        const data = await response.json(); //
-
-        setMessages(prev => prev.map(m => 
-          m.id === messageId 
-            ? { 
-                ...m, 
-                status: `${data.progress}%`, 
-                statusText: data.status 
-              } 
-            : m
-        ));
-
-        // When the task is "Completed", stop polling and show the video
-        if (data.status === "Completed") {
-          clearInterval(interval);
+  const watchTaskStatus = (taskId: string, messageId: string) => {
+    let source: EventSource | null = null;
+    let finished = false;
+
+    const applyUpdate = async (data: any) => {
+      if (finished) return;
+
+      setMessages(prev => prev.map(m => 
+        m.id === messageId 
+          ? { 
+              ...m, 
+              status: `${Math.round(data.progress)}%`, 
+              statusText: data.status 
+            } 
+          : m
+      ));
+
+      // When the task is "Completed", stop listening and show the video
+      if (data.status === "Completed") {
+        finished = true;
+        source?.close();
+        try {
+          const videoUrl = data.video_url
+            ?? (await api.get(endpoints.tasks.get(taskId))).data.video_url;
           setMessages(prev => prev.map(m => 
             m.id === messageId 
               ? { 
                   ...m, 
-                  videoUrl: data.video_url, // This will be the S3 signed URL
+                  videoUrl, // This will be the S3 signed URL
                   isLoadingVideo: false,
                   status: "100%" 
                 } 
               : m
           ));
-          setIsGenerating(false); // Unlock the input bar
+        } catch (err) {
+          console.error("Task fetch failed:", err);
         }
+        setIsGenerating(false); // Unlock the input bar
+      }
 
-        // Handle failure
-        if (data.status.toLowerCase().includes("error")) {
-          clearInterval(interval);
-          setIsGenerating(false);
-          alert("Generation failed: " + data.status);
-        }
+      // Handle failure
+      if (data.status.toLowerCase().includes("error")) {
+        finished = true;
+        source?.close();
+        setIsGenerating(false);
+        alert("Generation failed: " + data.status);
+      }
+    };
+
+    const connect = async () => {
+      if (finished) return;
+      let stream: EventSource;
+      try {
+        // EventSource can't send the Authorization header: exchange it for a short-lived
+        // stream token. It is only checked when connecting, so every (re)connect gets a new one
+        const { data } = await api.post(endpoints.tasks.eventsToken);
+        stream = new EventSource(`${baseURL}${endpoints.tasks.events}?token=${encodeURIComponent(data.token)}`);
       } catch (err) {
-        console.error("Polling error:", err);
-        clearInterval(interval);
+        console.error("Event stream error:", err);
+        setTimeout(connect, 5000);
+        return;
       }
-    }, 3000);
+      source = stream;
+
+      // Catch up on anything published before (or between) subscriptions, e.g. a task
+      // that already completed
+      stream.onopen = async () => {
+        try {
+          const { data } = await api.get(endpoints.tasks.get(taskId));
+          await applyUpdate(data);
+        } catch (err) {
+          console.error("Task fetch failed:", err);
+        }
+      };
+
+      stream.addEventListener("progress", (event) => {
+        const data = JSON.parse((event as MessageEvent).data);
+        if (String(data.task_id) === String(taskId)) applyUpdate(data);
+      });
+
+      // Don't let the browser retry with the old (possibly expired) token
+      stream.onerror = () => {
+        stream.close();
+        if (!finished) setTimeout(connect, 3000);
+      };
+    };
+
+    connect();
   };
 
   const handleSubmit = (e?: React.FormEvent) => {
@@ -137,9 +177,9 @@ export default function CreatePage() {
       aspectRatio: config.aspectRatio
     }]);
 
-    // 3. Start Polling the backend Task ID
+    // 3. Start watching the backend Task ID
     if (config.taskId) {
-      pollTaskStatus(config.taskId, assistantMsgId);
+      watchTaskStatus(config.taskId, assistantMsgId);
     }
   };
 
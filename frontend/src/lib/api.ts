@@ -8,7 +8,7 @@ export const supabase = createBrowserClient(
 );
 
 // Point this exactly to the 'source' path in next.config.js
-const baseURL = '/api_backend';
+export const baseURL = '/api_backend';
 
 export const api = axios.create({
   baseURL,
@@ -52,6 +52,8 @@ export const endpoints = {
   tasks: {
     get: (id: string) => `/tasks/${id}`,
     generate: '/tasks/generate',
+    events: '/tasks/events',
+    eventsToken: '/tasks/events/token',
   }
 };
 